@@ -0,0 +1,32 @@
+"""Compare computing the default fields for every find with memoizing them.
+
+Usage: python benchmarks/default_fields.py [number]
+
+"""
+
+import sys
+import timeit
+
+from sgsession import Session
+
+
+def main():
+
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    session = Session(False)
+
+    for type_, fields in (
+        ('Shot', None),
+        ('Task', ['sg_status_list', 'entity.Shot.sg_sequence.Sequence.code']),
+        ('PublishEvent', ['sg_path', 'sg_link.Task.step.Step.code', 'sg_version']),
+    ):
+        for name, func in (
+            ('computed', session._compute_default_fields),
+            ('memoized', session._add_default_fields),
+        ):
+            elapsed = min(timeit.repeat(lambda: func(type_, fields), number=number, repeat=3))
+            print '%-12s %-8s %8.2f us/call' % (type_, name, 1e6 * elapsed / number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""Report how long ``import sgsession`` takes, over a bare interpreter.
+
+Each is timed in a fresh process, and the best of several runs is reported.
+
+Usage: python benchmarks/import_time.py [repeat]
+
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+
+_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def run_python(source):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [_root, env.get('PYTHONPATH')]))
+    start = time.time()
+    subprocess.check_call([sys.executable, '-c', source], env=env)
+    return time.time() - start
+
+
+def main():
+
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    baseline = min(run_python('pass') for _ in xrange(repeat))
+    elapsed = min(run_python('import sgsession') for _ in xrange(repeat))
+    print 'import sgsession: %.1fms (%.1fms over bare interpreter)' % (1000 * elapsed, 1000 * (elapsed - baseline))
+
+
+if __name__ == '__main__':
+    main()
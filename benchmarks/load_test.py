@@ -0,0 +1,121 @@
+"""Run many simulated clients against sessions on a slow Shotgun stand-in.
+
+Every client is a thread with its own :class:`~sgsession.session.Session`
+(or they all share one, with ``--shared``), which repeatedly runs a workload
+of the usual tool requests against an sgmock fixture wrapped in a
+:class:`~sgsession.latency.SlowShotgun`. It reports the throughput of whole
+workloads, their latency percentiles, and what the server saw.
+
+Usage::
+
+    python benchmarks/load_test.py [--clients 8] [--duration 10]
+        [--latency 0.05] [--jitter 0.01] [--bandwidth 1e6]
+        [--error-rate 0] [--max-concurrency 16] [--async-count 4]
+        [--shared] [--size 1000]
+
+Try changing ``--async-count`` (the pages which ``find_iter`` requests at
+once) against ``--max-concurrency`` to see where parallel requests stop
+helping.
+
+"""
+
+import argparse
+import threading
+import time
+
+from sgmock import Fixture, Shotgun
+
+from sgsession import Session
+from sgsession.latency import SimulatedError, SlowShotgun
+
+
+def build_fixture(sg, size):
+    fix = Fixture(sg)
+    proj = fix.Project('load_test_%d' % size)
+    step = fix.find_or_create('Step', code='Anm', short_name='Anm')
+    seqs = [sg.create('Sequence', {'code': 'SQ%02d' % i, 'project': proj}) for i in xrange(max(1, size // 100))]
+    shots = [sg.create('Shot', {'code': 'SH%04d' % i, 'sg_sequence': seqs[i % len(seqs)], 'project': proj})
+        for i in xrange(max(1, size // 4))]
+    for i in xrange(size):
+        sg.create('Task', {'content': 'Anm %d' % i, 'entity': shots[i % len(shots)], 'step': step, 'project': proj})
+    return {'type': 'Project', 'id': proj['id']}, [x['id'] for x in shots]
+
+
+def workload(session, proj, shot_ids, args):
+    """What a typical tool might do: find some shots, walk up from them,
+    then page through every task, and update one."""
+    shots = session.get('Shot', shot_ids[:20])
+    session.fetch_heirarchy([x for x in shots if x])
+    tasks = list(session.find_iter('Task', [('project', 'is', proj)], ['content', 'sg_status_list'],
+        per_page=args.per_page, async_count=args.async_count))
+    if tasks:
+        session.update(tasks[0], sg_status_list='ip')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--size', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--bandwidth', type=float, default=None)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--max-concurrency', type=int, default=16)
+    parser.add_argument('--per-page', type=int, default=250)
+    parser.add_argument('--async-count', type=int, default=4)
+    parser.add_argument('--shared', action='store_true')
+    args = parser.parse_args()
+
+    mock = Shotgun()
+    proj, shot_ids = build_fixture(mock, args.size)
+    sg = SlowShotgun(mock, latency=args.latency, jitter=args.jitter, bandwidth=args.bandwidth,
+        error_rate=args.error_rate, max_concurrency=args.max_concurrency, seed=0)
+
+    shared = Session(sg) if args.shared else None
+    lock = threading.Lock()
+    timings = []
+    failures = []
+    stop_at = time.time() + args.duration
+
+    def client():
+        while time.time() < stop_at:
+            session = shared or Session(sg)
+            start = time.time()
+            try:
+                workload(session, proj, shot_ids, args)
+            except SimulatedError as e:
+                with lock:
+                    failures.append(e)
+                continue
+            with lock:
+                timings.append(time.time() - start)
+
+    threads = [threading.Thread(target=client) for _ in xrange(args.clients)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+
+    timings.sort()
+    stats = sg.stats()
+    print '%d clients for %.1fs: %d workloads (%.2f/s), %d failed' % (
+        args.clients, elapsed, len(timings), len(timings) / elapsed, len(failures))
+    print 'workload seconds: p50 %.3f, p90 %.3f, p99 %.3f, max %.3f' % (
+        percentile(timings, 0.5), percentile(timings, 0.9), percentile(timings, 0.99), timings[-1] if timings else 0)
+    print 'server: %d requests (%.1f/s), %d errors, %d bytes, %d at most in flight, %.1fs queued' % (
+        stats['requests'], stats['requests'] / elapsed, stats['errors'], stats['bytes'],
+        stats['max_in_flight'], stats['queued_seconds'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Compare the old recursive _minimize_entities with the current one.
+
+Usage: python benchmarks/minimize_entities.py [number]
+
+"""
+
+import sys
+import timeit
+
+from sgsession import Session
+
+
+def recursive_minimize(data):
+    if isinstance(data, dict):
+        if data.get('type') == 'Attachment':
+            return data
+        if 'type' in data and 'id' in data:
+            return dict(type=data['type'], id=data['id'])
+        return dict((k, recursive_minimize(v)) for k, v in data.iteritems())
+    if isinstance(data, (list, tuple)):
+        return [recursive_minimize(x) for x in data]
+    return data
+
+
+def main():
+
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    session = Session(False)
+
+    shots = [session.merge({'type': 'Shot', 'id': i, 'code': 'AA_%04d' % i}) for i in xrange(1, 5001)]
+    minimal_shots = [x.minimal for x in shots]
+
+    payloads = (
+        ('minimal in filter', [['entity', 'in', minimal_shots], ['content', 'is', 'Anm']]),
+        ('entity in filter', [['entity', 'in', shots], ['content', 'is', 'Anm']]),
+        ('batch updates', [{
+            'request_type': 'update',
+            'entity_type': 'Task',
+            'entity_id': i,
+            'data': {'sg_status_list': 'ip', 'entity': minimal_shots[i]},
+        } for i in xrange(len(shots))]),
+    )
+
+    for label, payload in payloads:
+        for name, func in (
+            ('recursive', recursive_minimize),
+            ('current', session._minimize_entities),
+        ):
+            elapsed = min(timeit.repeat(lambda: func(payload), number=number, repeat=3))
+            print '%-18s %-10s %8.2f ms/call' % (label, name, 1e3 * elapsed / number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Compare the per-call overhead of Session.find and a prepared find.
+
+The server is replaced with one that answers instantly with the same rows, so
+that only the time spent inside of the session is measured.
+
+Usage: python benchmarks/prepared_find.py [number]
+
+"""
+
+import sys
+import timeit
+
+from sgsession import Session
+from sgsession.prepared import Param
+
+
+class InstantShotgun(object):
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def find(self, *args, **kwargs):
+        return self.rows
+
+
+def main():
+
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    shot = {'type': 'Shot', 'id': 1, 'code': 'AA_001'}
+    step = {'type': 'Step', 'id': 2, 'code': 'Anm'}
+    rows = [{'type': 'Task', 'id': 3, 'content': 'Animate', 'entity': shot, 'step': step}]
+    session = Session(InstantShotgun(rows))
+    fields = ['content', 'sg_status_list', 'entity.Shot.{code,sg_sequence}']
+
+    # Merging the results costs the same either way, so also compare without.
+    for merge in (True, False):
+
+        def find():
+            session.find('Task', [('entity', 'is', shot), ('step', 'is', step)], fields, merge=merge)
+
+        prepared = session.prepare('Task', [('entity', 'is', Param('shot')), ('step', 'is', Param('step'))],
+            fields, merge=merge)
+
+        def prepared_find():
+            prepared.find(shot=shot, step=step)
+
+        for name, func in (('Session.find', find), ('PreparedFind.find', prepared_find)):
+            elapsed = min(timeit.repeat(func, number=number, repeat=3))
+            print '%-18s merge=%-5s %8.1f us/call' % (name, merge, 1e6 * elapsed / number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+"""Benchmark the hot paths of a session against sgmock fixtures.
+
+Each benchmark runs against a fixture of a given number of entities (a
+project of sequences, shots, and tasks; always generated the same way), and
+reports the operations (usually entities) per second of its best run, and how
+much the peak memory of the process grew while running it. Every benchmark
+runs in a forked process so that they don't pay for each other's garbage.
+
+Results may be saved as a baseline, and later runs compared against it; any
+benchmark which is slower (or uses more memory) than the baseline by more
+than the tolerance is reported, and the exit status is 1.
+
+Usage::
+
+    python benchmarks/suite.py [--sizes 1000,10000,100000] [--repeat 3]
+        [--only merge,find] [--save baseline.json] [--compare baseline.json]
+        [--tolerance 0.2]
+
+Memory is the growth in ``ru_maxrss`` during the first timed run (not its
+setup), which is in KiB on Linux (but bytes on OS X), and is only measured
+where ``os.fork`` is available.
+
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import time
+import traceback
+
+from sgmock import Fixture, Shotgun
+
+from sgsession import Session
+
+
+task_fields = ['content', 'sg_status_list', 'entity', 'entity.Shot.code', 'step', 'step.Step.code', 'project']
+deep_keys = ['entity.Shot.code', 'step.Step.code']
+
+
+class Context(object):
+
+    """A fixture of the given size, and raw rows of every task in it."""
+
+    def __init__(self, size, seed=0):
+
+        rng = random.Random(seed)
+        statuses = ('wtg', 'ip', 'rev', 'fin')
+
+        self.size = size
+        self.sg = sg = Shotgun()
+        fix = Fixture(sg)
+
+        self.project = proj = fix.Project('benchmark_%d' % size)
+        steps = [fix.find_or_create('Step', code=code, short_name=code) for code in ('Anm', 'Light', 'Comp')]
+
+        num_seqs = max(1, size // 100)
+        num_shots = max(1, size // 5)
+        num_tasks = max(1, size - num_seqs - num_shots - len(steps) - 1)
+
+        seqs = [sg.create('Sequence', {'code': 'SQ%03d' % i, 'project': proj}) for i in xrange(num_seqs)]
+        self.shots = shots = [sg.create('Shot', {
+            'code': 'SQ%03d_%04d' % (i % num_seqs, i),
+            'sg_sequence': seqs[i % num_seqs],
+            'project': proj,
+        }) for i in xrange(num_shots)]
+        for i in xrange(num_tasks):
+            step = steps[i % len(steps)]
+            sg.create('Task', {
+                'content': '%s %d' % (step['code'], i),
+                'sg_status_list': rng.choice(statuses),
+                'entity': shots[rng.randrange(num_shots)],
+                'step': step,
+                'project': proj,
+            })
+
+        self.filters = [('project', 'is', {'type': 'Project', 'id': proj['id']})]
+        self.rows = sg.find('Task', self.filters, task_fields)
+
+
+def merged_tasks(ctx):
+    session = Session(ctx.sg)
+    return session, session.merge(ctx.rows)
+
+
+# Each benchmark takes a Context, and returns a setup function (which is
+# called before every run, untimed) and the number of operations in a run.
+# The setup function returns the function to time.
+
+def bench_merge(ctx):
+    def setup():
+        session = Session(ctx.sg)
+        return lambda: session.merge(ctx.rows)
+    return setup, len(ctx.rows)
+
+def bench_deep_getitem(ctx):
+    _, tasks = merged_tasks(ctx)
+    def run():
+        for task in tasks:
+            for key in deep_keys:
+                task[key]
+    return lambda: run, len(tasks) * len(deep_keys)
+
+def bench_find(ctx):
+    def setup():
+        session = Session(ctx.sg)
+        return lambda: session.find('Task', ctx.filters, task_fields)
+    return setup, len(ctx.rows)
+
+def bench_find_iter(ctx):
+    def setup():
+        session = Session(ctx.sg)
+        return lambda: list(session.find_iter('Task', ctx.filters, task_fields, per_page=500, async_count=2))
+    return setup, len(ctx.rows)
+
+def bench_fetch_heirarchy(ctx):
+    def setup():
+        session = Session(ctx.sg)
+        tasks = [session.merge({'type': 'Task', 'id': row['id']}) for row in ctx.rows]
+        return lambda: session.fetch_heirarchy(tasks)
+    return setup, len(ctx.rows)
+
+def bench_fetch_backrefs(ctx):
+    def setup():
+        session = Session(ctx.sg)
+        shots = [session.merge({'type': 'Shot', 'id': shot['id']}) for shot in ctx.shots]
+        return lambda: session.fetch_backrefs(shots, 'Task', 'entity')
+    return setup, len(ctx.shots)
+
+def bench_as_dict(ctx):
+    _, tasks = merged_tasks(ctx)
+    return lambda: lambda: [x.as_dict() for x in tasks], len(tasks)
+
+def bench_pformat(ctx):
+    _, tasks = merged_tasks(ctx)
+    return lambda: lambda: [x.pformat() for x in tasks], len(tasks)
+
+
+benchmarks = [
+    ('merge', bench_merge),
+    ('deep_getitem', bench_deep_getitem),
+    ('find', bench_find),
+    ('find_iter', bench_find_iter),
+    ('fetch_heirarchy', bench_fetch_heirarchy),
+    ('fetch_backrefs', bench_fetch_backrefs),
+    ('as_dict', bench_as_dict),
+    ('pformat', bench_pformat),
+]
+
+
+def run_benchmark(func, ctx, repeat):
+    setup, ops = func(ctx)
+    best = None
+    peak = None
+    for _ in xrange(repeat):
+        timed = setup()
+        # Memory is measured around the first timed run only, so that the
+        # preparation (e.g. the merge before deep_getitem) is not counted.
+        if peak is None:
+            start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.time()
+        timed()
+        elapsed = time.time() - start
+        if peak is None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        'ops': ops,
+        'seconds': best,
+        'ops_per_sec': ops / max(best, 1e-9),
+        'peak_kib': peak,
+    }
+
+
+def run_isolated(func, ctx, repeat):
+    """Run a benchmark in a child process, if we can."""
+
+    if not hasattr(os, 'fork'):
+        result = run_benchmark(func, ctx, repeat)
+        result['peak_kib'] = None
+        return result
+
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if not pid:
+        os.close(rfd)
+        try:
+            result = run_benchmark(func, ctx, repeat)
+        except Exception:
+            result = {'error': traceback.format_exc()}
+        with os.fdopen(wfd, 'w') as fh:
+            json.dump(result, fh)
+        os._exit(0)
+
+    os.close(wfd)
+    with os.fdopen(rfd) as fh:
+        encoded = fh.read()
+    os.waitpid(pid, 0)
+    try:
+        return json.loads(encoded)
+    except ValueError:
+        return {'error': 'benchmark process died'}
+
+
+def compare(results, baseline, tolerance):
+    """Get a list of regressions from the baseline."""
+    regressions = []
+    for key, result in sorted(results.iteritems()):
+        old = baseline.get(key)
+        if not old or 'error' in result or 'error' in old:
+            continue
+        if result['ops_per_sec'] < old['ops_per_sec'] * (1 - tolerance):
+            regressions.append('%s: %.0f ops/sec is %.0f%% slower than %.0f' % (
+                key, result['ops_per_sec'], 100 * (1 - result['ops_per_sec'] / old['ops_per_sec']), old['ops_per_sec'],
+            ))
+        # Ignore growth which is too small to measure reliably.
+        new_peak, old_peak = result.get('peak_kib'), old.get('peak_kib')
+        if new_peak and old_peak is not None and new_peak > 1024 and new_peak > old_peak * (1 + tolerance):
+            regressions.append('%s: peak memory of %d KiB is up from %d KiB' % (key, new_peak, old_peak))
+    return regressions
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only')
+    parser.add_argument('--save')
+    parser.add_argument('--compare')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(',')]
+    only = set(args.only.split(',')) if args.only else None
+    to_run = [(name, func) for name, func in benchmarks if only is None or name in only]
+
+    results = {}
+    for size in sizes:
+
+        start = time.time()
+        ctx = Context(size)
+        print '# %d entities (%d tasks); fixture built in %.1fs' % (size, len(ctx.rows), time.time() - start)
+
+        for name, func in to_run:
+            key = '%s@%d' % (name, size)
+            result = results[key] = run_isolated(func, ctx, args.repeat)
+            if 'error' in result:
+                print '%-24s ERROR' % key
+                print result['error']
+            else:
+                peak = result['peak_kib']
+                print '%-24s %12.0f ops/sec %10s KiB peak' % (key, result['ops_per_sec'], '-' if peak is None else peak)
+        sys.stdout.flush()
+
+    if args.save:
+        with open(args.save, 'w') as fh:
+            json.dump(results, fh, indent=4, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print
+            print 'Regressions against %s:' % args.compare
+            for line in regressions:
+                print '   ', line
+            return 1
+        print
+        print 'No regressions against %s.' % args.compare
+
+
+if __name__ == '__main__':
+    sys.exit(main())
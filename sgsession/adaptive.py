@@ -0,0 +1,113 @@
+"""Learning which fields to request from how results are used.
+
+It is very common to :meth:`~.Session.find` some entities, and then
+immediately :meth:`~.Entity.fetch` a few more fields on each of them, which
+costs another request every time. A :class:`FieldLearner` watches for fields
+which are fetched on entities shortly after they were found, and adds them
+to later finds of the same type from the same line of code.
+
+E.g.::
+
+    >>> session = Session(field_learner=True)
+    >>> for i in range(2):
+    ...     for shot in session.find('Shot', []):
+    ...         shot.fetch('sg_status_list') # Only requests the 1st time.
+    >>> print session.field_learner.format_report()
+    Shot from tool.py:3: sg_status_list
+
+Only finds called directly from outside of this package (and not via
+``async=True``) are considered.
+
+"""
+
+from __future__ import absolute_import
+
+import sys
+import threading
+import time
+
+
+class FieldLearner(object):
+
+    """Learns fields to add to finds based on what is fetched later.
+
+    :param float window: Seconds after a find in which a fetch counts.
+    :param int min_count: How many times a field must be fetched on entities
+        from a call site before it is added to that call site's finds.
+    :param int max_fields: The most fields which will be added to any find.
+    :param int max_recent: The most found entities to remember at once.
+
+    """
+
+    def __init__(self, window=30.0, min_count=2, max_fields=8, max_recent=10000):
+        self.window = window
+        self.min_count = min_count
+        self.max_fields = max_fields
+        self.max_recent = max_recent
+        self._lock = threading.Lock()
+        self._recent = {} # cache_key -> (shape, time)
+        self._counts = {} # shape -> {field: count}
+        self._learned = {} # shape -> [field, ...]
+
+    def call_site(self, depth=1):
+        """Get the ``filename:lineno`` which called into this package, or
+        ``None`` if it was called from within this package."""
+        frame = sys._getframe(depth + 1)
+        while frame is not None and frame.f_code.co_name == '_wrapped':
+            frame = frame.f_back
+        if frame is None:
+            return
+        name = frame.f_globals.get('__name__', '')
+        if name.startswith('sgsession.') or name.startswith('concurrent.'):
+            return
+        return '%s:%d' % (frame.f_code.co_filename, frame.f_lineno)
+
+    def fields_for(self, shape):
+        """Get the learned fields for a ``(type, call_site)`` shape."""
+        return list(self._learned.get(shape, ()))
+
+    def found(self, shape, entities):
+        """Remember that the given entities were found at the given shape."""
+        now = time.time()
+        with self._lock:
+            if len(self._recent) + len(entities) > self.max_recent:
+                self._prune(now)
+            for e in entities:
+                self._recent[e.cache_key] = (shape, now)
+
+    def _prune(self, now):
+        cutoff = now - self.window
+        for key, (_, found_at) in self._recent.items():
+            if found_at < cutoff:
+                del self._recent[key]
+        if len(self._recent) > self.max_recent:
+            self._recent.clear()
+
+    def fetched(self, entities, fields):
+        """Note that the given fields had to be fetched on the given entities."""
+        cutoff = time.time() - self.window
+        with self._lock:
+            for e in entities:
+                recent = self._recent.get(e.cache_key)
+                if recent is None or recent[1] < cutoff:
+                    continue
+                shape = recent[0]
+                learned = self._learned.setdefault(shape, [])
+                counts = self._counts.setdefault(shape, {})
+                for field in fields:
+                    if field in learned or dict.__contains__(e, field):
+                        continue
+                    counts[field] = count = counts.get(field, 0) + 1
+                    if count >= self.min_count and len(learned) < self.max_fields:
+                        learned.append(field)
+
+    def report(self):
+        """Get a dict mapping ``(type, call_site)`` to the learned fields."""
+        with self._lock:
+            return dict((shape, list(fields)) for shape, fields in self._learned.iteritems() if fields)
+
+    def format_report(self):
+        lines = []
+        for (type_, site), fields in sorted(self.report().iteritems()):
+            lines.append('%s from %s: %s' % (type_, site, ', '.join(fields)))
+        return '\n'.join(lines)
@@ -0,0 +1,286 @@
+"""Recording the requests a tool makes, and replaying them without a server.
+
+A :class:`RecordingShotgun` wraps the Shotgun that a session would use, and
+writes every request (with its response and how long it took) to a
+"cassette" file::
+
+    >>> with RecordingShotgun(shotgun, 'slow_tool.json') as sg:
+    ...     run_tool(Session(sg))
+
+A :class:`ReplayShotgun` answers the same requests from that file, so the
+tool can be run again without a network; e.g. to count the requests and CPU
+time it takes before and after a change::
+
+    >>> sg = ReplayShotgun('slow_tool.json', strict=True)
+    >>> run_tool(Session(sg))
+    >>> sg.stats()
+    {'recorded': 12, 'played': 12, 'unexpected': 0, 'recorded_seconds': 3.2, 'cpu_seconds': 0.4}
+
+Requests are matched by their method and arguments; a request made more times
+than it was recorded gets the last response again. In strict mode requests
+which were never recorded (or made more times than they were) raise a
+:class:`CassetteError`, otherwise they are logged and answered with an empty
+result. Writes which were never recorded always raise, since there is no
+empty result which the session could make sense of.
+
+"""
+
+from __future__ import absolute_import
+
+import copy
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+from .latency import request_methods
+
+
+log = logging.getLogger(__name__)
+
+
+#: The requests which change the server.
+write_methods = frozenset(('batch', 'create', 'delete', 'revive', 'update', 'upload'))
+
+
+class CassetteError(ValueError):
+    """A request which the cassette can't answer, in strict mode."""
+
+
+class _FixedOffset(datetime.tzinfo):
+
+    def __init__(self, seconds):
+        self._offset = datetime.timedelta(seconds=seconds)
+
+    def utcoffset(self, dt):
+        return self._offset
+
+    def dst(self, dt):
+        return datetime.timedelta(0)
+
+    def tzname(self, dt):
+        return None
+
+    def __reduce__(self):
+        return self.__class__, (self._offset.days * 86400 + self._offset.seconds, )
+
+
+def _encode(obj):
+    if isinstance(obj, datetime.datetime):
+        offset = obj.utcoffset()
+        return {
+            '__datetime__': obj.replace(tzinfo=None).isoformat(),
+            'utcoffset': None if offset is None else offset.days * 86400 + offset.seconds,
+        }
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError('cannot encode %r' % (obj, ))
+
+
+def _str(obj):
+    # Shotgun gives us str rather than unicode, so the cassette should too.
+    if isinstance(obj, unicode):
+        return obj.encode('utf8')
+    if isinstance(obj, list):
+        return [_str(x) for x in obj]
+    return obj
+
+
+def _decode(obj):
+    if '__datetime__' not in obj:
+        return dict((_str(k), _str(v)) for k, v in obj.iteritems())
+    value = obj['__datetime__']
+    fmt = '%Y-%m-%dT%H:%M:%S.%f' if '.' in value else '%Y-%m-%dT%H:%M:%S'
+    value = datetime.datetime.strptime(value, fmt)
+    if obj.get('utcoffset') is not None:
+        value = value.replace(tzinfo=_FixedOffset(obj['utcoffset']))
+    return value
+
+
+def _empty_response(method, args, kwargs):
+    if method in ('find', 'followers'):
+        return []
+    if method == 'summarize':
+        summary_fields = args[2] if len(args) > 2 else kwargs.get('summary_fields') or ()
+        return {'summaries': dict((x.get('field'), 0) for x in summary_fields), 'groups': []}
+    return None
+
+
+def _request_key(method, args, kwargs):
+    return json.dumps([method, args, kwargs], sort_keys=True, default=_encode)
+
+
+class RecordingShotgun(object):
+
+    """Wraps a Shotgun, and records every request made through it.
+
+    :param shotgun: The Shotgun to make requests of; ``shotgun_api3.Shotgun``
+        instances are wrapped in a :class:`~sgsession.pool.ShotgunPool`.
+    :param str path: Where to :meth:`save` the cassette, if given.
+
+    As a context manager, the cassette is saved on exit.
+
+    """
+
+    def __init__(self, shotgun, path=None):
+        from .session import _wrap_shotgun
+        self.shotgun = _wrap_shotgun(shotgun)
+        self.path = path
+        self.interactions = []
+        self._lock = threading.Lock()
+        self._start_time = time.time()
+
+    def __getattr__(self, name):
+        if name == 'shotgun':
+            raise AttributeError(name)
+        value = getattr(self.shotgun, name)
+        if name not in request_methods or not callable(value):
+            return value
+        def method(*args, **kwargs):
+            return self._record(name, value, args, kwargs)
+        method.__name__ = name
+        return method
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.path:
+            self.save()
+
+    def _record(self, name, func, args, kwargs):
+        # Copy everything, since the caller may modify it later.
+        start = time.time()
+        interaction = {
+            'method': name,
+            'args': copy.deepcopy(list(args)),
+            'kwargs': copy.deepcopy(kwargs),
+            'start': start - self._start_time,
+        }
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            interaction['error'] = '%s: %s' % (e.__class__.__name__, e)
+            raise
+        else:
+            interaction['response'] = copy.deepcopy(result)
+            return result
+        finally:
+            interaction['duration'] = time.time() - start
+            with self._lock:
+                self.interactions.append(interaction)
+
+    def save(self, path=None):
+        """Write everything recorded so far to the cassette file."""
+        path = path or self.path
+        if not path:
+            raise ValueError('no path to save cassette to')
+        with self._lock:
+            interactions = list(self.interactions)
+        interactions.sort(key=lambda x: x['start'])
+        encoded = json.dumps({
+            'version': 1,
+            'base_url': getattr(self.shotgun, 'base_url', None),
+            'interactions': interactions,
+        }, indent=1, sort_keys=True, default=_encode)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'w') as fh:
+            fh.write(encoded)
+        os.rename(tmp_path, path)
+
+
+class ReplayShotgun(object):
+
+    """Answers requests from a cassette written by :class:`RecordingShotgun`.
+
+    :param str path: The cassette to replay.
+    :param bool strict: Raise :class:`CassetteError` for any request which
+        was not recorded, or is made more times than it was recorded. Writes
+        which were not recorded raise either way.
+    :param bool timing: Take as long as the recorded requests did.
+
+    Requests which failed when they were recorded fail with a
+    :class:`CassetteError` when they are replayed.
+
+    """
+
+    def __init__(self, path, strict=False, timing=False):
+
+        self.path = path
+        self.strict = strict
+        self.timing = timing
+
+        with open(path) as fh:
+            data = json.load(fh, object_hook=_decode)
+        if data.get('version') != 1:
+            raise ValueError('unknown cassette version', path, data.get('version'))
+        self.interactions = data['interactions']
+        self.base_url = data.get('base_url')
+
+        self._queues = {}
+        for interaction in self.interactions:
+            key = _request_key(interaction['method'], interaction['args'], interaction['kwargs'])
+            self._queues.setdefault(key, []).append(interaction)
+        self._played = {}
+
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def __getattr__(self, name):
+        if name not in request_methods:
+            raise AttributeError(name)
+        def method(*args, **kwargs):
+            return self._replay(name, args, kwargs)
+        method.__name__ = name
+        return method
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'played': 0, 'unexpected': 0, 'recorded_seconds': 0.0}
+            self._cpu_start = sum(os.times()[:2])
+
+    def stats(self):
+        """Get counts of the ``recorded`` requests, those ``played`` and
+        ``unexpected``, the ``recorded_seconds`` that the played ones took,
+        and the ``cpu_seconds`` this process has used since creation (or
+        :meth:`reset_stats`)."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cpu_seconds'] = sum(os.times()[:2]) - self._cpu_start
+        stats['recorded'] = len(self.interactions)
+        return stats
+
+    def unplayed(self):
+        """Get the recorded interactions which have not been replayed."""
+        with self._lock:
+            return [x for key, queue in self._queues.iteritems() for x in queue[self._played.get(key, 0):]]
+
+    def _replay(self, name, args, kwargs):
+
+        key = _request_key(name, list(args), kwargs)
+        with self._lock:
+            queue = self._queues.get(key)
+            index = self._played.get(key, 0)
+            if not queue or (self.strict and index >= len(queue)):
+                self._stats['unexpected'] += 1
+                interaction = None
+            else:
+                interaction = queue[min(index, len(queue) - 1)]
+                self._played[key] = index + 1
+                self._stats['played'] += 1
+                self._stats['recorded_seconds'] += interaction['duration']
+
+        if interaction is None:
+            message = 'unexpected %s request: %s' % (name, key)
+            if self.strict or name in write_methods:
+                raise CassetteError(message)
+            log.warning(message)
+            return _empty_response(name, args, kwargs)
+
+        if self.timing:
+            time.sleep(interaction['duration'])
+        if 'error' in interaction:
+            raise CassetteError('recorded %s request failed: %s' % (name, interaction['error']))
+        return copy.deepcopy(interaction['response'])
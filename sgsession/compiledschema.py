@@ -0,0 +1,273 @@
+"""A compact, memory-mapped index of schema name resolution.
+
+Loading the full :mod:`sgschema` schema is a large part of the startup of
+every process on big sites, even though most sessions only resolve the names
+of a few entity types and their fields. :func:`compile_schema` writes the
+entity and field name resolution tables of a full schema into one file, and
+:class:`CompiledSchema` maps that file read-only (so its pages are shared
+between processes) and parses the field table of a type only once that type
+is used.
+
+Anything which is not in the tables is passed on to the full schema, which
+is only loaded when that first happens::
+
+    >>> compile_schema(Schema.from_cache(shotgun), '/var/cache/shotgun/schema.sgsc')
+    >>> session = Session(schema='/var/cache/shotgun/schema.sgsc')
+
+Sessions will also use the file at ``$SGSESSION_COMPILED_SCHEMA`` if it exists.
+
+The file starts with a magic string, then the offset and length of a JSON
+header (as little-endian 64-bit integers). The header holds the entity name
+table and the offset and length of the JSON field table of each type.
+
+"""
+
+from __future__ import absolute_import
+
+import errno
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+
+
+_magic = 'SGSESSION-SCHEMA-1\n'
+_prefix = struct.Struct('<QQ')
+
+
+def _encode_table(table):
+    # JSON gives us unicode, but the rest of the session uses str.
+    return dict((k.encode('utf8'), v.encode('utf8')) for k, v in table.iteritems())
+
+
+def _has_entities(x):
+    if isinstance(x, dict):
+        return 'type' in x or any(_has_entities(v) for v in x.itervalues())
+    if isinstance(x, (list, tuple)):
+        return any(_has_entities(v) for v in x)
+    return False
+
+
+class CompiledSchema(object):
+
+    """Name resolution from a file written by :func:`compile_schema`.
+
+    :param str path: The compiled schema.
+    :param fallback: A callable which returns the full schema (or ``None``),
+        for names which are not in the file.
+
+    This may be used anywhere a ``sgschema.Schema`` is; attributes which are
+    not implemented here are taken from the full schema. If there is no full
+    schema, names which are not in the file are used as they are given (as
+    they would be by a session without a schema).
+
+    """
+
+    def __init__(self, path, fallback=None):
+
+        self.path = path
+        self._fallback = fallback
+        self._full = None
+        self._lock = threading.Lock()
+
+        with open(path, 'rb') as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:len(_magic)] != _magic or len(self._map) < len(_magic) + _prefix.size:
+            raise ValueError('not a compiled schema', path)
+        offset, length = _prefix.unpack(self._map[len(_magic):len(_magic) + _prefix.size])
+        header = json.loads(self._map[offset:offset + length])
+
+        self._entities = _encode_table(header['entities'])
+        self._sections = header['fields']
+        self._fields = {}
+
+    def __repr__(self):
+        return '<CompiledSchema %s>' % self.path
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        full = self.full
+        if full is None:
+            raise AttributeError('%s (and there is no full schema)' % name)
+        return getattr(full, name)
+
+    @property
+    def full(self):
+        """The full schema, loaded the first time it is needed (or ``None``)."""
+        if self._full is None:
+            with self._lock:
+                if self._full is None:
+                    self._full = (self._fallback() if self._fallback else None) or False
+        return self._full or None
+
+    @property
+    def loaded_types(self):
+        """The entity types whose field tables have been parsed."""
+        return sorted(self._fields)
+
+    def _field_table(self, type_):
+        try:
+            return self._fields[type_]
+        except KeyError:
+            pass
+        section = self._sections.get(type_)
+        if section:
+            offset, length = section
+            table = _encode_table(json.loads(self._map[offset:offset + length]))
+        else:
+            table = {}
+        self._fields[type_] = table
+        return table
+
+    def resolve_one_entity(self, name):
+        try:
+            return self._entities[name]
+        except KeyError:
+            full = self.full
+            return full.resolve_one_entity(name) if full else name
+
+    def _lookup_field(self, type_, name):
+        if name in ('type', 'id'):
+            return name
+        try:
+            return self._field_table(type_)[name]
+        except KeyError:
+            # Deep fields are resolved one link at a time.
+            parts = name.split('.', 2)
+            if len(parts) != 3:
+                raise
+            link_type = self._entities[parts[1]]
+            return '%s.%s.%s' % (
+                self._field_table(type_)[parts[0]],
+                link_type,
+                self._lookup_field(link_type, parts[2]),
+            )
+
+    def resolve_one_field(self, type_, name):
+        try:
+            return self._lookup_field(type_, name)
+        except KeyError:
+            full = self.full
+            return full.resolve_one_field(type_, name) if full else name
+
+    def resolve_field(self, type_, fields):
+        if not isinstance(fields, basestring):
+            try:
+                return [self._lookup_field(type_, x) for x in fields]
+            except KeyError:
+                pass
+        full = self.full
+        if full:
+            return full.resolve_field(type_, fields)
+        return [fields] if isinstance(fields, basestring) else [self.resolve_one_field(type_, x) for x in fields]
+
+    def _resolve_structure(self, x, entity_type=None):
+        if isinstance(x, (list, tuple)):
+            return type(x)(self._resolve_structure(v) for v in x)
+        if not isinstance(x, dict):
+            return x
+        if 'type' in x:
+            entity_type = self._entities[x['type']]
+        if entity_type is None:
+            return dict((k, self._resolve_structure(v)) for k, v in x.iteritems())
+        res = dict((self._lookup_field(entity_type, k), self._resolve_structure(v)) for k, v in x.iteritems())
+        if 'type' in res:
+            res['type'] = entity_type
+        return res
+
+    def resolve_structure(self, x, entity_type=None):
+        # Without any entities (or a type to resolve keys against) there is
+        # nothing to resolve.
+        if entity_type is None and not _has_entities(x):
+            return x
+        try:
+            if entity_type is not None:
+                entity_type = self._entities[entity_type]
+            return self._resolve_structure(x, entity_type)
+        except KeyError:
+            pass
+        full = self.full
+        return full.resolve_structure(x, entity_type) if full else x
+
+
+def compile_schema(schema, path, entity_types=None):
+    """Write the name resolution tables of a full schema to a file.
+
+    :param schema: The full ``sgschema.Schema``.
+    :param str path: Where to write the compiled schema.
+    :param entity_types: Only include fields of these types, if given.
+
+    The names in the tables are those of every entity type and field (and
+    their aliases), along with field names without their ``sg_`` prefix; the
+    schema itself decides what each of them resolves to. The file is replaced
+    atomically, so processes which already have it mapped are unaffected.
+
+    """
+
+    entity_map = getattr(schema, 'entities', None) or {}
+
+    entity_names = set(entity_map)
+    entity_names.update(getattr(schema, 'entity_aliases', None) or ())
+    entities = {}
+    for name in entity_names:
+        try:
+            entities[name] = schema.resolve_one_entity(name)
+        except (KeyError, ValueError):
+            pass
+
+    fields = {}
+    for type_ in sorted(set(entities.itervalues())):
+        if entity_types is not None and type_ not in entity_types:
+            continue
+        entity = entity_map.get(type_)
+        names = set(getattr(entity, 'fields', None) or ())
+        names.update(getattr(entity, 'field_aliases', None) or ())
+        names.update([re.sub(r'^sg_', '', x) for x in names])
+        table = {}
+        for name in names:
+            try:
+                table[name] = schema.resolve_one_field(type_, name)
+            except (KeyError, ValueError):
+                pass
+        fields[type_] = table
+
+    _write(path, entities, fields)
+
+
+def _write(path, entities, fields):
+
+    body = []
+    offset = len(_magic) + _prefix.size
+    sections = {}
+    for type_, table in sorted(fields.iteritems()):
+        encoded = json.dumps(table, sort_keys=True, separators=(',', ':'))
+        sections[type_] = [offset, len(encoded)]
+        body.append(encoded)
+        offset += len(encoded)
+
+    header = json.dumps({'entities': entities, 'fields': sections}, sort_keys=True, separators=(',', ':'))
+
+    dir_ = os.path.dirname(os.path.abspath(path))
+    try:
+        os.makedirs(dir_)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    import tempfile
+    fd, tmp_path = tempfile.mkstemp(dir=dir_, prefix='.%s.' % os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(_magic)
+            fh.write(_prefix.pack(offset, len(header)))
+            for encoded in body:
+                fh.write(encoded)
+            fh.write(header)
+        os.rename(tmp_path, path)
+    except:
+        os.unlink(tmp_path)
+        raise
@@ -7,6 +7,9 @@ import sys
 from .utils import expect_datetime, parse_isotime
 
 
+_missing = object()
+
+
 def asyncable(func):
     @functools.wraps(func)
     def _wrapped(self, *args, **kwargs):
@@ -37,6 +40,9 @@ class Entity(dict):
         # Do we have confirmation that this entity exists and has not been
         # retired on the server? None -> we have not checked yet.
         self._exists = None
+
+        # Fields which were set locally, and not yet committed.
+        self._dirty = None
     
     @property
     def cache_key(self):
@@ -265,6 +271,18 @@ class Entity(dict):
             raise KeyError(key)
     
     def __setitem__(self, key, value):
+        self._mark_dirty(self._set(key, value))
+
+    def _mark_dirty(self, key):
+        # The server sets these itself, and rejects them in updates.
+        if key not in ('type', 'id', 'updated_at', 'created_at') and '.' not in key:
+            if self._dirty is None:
+                self._dirty = set()
+                self.session._dirty[id(self)] = self
+            self._dirty.add(key)
+
+    def _set(self, key, value):
+        """Set a field without marking it as changed, e.g. when merging."""
         key = self._resolve_key(key)
 
         # Try to assert these are datetime.
@@ -274,15 +292,38 @@ class Entity(dict):
             except ValueError as e:
                 log.exception('%s is not a timestamp' % key)
 
-        dict.__setitem__(self, key, self.session.merge(value))
+        value = self.session.merge(value)
+        if self.session._indexes:
+            self.session._reindex(self, key, dict.get(self, key, _missing), value)
+        dict.__setitem__(self, key, value)
+        return key
     
     def setdefault(self, key, value):
         key = self._resolve_key(key)
-        return dict.setdefault(self, key, self.session.merge(value))
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        self._set(key, value)
+        return dict.__getitem__(self, key)
+
+    @property
+    def dirty_fields(self):
+        """The set of fields which were set locally and not yet committed."""
+        return set(self._dirty or ())
     
     def update(self, *args, **kwargs):
         for x in itertools.chain(args, [kwargs]):
             self._update(x)
+
+    def set_many(self, *args, **kwargs):
+        """Set many fields at once, marking them as changed (like ``__setitem__``).
+
+        Unlike :meth:`update`, which merges data as if it came from the server,
+        this always overwrites, and the fields are sent by :meth:`commit`.
+
+        """
+        for x in itertools.chain(args, [kwargs]):
+            for k, v in x.iteritems():
+                self[k] = v
     
     def _update(self, data, over=None, created_at=None, depth=0, memo=None):
         
@@ -352,7 +393,11 @@ class Entity(dict):
             
             if do_override or k not in self:
                 
-                self[k] = v
+                k = self._set(k, v)
+                if self._dirty:
+                    # Merged data replaces local changes, which would
+                    # otherwise send the merged value back on commit.
+                    self._dirty.discard(k)
 
                 # Establish a backref.
                 if isinstance(v, Entity):
@@ -439,6 +484,15 @@ class Entity(dict):
         """
         self.session.fetch_backrefs([self], type_, field)
     
+    @asyncable
+    def commit(self):
+        """Send fields which were set locally to the server.
+        
+        See :meth:`.Session.commit` for the bulk version.
+        
+        """
+        return self.session.commit([self])
+    
     @asyncable
     def parent(self, fetch=True, extra=None):
         """Get the parent of this Entity, automatically fetching from the server."""
@@ -485,7 +539,7 @@ class Entity(dict):
                 
         # If we were given one from the parent, assume it.
         if project:
-            self['project'] = project
+            self._set('project', project)
             return project
                 
         if fetch:
@@ -0,0 +1,188 @@
+"""Evaluation of Shotgun filters against entities we already have.
+
+This understands the same filter grammar as ``Shotgun.find``::
+
+    >>> match(task, [
+    ...     ('entity', 'is', shot),
+    ...     {'filter_operator': 'any', 'filters': [
+    ...         ('step.Step.code', 'in', ['Anm', 'Comp']),
+    ...         ('content', 'starts_with', 'fx'),
+    ...     ]},
+    ... ])
+    True
+
+Text comparisons are case-insensitive (as they are on the server). If a filter
+cannot be answered with the data at hand (e.g. a field has not been fetched,
+or the relation is not supported) then :class:`UnsupportedFilter` is raised,
+and the caller should ask the server instead.
+
+"""
+
+from __future__ import absolute_import
+
+
+class UnsupportedFilter(ValueError):
+    pass
+
+
+def match(entity, filters, filter_operator=None):
+    """Does the given entity pass the given filters?
+
+    :param dict entity: The entity to test.
+    :param filters: A list of filters, or a ``filter_operator`` dict.
+    :param str filter_operator: ``"all"`` (the default) or ``"any"``.
+    :raises UnsupportedFilter: when we cannot be sure.
+
+    """
+    if isinstance(filters, dict):
+        return _match_one(entity, filters)
+    return _combine(entity, filters, filter_operator)
+
+
+def _combine(entity, filters, filter_operator):
+    if filter_operator in (None, 'all', 'and'):
+        return all(_match_one(entity, x) for x in filters)
+    if filter_operator in ('any', 'or'):
+        return any(_match_one(entity, x) for x in filters)
+    raise UnsupportedFilter('unknown filter_operator', filter_operator)
+
+
+def _match_one(entity, filter_):
+
+    if isinstance(filter_, dict):
+        if 'filters' in filter_:
+            return _combine(entity, filter_['filters'], filter_.get('filter_operator'))
+        try:
+            path = filter_['path']
+            relation = filter_['relation']
+            values = list(filter_['values'])
+        except KeyError:
+            raise UnsupportedFilter('malformed filter', filter_)
+    else:
+        if len(filter_) < 2:
+            raise UnsupportedFilter('malformed filter', filter_)
+        path, relation = filter_[:2]
+        values = list(filter_[2:])
+
+    try:
+        func = _relations[relation]
+    except KeyError:
+        raise UnsupportedFilter('unsupported relation', relation)
+
+    # Relations which take many values may have them packed into one list.
+    if relation in _multi_value_relations and len(values) == 1 and isinstance(values[0], (list, tuple)):
+        values = list(values[0])
+
+    return func(get_value(entity, path), values)
+
+
+def get_value(entity, path):
+    """Get a (potentially deep) field from an entity.
+
+    Links of a different type to the deep field result in ``None``, as they
+    do on the server, while fields we don't have raise :class:`UnsupportedFilter`.
+
+    """
+    parts = path.split('.')
+    while len(parts) >= 3:
+        link = _get_field(entity, parts[0])
+        if not isinstance(link, dict) or link.get('type') != parts[1]:
+            return None
+        entity = link
+        parts = parts[2:]
+    if len(parts) != 1:
+        raise UnsupportedFilter('malformed field path', path)
+    return _get_field(entity, parts[0])
+
+
+def _get_field(entity, field):
+    try:
+        return entity[field]
+    except KeyError:
+        raise UnsupportedFilter('field not loaded', entity.get('type'), entity.get('id'), field)
+
+
+def normalize_value(value):
+    """Convert a value into the form which is compared by the filters; entities
+    become ``(type, id)`` tuples and text is lowercased."""
+    if isinstance(value, dict) and 'type' in value and 'id' in value:
+        return (value['type'], value['id'])
+    if isinstance(value, basestring):
+        return value.lower()
+    return value
+
+
+def _equals(actual, expected):
+    # Multi-entity fields match if any of their entities do.
+    expected = normalize_value(expected)
+    if isinstance(actual, (list, tuple)):
+        return any(normalize_value(x) == expected for x in actual)
+    return normalize_value(actual) == expected
+
+
+def _is(actual, values):
+    return _equals(actual, values[0])
+
+def _is_not(actual, values):
+    return not _equals(actual, values[0])
+
+def _in(actual, values):
+    return any(_equals(actual, x) for x in values)
+
+def _not_in(actual, values):
+    return not _in(actual, values)
+
+def _less_than(actual, values):
+    return actual is not None and actual < values[0]
+
+def _greater_than(actual, values):
+    return actual is not None and actual > values[0]
+
+def _between(actual, values):
+    return actual is not None and values[0] <= actual <= values[1]
+
+def _not_between(actual, values):
+    return actual is not None and not _between(actual, values)
+
+def _text(actual):
+    if not isinstance(actual, basestring):
+        raise UnsupportedFilter('text relation on non-text value', actual)
+    return actual.lower()
+
+def _starts_with(actual, values):
+    return actual is not None and _text(actual).startswith(values[0].lower())
+
+def _ends_with(actual, values):
+    return actual is not None and _text(actual).endswith(values[0].lower())
+
+def _contains(actual, values):
+    return actual is not None and values[0].lower() in _text(actual)
+
+def _not_contains(actual, values):
+    return not _contains(actual, values)
+
+def _type_is(actual, values):
+    return isinstance(actual, dict) and actual.get('type') == values[0]
+
+def _type_is_not(actual, values):
+    return not _type_is(actual, values)
+
+
+_relations = {
+    'is': _is,
+    'is_not': _is_not,
+    'in': _in,
+    'not_in': _not_in,
+    'less_than': _less_than,
+    'greater_than': _greater_than,
+    'between': _between,
+    'not_between': _not_between,
+    'starts_with': _starts_with,
+    'ends_with': _ends_with,
+    'contains': _contains,
+    'not_contains': _not_contains,
+    'type_is': _type_is,
+    'type_is_not': _type_is_not,
+}
+
+_multi_value_relations = set(('in', 'not_in', 'between', 'not_between'))
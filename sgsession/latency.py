@@ -0,0 +1,158 @@
+"""A stand-in for a Shotgun server which is as slow as a real one.
+
+The mock servers used in tests answer instantly, so there is no way to tell
+if parallel requests (e.g. :meth:`.Session.find_iter` with ``async_count``,
+or ``async=True``) are any faster than serial ones. A :class:`SlowShotgun`
+wraps another Shotgun (usually ``sgmock.Shotgun``) and delays every request
+to mimic a real server on a real network::
+
+    >>> sg = SlowShotgun(sgmock.Shotgun(), latency=0.1, jitter=0.02,
+    ...     bandwidth=1e6, max_concurrency=4)
+    >>> session = Session(sg)
+
+Each request waits for one of ``max_concurrency`` slots, then takes
+``latency`` (give or take ``jitter``) seconds plus the time to transfer the
+JSON encoded response at ``bandwidth`` bytes per second. With ``error_rate``,
+that fraction of requests fail with a :class:`SimulatedError` instead.
+
+By default the wrapped Shotgun is only called by one thread at a time, since
+mock servers are rarely thread-safe; pass ``serialize=False`` when wrapping
+one which is, so its calls overlap as they would on a real server.
+
+See ``benchmarks/load_test.py`` for running many clients against one.
+
+"""
+
+from __future__ import absolute_import
+
+import json
+import random
+import threading
+import time
+
+
+#: The Shotgun methods which are delayed; everything else is passed through.
+request_methods = frozenset((
+    'batch', 'create', 'delete', 'find', 'find_one', 'follow', 'followers',
+    'revive', 'schema_entity_read', 'schema_field_read', 'schema_read',
+    'summarize', 'text_search', 'update', 'upload',
+))
+
+
+class SimulatedError(IOError):
+    """A request failure injected by a :class:`SlowShotgun`."""
+
+
+class SlowShotgun(object):
+
+    """Wraps a Shotgun, so that its requests take as long as a real server.
+
+    :param shotgun: The Shotgun to answer requests.
+    :param float latency: Seconds each request takes, before transfer.
+    :param float jitter: The most seconds to randomly add to or remove
+        from the latency.
+    :param float bandwidth: Bytes per second to transfer responses at, or
+        ``None`` for no transfer time.
+    :param float error_rate: The fraction of requests which fail.
+    :param int max_concurrency: The most requests which are handled at
+        once; others wait for their turn. ``None`` for no limit.
+    :param seed: For the random jitter and errors.
+    :param bool serialize: Only call the wrapped Shotgun from one thread at
+        a time (the delays still happen in parallel). Leave this on for mock
+        servers, and turn it off for thread-safe ones.
+
+    """
+
+    def __init__(self, shotgun, latency=0.05, jitter=0.0, bandwidth=None,
+        error_rate=0.0, max_concurrency=None, seed=None, serialize=True):
+
+        self.shotgun = shotgun
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.max_concurrency = max_concurrency
+        self.serialize = serialize
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._call_lock = threading.Lock() if serialize else None
+        self._slots = threading.Semaphore(max_concurrency) if max_concurrency else None
+
+        self.reset_stats()
+
+    def __getattr__(self, name):
+        if name == 'shotgun':
+            raise AttributeError(name)
+        value = getattr(self.shotgun, name)
+        if name not in request_methods or not callable(value):
+            return value
+        def method(*args, **kwargs):
+            return self._request(name, value, args, kwargs)
+        method.__name__ = name
+        return method
+
+    def reset_stats(self):
+        with self._lock:
+            # Requests may still be in flight.
+            old = self.__dict__.get('_stats') or {}
+            self._stats = {
+                'requests': 0,
+                'errors': 0,
+                'bytes': 0,
+                'in_flight': old.get('in_flight', 0),
+                'max_in_flight': 0,
+                'queued_seconds': 0.0,
+            }
+
+    def stats(self):
+        """Get counts of ``requests``, ``errors``, response ``bytes``, the
+        ``max_in_flight`` at once, and total ``queued_seconds`` waiting for
+        a slot."""
+        with self._lock:
+            stats = dict(self._stats)
+        del stats['in_flight']
+        return stats
+
+    def _request(self, name, func, args, kwargs):
+
+        start = time.time()
+        if self._slots:
+            self._slots.acquire()
+        try:
+
+            with self._lock:
+                stats = self._stats
+                stats['requests'] += 1
+                stats['queued_seconds'] += time.time() - start
+                stats['in_flight'] += 1
+                stats['max_in_flight'] = max(stats['max_in_flight'], stats['in_flight'])
+                delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+                failed = self.error_rate and self._random.random() < self.error_rate
+
+            time.sleep(delay)
+
+            if failed:
+                with self._lock:
+                    self._stats['errors'] += 1
+                raise SimulatedError('simulated failure of %s' % name)
+
+            if self._call_lock:
+                with self._call_lock:
+                    result = func(*args, **kwargs)
+            else:
+                result = func(*args, **kwargs)
+
+            if self.bandwidth:
+                size = len(json.dumps(result, default=str))
+                with self._lock:
+                    self._stats['bytes'] += size
+                time.sleep(size / float(self.bandwidth))
+
+            return result
+
+        finally:
+            with self._lock:
+                self._stats['in_flight'] -= 1
+            if self._slots:
+                self._slots.release()
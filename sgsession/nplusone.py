@@ -0,0 +1,129 @@
+"""Detection of "N+1" requests, i.e. fetching one entity at a time in a loop.
+
+Code such as::
+
+    >>> for task in session.find('Task', []):
+    ...     print task.parent()['code']
+
+looks harmless, but makes a request for every task. An
+:class:`NPlusOneDetector` watches for many requests about single entities of
+the same type and fields from the same line of code in a short time, and
+logs a warning pointing at that line and the bulk method to use instead::
+
+    >>> session = Session(n_plus_one=True)
+    >>> for task in session.find('Task', []):
+    ...     print task.parent()['code']
+    WARNING:sgsession.nplusone:5 single Task requests for ['entity'] from tool.py:2 within 1.0s; use Session.fetch_heirarchy(entities) instead
+
+In tests it is more useful to fail outright::
+
+    >>> session = Session(n_plus_one=NPlusOneDetector(strict=True))
+
+"""
+
+from __future__ import absolute_import
+
+import collections
+import logging
+import sys
+import threading
+import time
+
+
+log = logging.getLogger(__name__)
+
+
+class NPlusOneError(RuntimeError):
+    """Raised by a strict :class:`NPlusOneDetector`."""
+
+
+def call_site():
+    """Get the ``(filename, lineno)`` of the closest caller from outside of
+    this package (and the thread pools), or ``None`` if there isn't one."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        name = frame.f_globals.get('__name__', '')
+        if not (name.startswith('sgsession.') or name.startswith('concurrent.') or name == 'threading'):
+            return frame.f_code.co_filename, frame.f_lineno
+        frame = frame.f_back
+
+
+class NPlusOneDetector(object):
+
+    """Watches for repeated single-entity requests.
+
+    :param float window: Seconds in which the requests must happen.
+    :param int threshold: How many requests from one call site it takes.
+    :param bool strict: Raise :class:`NPlusOneError` instead of logging.
+
+    Each call site is only reported once, so a loop which is left alone will
+    not flood the logs.
+
+    """
+
+    def __init__(self, window=1.0, threshold=5, strict=False):
+        self.window = window
+        self.threshold = threshold
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._times = {} # (type, fields, site) -> deque of times
+        self._reported = set()
+        self._local = threading.local()
+        self.reports = []
+
+    def bind(self, func):
+        """Wrap a function which will be called on another thread, so that
+        the requests it makes are attributed to the current call site."""
+        site = call_site()
+        def bound(*args, **kwargs):
+            old = getattr(self._local, 'site', None)
+            self._local.site = site
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._local.site = old
+        return bound
+
+    def observe(self, type_, fields, suggestion):
+        """Note a request about a single entity.
+
+        :param str type_: The entity type of the request.
+        :param fields: The fields requested.
+        :param str suggestion: The bulk method to use instead.
+
+        """
+
+        site = call_site() or getattr(self._local, 'site', None)
+        if site is None:
+            return
+        key = (type_, tuple(sorted(fields or ())), site)
+
+        now = time.time()
+        with self._lock:
+            if key in self._reported:
+                return
+            times = self._times.get(key)
+            if times is None:
+                times = self._times[key] = collections.deque()
+            times.append(now)
+            while times and times[0] < now - self.window:
+                times.popleft()
+            if len(times) < self.threshold:
+                return
+            self._reported.add(key)
+            del self._times[key]
+
+        message = '%d single %s requests for %r from %s:%d within %.1fs; use %s instead' % (
+            self.threshold, type_, list(key[1]), site[0], site[1], self.window, suggestion,
+        )
+        self.reports.append(message)
+        if self.strict:
+            raise NPlusOneError(message)
+        log.warning(message)
+
+    def reset(self):
+        """Forget everything seen so far, including what was reported."""
+        with self._lock:
+            self._times.clear()
+            self._reported.clear()
+            self.reports = []
@@ -0,0 +1,82 @@
+"""Queries which are normalized once and run many times.
+
+See :meth:`.Session.prepare`.
+
+"""
+
+from __future__ import absolute_import
+
+
+class Param(object):
+
+    """A placeholder for a value in the filters of a prepared query.
+
+    :param str name: The keyword to bind the value with.
+
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return 'Param(%r)' % self.name
+
+
+def _has_params(obj):
+    if isinstance(obj, Param):
+        return True
+    if isinstance(obj, dict):
+        return any(_has_params(v) for v in obj.itervalues())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_params(x) for x in obj)
+    return False
+
+
+def _bind(obj, values):
+    if isinstance(obj, Param):
+        try:
+            return values[obj.name]
+        except KeyError:
+            raise TypeError('missing value for %r' % obj)
+    if isinstance(obj, dict):
+        return dict((k, _bind(v, values)) for k, v in obj.iteritems())
+    if isinstance(obj, (list, tuple)):
+        return [_bind(x, values) for x in obj]
+    return obj
+
+
+class PreparedFind(object):
+
+    """A :meth:`.Session.find` with its type, filters, and fields resolved."""
+
+    def __init__(self, session, type_, filters, fields, args=(), kwargs=None):
+        self.session = session
+        self.entity_type = type_
+        self.fields = fields
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self._merge = self.kwargs.pop('merge', True)
+        self._cache = self.kwargs.pop('cache', True)
+        self._local = self.kwargs.pop('local', False)
+
+        # Only the filters which contain parameters need to be rebuilt.
+        if isinstance(filters, dict):
+            filters = [filters]
+        self._filters = [(x, _has_params(x)) for x in filters]
+
+    def __repr__(self):
+        return '<PreparedFind %s %r>' % (self.entity_type, [x for x, _ in self._filters])
+
+    def bind(self, **values):
+        """Get the filters with the given values substituted in."""
+        values = dict((k, self.session._minimize_entities(v)) for k, v in values.iteritems())
+        return [_bind(x, values) if has_params else x for x, has_params in self._filters]
+
+    def find(self, **values):
+        """Run the query with the given values; accepts ``async=True``."""
+        if values.pop('async', False):
+            return self.session._submit_concurrent(self.find, **values)
+        return self.session._find_resolved(
+            self.entity_type, self.bind(**values), self.fields, self.args, self.kwargs,
+            self._merge, self._cache, self._local,
+        )
@@ -0,0 +1,324 @@
+"""Lazy, composable queries.
+
+A :class:`Query` describes a :meth:`.Session.find` without running it; each
+method returns a new query, and the server is only consulted once the query
+is iterated (or :meth:`~Query.first`, :meth:`~Query.count`, etc. are called).
+
+E.g.::
+
+    >>> q = session.query('PublishEvent', 'sg_type', 'sg_version')
+    >>> q = q.filter('id', '>', 12).order_by('-created_at')
+    >>> q.explain()
+    [{'method': 'find', 'entity_type': 'PublishEvent', ...}]
+    >>> q.first()
+    <Entity PublishEvent:13 at 0x1021fae90>
+
+Several queries which only differ by the value of one ``is``/``in`` filter
+(e.g. the tasks of several shots) are combined into a single request by
+:func:`execute`, and the results are split back up locally::
+
+    >>> shot_tasks = [session.query('Task').filter(entity=shot) for shot in shots]
+    >>> results = execute(shot_tasks)
+
+"""
+
+from __future__ import absolute_import
+
+from .filters import match
+from .querycache import freeze
+
+
+_relation_aliases = {
+    '=': 'is',
+    '==': 'is',
+    '!=': 'is_not',
+    '<': 'less_than',
+    '>': 'greater_than',
+}
+
+
+class Query(object):
+
+    """A lazy query; see :meth:`.Session.query`."""
+
+    def __init__(self, session, type_, fields=(), filters=(), order=(),
+        limit=None, add_default_fields=True, local=False):
+        self.session = session
+        self.entity_type = type_
+        self.fields = tuple(fields)
+        self.filters = tuple(filters)
+        self.order = tuple(order)
+        self.limit_ = limit
+        self.add_default_fields = add_default_fields
+        self.local_ = local
+
+    def _clone(self, **kwargs):
+        for name in ('fields', 'filters', 'order', 'add_default_fields'):
+            kwargs.setdefault(name, getattr(self, name))
+        kwargs.setdefault('limit', self.limit_)
+        kwargs.setdefault('local', self.local_)
+        return self.__class__(self.session, self.entity_type, **kwargs)
+
+    def __repr__(self):
+        return '<Query %s %r>' % (self.entity_type, list(self.filters))
+
+    def filter(self, *args, **kwargs):
+        """Add filters, all of which must pass.
+
+        Accepts a single ``(field, relation, *values)`` filter (where the
+        relation may also be one of ``=``, ``!=``, ``<``, or ``>``), any number
+        of raw filters or ``{field: value}`` dicts (which are ``is`` filters),
+        or keyword arguments (which are also ``is`` filters). Raw filters and
+        dicts may be separated by ``'or'`` to require only one of them::
+
+            >>> q.filter('id', '>', 12)
+            >>> q.filter(sg_status_list='ip')
+            >>> q.filter({'assignees': me}, 'or', {'assignees': mark})
+
+        """
+        filters = []
+
+        if len(args) >= 2 and isinstance(args[0], basestring) and args[1] not in ('or', 'and'):
+            relation = _relation_aliases.get(args[1], args[1])
+            filters.append([args[0], relation] + list(args[2:]))
+            args = ()
+
+        groups = [[]]
+        for arg in args:
+            if arg == 'or':
+                groups.append([])
+            elif arg == 'and':
+                continue
+            elif isinstance(arg, dict) and not ('filters' in arg or 'path' in arg):
+                groups[-1].extend([k, 'is', v] for k, v in sorted(arg.iteritems()))
+            else:
+                groups[-1].append(arg)
+
+        if len(groups) > 1:
+            filters.append({'filter_operator': 'any', 'filters': [
+                group[0] if len(group) == 1 else {'filter_operator': 'all', 'filters': group}
+                for group in groups
+            ]})
+        else:
+            filters.extend(groups[0])
+
+        filters.extend([k, 'is', v] for k, v in sorted(kwargs.iteritems()))
+
+        # Entities are reduced to their type and ID, so we can compare them.
+        filters = self.session._minimize_entities(filters)
+
+        return self._clone(filters=self.filters + tuple(filters))
+
+    def order_by(self, *fields):
+        """Order by the given fields; prefix them with ``-`` for descending order."""
+        order = list(self.order)
+        for field in fields:
+            if field.startswith('-'):
+                order.append({'field_name': field[1:], 'direction': 'desc'})
+            else:
+                order.append({'field_name': field, 'direction': 'asc'})
+        return self._clone(order=order)
+
+    def only(self, *fields):
+        """Return only the given fields, without the session's "important" ones."""
+        return self._clone(fields=fields, add_default_fields=False)
+
+    def include(self, *fields):
+        """Return the given fields in addition to those already requested."""
+        return self._clone(fields=self.fields + fields)
+
+    def limit(self, limit):
+        return self._clone(limit=limit)
+
+    def local(self, local='prefer'):
+        """Evaluate against the session cache if possible; see :meth:`.Session.find`."""
+        return self._clone(local=local)
+
+    def _find_kwargs(self):
+        kwargs = dict(
+            fields=list(self.fields),
+            order=[dict(x) for x in self.order] or None,
+            limit=self.limit_ or 0,
+            add_default_fields=self.add_default_fields,
+        )
+        if self.local_:
+            kwargs['local'] = self.local_
+        return kwargs
+
+    def explain(self):
+        """Get the requests that would be made to run this query; see :func:`plan`."""
+        return [request.describe() for request in plan([self])]
+
+    def all(self):
+        """Run the query, and return a list of entities."""
+        return execute([self])[0]
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def first(self):
+        """Get the first entity, or ``None``."""
+        found = self.limit(1).all()
+        return found[0] if found else None
+
+    def one(self):
+        """Get the only entity, raising :class:`ValueError` if there isn't exactly one."""
+        found = self.limit(2).all()
+        if len(found) != 1:
+            raise ValueError('expected one %s, found %d' % (self.entity_type, len(found)))
+        return found[0]
+
+    def count(self):
+        """Count matching entities on the server via ``summarize``."""
+        session = self.session
+        type_ = self.entity_type
+        if session.schema:
+            type_ = session.schema.resolve_one_entity(type_)
+        filters = session._resolve_filters(type_, list(self.filters))
+        res = session._call_shotgun('summarize', type_, filters, [{'field': 'id', 'type': 'count'}])
+        return res['summaries']['id']
+
+    def iter(self, page_size=500, parallel=1, **kwargs):
+        """Iterate via :meth:`.Session.find_iter`, in pages requested in parallel."""
+        find_kwargs = self._find_kwargs()
+        find_kwargs.pop('local', None)
+        limit = find_kwargs.pop('limit')
+        if limit:
+            find_kwargs['limit'] = limit
+        find_kwargs.update(kwargs)
+        return self.session.find_iter(self.entity_type, list(self.filters),
+            per_page=page_size, async_count=parallel, **find_kwargs)
+
+
+class _Request(object):
+
+    def __init__(self, query, filters=None):
+        self.query = query
+        self.queries = [query]
+        self.filters = list(query.filters) if filters is None else filters
+        self.fields = list(query.fields)
+        self.split_field = None
+        self.split_values = []
+
+    def find_kwargs(self):
+        kwargs = self.query._find_kwargs()
+        kwargs['fields'] = self.fields
+        return kwargs
+
+    def describe(self):
+        kwargs = self.find_kwargs()
+        session = self.query.session
+        fields = kwargs.pop('fields')
+        if kwargs.pop('add_default_fields'):
+            fields = session._add_default_fields(self.query.entity_type, fields)
+        desc = dict(
+            method='find',
+            entity_type=self.query.entity_type,
+            filters=self.filters,
+            fields=fields,
+            queries=len(self.queries),
+        )
+        desc.update(kwargs)
+        return desc
+
+    def run(self, async=False):
+        return self.query.session.find(self.query.entity_type, self.filters, async=async, **self.find_kwargs())
+
+    def split(self, entities):
+        if self.split_field is None:
+            return [entities]
+        return [
+            [e for e in entities if match(e, [[self.split_field, 'in', values]])]
+            for values in self.split_values
+        ]
+
+
+def _split_key(query):
+    """Find the one filter which may be combined with other queries."""
+
+    # Limits and ordering cannot be satisfied once combined.
+    if query.limit_ or query.local_:
+        return
+
+    filters = list(query.filters)
+    for i, filter_ in enumerate(filters):
+        if (
+            isinstance(filter_, list) and len(filter_) >= 3 and
+            filter_[1] in ('is', 'in') and '.' not in filter_[0]
+        ):
+            values = list(filter_[2:])
+            if filter_[1] == 'in' and len(values) == 1 and isinstance(values[0], (list, tuple)):
+                values = list(values[0])
+            rest = filters[:i] + filters[i + 1:]
+            key = (
+                query.session, query.entity_type, freeze(rest), freeze(query.fields),
+                freeze(query.order), query.add_default_fields, filter_[0],
+            )
+            return key, rest, filter_[0], values
+
+
+def plan(queries):
+    """Plan the fewest requests which can satisfy the given queries.
+
+    :return: A list of requests; each may satisfy several queries.
+
+    """
+    requests = []
+    by_key = {}
+    for query in queries:
+        split = _split_key(query)
+        if split is None:
+            requests.append(_Request(query))
+            continue
+        key, rest, field, values = split
+        request = by_key.get(key)
+        if request is None:
+            request = by_key[key] = _Request(query, rest)
+            request.split_field = field
+            requests.append(request)
+        else:
+            request.queries.append(query)
+        request.split_values.append(values)
+
+    for request in requests:
+        if request.split_field is None:
+            continue
+        if len(request.queries) == 1:
+            # Nothing to combine; run it as it was given.
+            request.filters = list(request.query.filters)
+            request.split_field = None
+            continue
+        unique = []
+        seen = set()
+        for values in request.split_values:
+            for value in values:
+                key = freeze(value)
+                if key not in seen:
+                    seen.add(key)
+                    unique.append(value)
+        request.filters.append([request.split_field, 'in', unique])
+        if request.split_field not in request.fields:
+            request.fields.append(request.split_field)
+
+    return requests
+
+
+def execute(queries):
+    """Run the given queries with as few requests as possible, in parallel.
+
+    :return: A list of lists of entities, one for each query.
+
+    """
+    queries = list(queries)
+    requests = plan(queries)
+    if len(requests) > 1:
+        futures = [request.run(async=True) for request in requests]
+        found = [future.result() for future in futures]
+    else:
+        found = [request.run() for request in requests]
+
+    results = {}
+    for request, entities in zip(requests, found):
+        for query, sub_entities in zip(request.queries, request.split(entities)):
+            results[id(query)] = sub_entities
+    return [results[id(query)] for query in queries]
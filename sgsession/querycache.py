@@ -0,0 +1,156 @@
+"""An opt-in cache of :meth:`.Session.find` results.
+
+Tools tend to ask the same questions of the server over and over (e.g. "what
+are all of the Steps?"), and since a :class:`~sgsession.session.Session` is
+meant to be short lived the answers rarely change underneath it.
+
+E.g.::
+
+    >>> session = Session(query_cache=QueryCache(ttls={'Step': 3600}))
+    >>> steps = session.find('Step', [])
+    >>> steps = session.find('Step', []) # No request this time.
+    >>> session.query_cache.stats()
+    {'hits': 1, 'misses': 1, 'invalidations': 0, 'size': 1}
+
+Queries are keyed by their entity type, filters, fields, and any other
+arguments (e.g. order and limit) after the session has added default fields
+and resolved the schema. Any ``create``, ``update``, ``batch``, or ``delete``
+via the session throws away every cached query which involved the types that
+it touched, including types referred to via deep fields or filters.
+
+"""
+
+from __future__ import absolute_import
+
+import re
+import threading
+import time
+
+
+_deep_type_re = re.compile(r'\.([A-Z]\w*)\.')
+
+
+class _FrozenDict(tuple):
+    """The items of a frozen dict; a tuple, but one we can tell apart."""
+    __slots__ = ()
+
+
+def freeze(obj):
+    """Convert a structure of lists and dicts into something hashable."""
+    if isinstance(obj, dict):
+        return _FrozenDict(sorted((k, freeze(v)) for k, v in obj.iteritems()))
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(x) for x in obj)
+    if isinstance(obj, set):
+        return tuple(sorted(freeze(x) for x in obj))
+    return obj
+
+
+def _value_types(obj, types):
+    # Only the types of entities in filter values; strings are just strings.
+    if isinstance(obj, (dict, _FrozenDict)):
+        type_ = dict(obj).get('type')
+        if type_:
+            types.add(type_)
+    elif isinstance(obj, (list, tuple)):
+        for x in obj:
+            _value_types(x, types)
+
+
+def _filter_types(obj, types):
+    if isinstance(obj, (dict, _FrozenDict)):
+        for x in dict(obj).get('filters') or ():
+            _filter_types(x, types)
+    elif isinstance(obj, (list, tuple)):
+        if obj and isinstance(obj[0], basestring):
+            types.update(_deep_type_re.findall(obj[0] + '.'))
+            _value_types(obj[2:], types)
+        else:
+            for x in obj:
+                _filter_types(x, types)
+
+
+def _referenced_types(filters, fields, types):
+    for field in fields or ():
+        types.update(_deep_type_re.findall(field + '.'))
+    _filter_types(filters, types)
+    return types
+
+
+class QueryCache(object):
+
+    """Cache of query results with per-type expiry.
+
+    :param float default_ttl: Seconds to keep results for; ``None`` keeps them
+        until they are invalidated.
+    :param dict ttls: Mapping of entity types to their own TTL.
+
+    """
+
+    def __init__(self, default_ttl=None, ttls=None):
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._by_type = {}
+        self.hits = self.misses = self.invalidations = 0
+
+    def ttl(self, type_):
+        return self.ttls.get(type_, self.default_ttl)
+
+    def make_key(self, type_, filters, fields, args=(), kwargs=None):
+        return (type_, freeze(filters), freeze(fields), freeze(args), freeze(kwargs or {}))
+
+    def get(self, key):
+        """Get a cached result, or ``None``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, _, result = entry
+                if expires_at is None or expires_at > time.time():
+                    self.hits += 1
+                    return result
+                self._discard(key)
+            self.misses += 1
+
+    def set(self, key, result):
+        type_, filters, fields = key[:3]
+        types = _referenced_types(filters, fields, set([type_]))
+        ttl = self.ttl(type_)
+        expires_at = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (expires_at, types, result)
+            for x in types:
+                self._by_type.setdefault(x, set()).add(key)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            for x in entry[1]:
+                self._by_type.get(x, set()).discard(key)
+
+    def invalidate(self, types=None):
+        """Forget queries involving the given entity types, or all queries."""
+        with self._lock:
+            if types is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._by_type.clear()
+                return
+            if isinstance(types, basestring):
+                types = [types]
+            for type_ in types:
+                for key in list(self._by_type.pop(type_, ())):
+                    self._discard(key)
+                    self.invalidations += 1
+
+    def stats(self):
+        """Get a dict of hit/miss/invalidation counts, and the current size."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+            }
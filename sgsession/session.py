@@ -11,6 +11,8 @@ instance.
 
 from __future__ import with_statement, absolute_import
 
+import collections
+import contextlib
 import errno
 import functools
 import itertools
@@ -18,15 +20,23 @@ import json
 import logging
 import os
 import re
+import sys
 import threading
+import time
 import urlparse
 import warnings
 
-from sgschema import Schema
-from dirmap import DirMap
-
-from .entity import Entity
-from .pool import ShotgunPool
+from .adaptive import FieldLearner
+from .compiledschema import CompiledSchema
+from .entity import Entity, _missing
+from .filters import UnsupportedFilter, get_value, match, normalize_value
+from .nplusone import NPlusOneDetector
+from .prepared import PreparedFind
+from .query import Query
+from .querycache import QueryCache
+from .tracing import Tracer
+from .unitofwork import UnitOfWork
+from . import usercache
 from .utils import expand_braces, parse_isotime, shotgun_api3_connect, cached_property
 
 
@@ -40,6 +50,24 @@ class EntityNotFoundWarning(UserWarning):
 class EntityNotFoundError(ValueError):
     pass
 
+class BatchError(RuntimeError):
+
+    """Raised when some chunks of a :meth:`Session.batch` failed.
+
+    :attr:`results` has the results of every request in the chunks which
+    succeeded (and ``None`` for the others), while :attr:`errors` is a list
+    of ``(index, exception)`` for each failed chunk, where ``index`` is that
+    of its first request. Chunks which were not sent, because an earlier one
+    failed (when they are not sent in parallel), are listed with an exception
+    of ``None``.
+
+    """
+
+    def __init__(self, message, results, errors):
+        super(BatchError, self).__init__(message)
+        self.results = results
+        self.errors = errors
+
 
 def _asyncable(func):
     """Wrap a function, so that async=True will run it in a thread."""
@@ -51,6 +79,50 @@ def _asyncable(func):
             return func(self, *args, **kwargs)
     return _wrapped
 
+def _traced(func):
+    """Wrap a method, so that requests made within it are attributed to it."""
+    name = func.__name__
+    @functools.wraps(func)
+    def _wrapped(self, *args, **kwargs):
+        tracer = self.tracer
+        if tracer is None:
+            return func(self, *args, **kwargs)
+        tracer.enter(name)
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            tracer.exit()
+    return _wrapped
+
+def _traced_iter(func):
+    """Like :func:`_traced`, for methods which return an iterator; requests
+    made while it is advanced are attributed to the method."""
+    name = func.__name__
+    @functools.wraps(func)
+    def _wrapped(self, *args, **kwargs):
+        tracer = self.tracer
+        if tracer is None:
+            return func(self, *args, **kwargs)
+        return _iter_traced(tracer, name, func(self, *args, **kwargs))
+    return _wrapped
+
+def _iter_traced(tracer, name, iterator):
+    try:
+        while True:
+            tracer.enter(name)
+            try:
+                x = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                tracer.exit()
+            yield x
+    finally:
+        # Pass on an early close, so the iterator can clean up.
+        close = getattr(iterator, 'close', None)
+        if close:
+            close()
+
 def _assert_ownership(func):
     """Wrap a function that takes a list of entities, and make sure that we own them."""
     @functools.wraps(func)
@@ -69,6 +141,124 @@ def _assert_ownership(func):
 _recursion_sentinel = object()
 
 
+def _merge_includes(dst, src):
+    for key, value in src.iteritems():
+        _merge_includes(dst.setdefault(key, {}), value or {})
+
+
+def _wrap_shotgun(shotgun):
+    # Only shotgun_api3.Shotgun instances are wrapped, and there can't be any
+    # if it hasn't been imported, so don't pay for importing it (or the pool).
+    if 'shotgun_api3' not in sys.modules:
+        return shotgun
+    from .pool import ShotgunPool
+    return ShotgunPool.wrap(shotgun)
+
+
+def _minimize_entities(data):
+    """Reduce entities in a structure to their type and ID.
+
+    Tuples become lists, but any other container in which nothing changed is
+    returned as it was given (so the result may share structure with the
+    input). This walks the structure without recursion, since filters and
+    batches may be very large.
+
+    """
+
+    # Frames are [container, iterator over (key, child), key, child, new]
+    # where new is the copy of the container, made once something changes.
+    root = [[data], enumerate([data]), None, None, None]
+    stack = [root]
+
+    while True:
+
+        frame = stack[-1]
+        container, items, _, _, new = frame
+        is_dict = isinstance(container, dict)
+
+        for key, child in items:
+
+            # Attachments need to not be minimized, since they are often
+            # merged in with their own metadata. If we special cased merging
+            # them, then this could be a bit smarter and send only what is
+            # nessesary.
+            if type(child) is dict:
+                if 'type' in child and 'id' in child:
+                    if len(child) == 2 or child['type'] == 'Attachment':
+                        value = child
+                    else:
+                        value = {'type': child['type'], 'id': child['id']}
+                elif child.get('type') == 'Attachment':
+                    value = child
+                else:
+                    break
+            elif isinstance(child, dict):
+                if dict.get(child, 'type') == 'Attachment':
+                    value = child
+                elif dict.__contains__(child, 'type') and dict.__contains__(child, 'id'):
+                    value = {'type': dict.get(child, 'type'), 'id': dict.get(child, 'id')}
+                else:
+                    break
+            elif isinstance(child, (list, tuple)):
+                break
+            else:
+                value = child
+
+            if new is None:
+                if value is child:
+                    continue
+                new = frame[4] = dict(container) if is_dict else list(container[:key])
+            if is_dict:
+                new[key] = value
+            else:
+                new.append(value)
+
+        else:
+
+            # This container is finished; hand it to its parent.
+            stack.pop()
+            if frame is root:
+                return data if new is None else new[0]
+            value = container if new is None else new
+            frame = stack[-1]
+            container, _, key, child, new = frame
+            if new is None:
+                if value is child:
+                    continue
+                new = frame[4] = dict(container) if isinstance(container, dict) else list(container[:key])
+            if isinstance(new, dict):
+                new[key] = value
+            else:
+                new.append(value)
+            continue
+
+        # We broke out to walk the contents of a child container.
+        frame[2] = key
+        frame[3] = child
+        if isinstance(child, dict):
+            stack.append([child, child.iteritems(), None, None, None])
+        else:
+            stack.append([child, enumerate(child), None, None, None if isinstance(child, list) else []])
+
+
+# The positional arguments to Shotgun.find after the fields.
+_find_arg_names = ('order', 'filter_operator', 'limit', 'retired_only', 'page')
+
+# All of the regex-based forms of Session.parse_user_input, tried in order.
+_spec_re = re.compile(r'''^(?:
+    https?://\w+\.shotgunstudio\.com/(?:
+        detail/(?P<detail_type>[A-Za-z]+\d*)/(?P<detail_id>\d+) |
+        page/\d+\#(?P<overview_type>[A-Z][A-Za-z]+\d*)_(?P<overview_id>\d+)_ |
+        page/(?P<page_id>\d+)$
+    ) |
+    (?P<type>[A-Za-z]{3,}\d*)[:_\ -](?P<id>\d+)(?:_|$|\?(?P<query>\S*)) |
+    (?P<code_type>[A-Za-z]{3,}\d*):(?P<code>\S+)$
+)''', re.VERBOSE)
+
+# The most IDs to look up in one query.
+_get_chunk_size = 1000
+
+
 class Session(object):
     
     """Shotgun wrapper.
@@ -88,6 +278,13 @@ class Session(object):
     the first time :attr:`shotgun` is accessed (which will happen on many
     operations). To stop this behaviour, pass ``False``.
 
+    :param query_cache: A :class:`~sgsession.querycache.QueryCache` to
+        serve repeated :meth:`find` calls from, or ``True`` to create one
+        which never expires.
+    :param field_learner: A :class:`~sgsession.adaptive.FieldLearner` to add
+        fields to :meth:`find` which are usually fetched afterwards, or
+        ``True`` to create one with the default limits.
+
     """
     
     #: Mapping of entity types to the field where their "parent" lives.
@@ -154,14 +351,15 @@ class Session(object):
         },
     }
     
-    def __init__(self, shotgun=None, schema=None, dir_map=None, **kwargs):
+    def __init__(self, shotgun=None, schema=None, dir_map=None, query_cache=None,
+        field_learner=None, trace=None, n_plus_one=None, **kwargs):
 
         # Lookup strings in the script registry.
         if isinstance(shotgun, basestring):
             shotgun = shotgun_api3_connect(shotgun, **kwargs)
 
         # Wrap basic shotgun instances in our threader.
-        self._shotgun = ShotgunPool.wrap(shotgun)
+        self._shotgun = _wrap_shotgun(shotgun)
         self._shotgun_kwargs = None if shotgun else kwargs
 
         self._schema = schema
@@ -169,6 +367,37 @@ class Session(object):
 
         self._cache = {}
         self._thread_pool = None
+        self._batch_pool = None
+
+        # Entity types which we have found without filters, mapped to the
+        # fields that were found on them, and the IDs of every entity (which
+        # includes those created since).
+        self._loaded_types = {}
+
+        self.invalidate_default_fields()
+
+        # Secondary indexes, mapping (type, field) to a mapping of normalized
+        # values to sets of entities. See add_index.
+        self._indexes = {}
+
+        # Entities with uncommitted local changes, by id().
+        self._dirty = {}
+
+        if query_cache is True:
+            query_cache = QueryCache()
+        self.query_cache = query_cache or None
+
+        if field_learner is True:
+            field_learner = FieldLearner()
+        self.field_learner = field_learner or None
+
+        if trace is True:
+            trace = Tracer()
+        self.tracer = trace or None
+
+        if n_plus_one is True:
+            n_plus_one = NPlusOneDetector()
+        self.n_plus_one = n_plus_one or None
     
     @classmethod
     def from_entity(cls, entity, *args, **kwargs):
@@ -182,7 +411,7 @@ class Session(object):
         # Automatically generate Shotgun when we need one.
         # We use False to track that there should be nothing set here.
         if self._shotgun is None:
-            self._shotgun = ShotgunPool.wrap(shotgun_api3_connect(
+            self._shotgun = _wrap_shotgun(shotgun_api3_connect(
                 **self._shotgun_kwargs
             )) or False
         return self._shotgun
@@ -193,20 +422,40 @@ class Session(object):
         # We use False to track that there should be nothing set here.
         if self._schema is None:
 
+            # Prefer the compiled schema, which only loads what it needs.
+            path = os.environ.get('SGSESSION_COMPILED_SCHEMA')
+            if path and os.path.exists(path):
+                try:
+                    self._schema = CompiledSchema(path, self._load_schema)
+                    return self._schema
+                except (ValueError, EnvironmentError) as e:
+                    log.warning('could not use compiled schema %s: %s' % (path, e))
+
             # Wait on caching a schema here until there is a Shotgun.
             shotgun = self.shotgun
             if not shotgun:
                 return
 
-            try:
-                self._schema = Schema.from_cache(shotgun)
-            except ValueError:
-                self._schema = False
+            self._schema = self._load_schema() or False
+
+        elif isinstance(self._schema, basestring):
+            self._schema = CompiledSchema(self._schema, self._load_schema)
 
         return self._schema or None
 
+    def _load_schema(self):
+        shotgun = self.shotgun
+        if not shotgun:
+            return
+        from sgschema import Schema
+        try:
+            return Schema.from_cache(shotgun)
+        except ValueError:
+            pass
+
     @cached_property
     def dir_map(self):
+        from dirmap import DirMap
         return DirMap(self._dir_map or os.environ.get('SGSESSION_DIR_MAP'))
 
     def __getattr__(self, name):
@@ -217,6 +466,8 @@ class Session(object):
         # Generally, the user should be very careful when pickling sessions.
         shotgun = False if self._shotgun is False else None
         schema = False if self._schema is False else None
+        if isinstance(self._schema, CompiledSchema):
+            schema = self._schema.path
         return self.__class__, (shotgun, schema)
 
     def merge(self, data, over=None, created_at=None, _depth=0, _memo=None):
@@ -303,6 +554,83 @@ class Session(object):
         memo[id(data)] = entity # Setup recursion block.
         entity._update(data, over, created_at, depth + 1, memo)
         return entity
+
+    def add_index(self, type_, field):
+        """Index entities of the given type in this session by a field.
+
+        :param str type_: The entity type to index.
+        :param str field: The field to index by, e.g. ``code`` or ``entity``.
+
+        Indexes are kept up to date as data is merged into the session, and
+        allow for :meth:`lookup` to find entities without looking at every
+        entity we have. They are also used by :meth:`find` with ``local=True``
+        for ``is`` and ``in`` filters, and by :meth:`parse_user_input` for
+        ``Type:code`` specs when ``code`` is indexed.
+
+        ::
+
+            >>> session.add_index('Shot', 'code')
+            >>> session.lookup('Shot', 'code', 'AA_001')
+            [<Entity Shot:234 'AA_001' at 0x101541a80>]
+
+        """
+        if self.schema:
+            type_ = self.schema.resolve_one_entity(type_)
+            field = self.schema.resolve_one_field(type_, field)
+        if (type_, field) in self._indexes:
+            return
+        self._indexes[(type_, field)] = {}
+        for (cached_type, _), entity in self._cache.items():
+            if cached_type == type_ and dict.__contains__(entity, field):
+                self._reindex(entity, field, _missing, dict.__getitem__(entity, field))
+
+    def _index_keys(self, value):
+        values = value if isinstance(value, (list, tuple)) else [value]
+        keys = []
+        for x in values:
+            x = normalize_value(x)
+            try:
+                hash(x)
+            except TypeError:
+                continue
+            keys.append(x)
+        return keys
+
+    def _reindex(self, entity, field, old, new):
+        index = self._indexes.get((dict.get(entity, 'type'), field))
+        if index is None:
+            return
+        if old is not _missing:
+            for key in self._index_keys(old):
+                entities = index.get(key)
+                if entities is not None:
+                    entities.discard(entity)
+                    if not entities:
+                        del index[key]
+        for key in self._index_keys(new):
+            index.setdefault(key, set()).add(entity)
+
+    def lookup(self, type_, field, value):
+        """Get entities already in this session via an index.
+
+        :param str type_: The entity type to look for.
+        :param str field: The indexed field; see :meth:`add_index`.
+        :param value: The value of the field; text is compared case-insensitively.
+        :return: :class:`list` of :class:`~sgsession.entity.Entity`, sorted by ID.
+        :raises KeyError: if there is no such index.
+
+        """
+        if self.schema:
+            type_ = self.schema.resolve_one_entity(type_)
+            field = self.schema.resolve_one_field(type_, field)
+        try:
+            index = self._indexes[(type_, field)]
+        except KeyError:
+            raise KeyError('%s.%s is not indexed' % (type_, field))
+        found = set()
+        for key in self._index_keys(value):
+            found.update(index.get(key, ()))
+        return sorted(found, key=lambda e: e['id'])
     
     def parse_user_input(self, spec, entity_types=None, fetch_project_from_page=False):
         """Parse user input into an entity.
@@ -324,6 +652,8 @@ class Session(object):
           ``https://example.shotgunstudio.com/page/999#Task_123_Example``
         - Shotgun pages without an entity, e.g. ``https://example.shotgunstudio.com/page/999``,
           which describes ``Task 123``; only when ``fetch_project_from_page``.
+        - Type-code pairs, e.g. ``Shot:AA_001``; only for entities already in
+          the session, and when ``code`` is indexed (see :meth:`add_index`).
 
         Example::
 
@@ -332,6 +662,48 @@ class Session(object):
 
         """
 
+        entity, page_id = self._parse_spec(spec, entity_types, fetch_project_from_page)
+        if page_id is not None:
+            entity = self._page_project(spec, self.get('Page', page_id, ['project']))
+        return entity
+
+    def parse_user_inputs(self, specs, entity_types=None, fetch_project_from_page=False, fields=None):
+        """Parse many strings of user input into entities.
+
+        :param list specs: The strings of input from the user.
+        :param list fields: Fields to fetch on all of the parsed entities.
+        :return: A list of unique :class:`.Entity`, in the order they were
+            first given.
+
+        This accepts the same forms as :meth:`parse_user_input`, but looks up
+        all of the projects for page URLs in a single query, and fetches the
+        requested fields for all entities of a type at once.
+
+        """
+
+        parsed = [(spec, self._parse_spec(spec, entity_types, fetch_project_from_page)) for spec in specs]
+
+        page_ids = sorted(set(page_id for _, (_, page_id) in parsed if page_id is not None))
+        pages = dict(zip(page_ids, self.get('Page', page_ids, ['project']))) if page_ids else {}
+
+        entities = []
+        seen = set()
+        for spec, (entity, page_id) in parsed:
+            if page_id is not None:
+                entity = self._page_project(spec, pages[page_id])
+            if entity not in seen:
+                seen.add(entity)
+                entities.append(entity)
+
+        if fields and entities:
+            self.fetch(entities, fields)
+
+        return entities
+
+    def _parse_spec(self, spec, entity_types, fetch_project_from_page):
+        """Parse a spec into ``(entity, None)``, or ``(None, page_id)`` if we
+        must still look up the project of a page."""
+
         spec = spec.strip()
 
         # JSON.
@@ -341,61 +713,89 @@ class Session(object):
                 raise ValueError('incomplete JSON entity', spec)
             if not isinstance(raw['type'], basestring) or not isinstance(raw['id'], int):
                 raise ValueError('malformed JSON entity', spec)
-            return self.merge(raw)
+            return self.merge(raw), None
 
         # Accept integer IDs if we know we want a specific type.
         if spec.isdigit():
             if isinstance(entity_types, basestring):
                 entity_types = [entity_types]
             if entity_types and len(entity_types) == 1:
-                return self.merge({'type': entity_types[0], 'id': int(spec)})
+                return self.merge({'type': entity_types[0], 'id': int(spec)}), None
             else:
                 raise ValueError('int-only spec without single entity_types', spec, entity_types)
-            
+
+        m = _spec_re.match(spec)
+        groups = m.groupdict() if m else {}
+
         # Shotgun detail URL.
-        m = re.match(r'^https?://\w+\.shotgunstudio\.com/detail/([A-Za-z]+\d*)/(\d+)', spec)
-        if m:
-            return self.merge({'type': m.group(1), 'id': int(m.group(2))})
+        if groups.get('detail_type'):
+            return self.merge({'type': groups['detail_type'], 'id': int(groups['detail_id'])}), None
 
         # Shotgun project overview URL.
-        m = re.match(r'^https?://\w+\.shotgunstudio\.com/page/\d+#([A-Z][A-Za-z]+\d*)_(\d+)_', spec)
-        if m:
-            return self.merge({'type': m.group(1), 'id': int(m.group(2))})
-        
+        if groups.get('overview_type'):
+            return self.merge({'type': groups['overview_type'], 'id': int(groups['overview_id'])}), None
+
         # Shotgun page URL.
-        m = re.match(r'^https?://\w+\.shotgunstudio\.com/page/(\d+)$', spec)
-        if m:
+        if groups.get('page_id'):
             if not fetch_project_from_page:
                 raise ValueError('page URL without fetch_project_from_page', spec)
-            page = self.get('Page', int(m.group(1)), ['project'])
-            if not page:
-                raise ValueError('Page entity not found for page URL', spec)
-            if page.get('project'):
-                return self.merge(page['project'])
-            raise ValueError('page URL has no project', spec)
-            
+            return None, int(groups['page_id'])
+
         # Direct entities. E.g. `shot:12345?code=whatever`
-        m = re.match(r'^([A-Za-z]{3,}\d*)[:_ -](\d+)(?:_|$|\?(\S*))', spec)
-        if m:
-            type_, id_, query = m.groups()
+        if groups.get('type'):
+            type_ = groups['type']
             raw = {
                 'type': type_[0].upper() + type_[1:],
-                'id': int(id_),
+                'id': int(groups['id']),
             }
-            if query:
-                for k, v in urlparse.parse_qsl(query, keep_blank_values=True):
+            if groups['query']:
+                for k, v in urlparse.parse_qsl(groups['query'], keep_blank_values=True):
                     raw.setdefault(k, v)
-            return self.merge(raw)
-        
+            return self.merge(raw), None
+
+        # Codes of indexed types. E.g. `Shot:AA_001`
+        if groups.get('code_type'):
+            type_ = groups['code_type']
+            type_ = type_[0].upper() + type_[1:]
+            code = groups['code']
+            if (type_, 'code') in self._indexes:
+                found = self.lookup(type_, 'code', code)
+                if len(found) == 1:
+                    return found[0], None
+                raise ValueError('%d %s entities with code %r' % (len(found), type_, code), spec)
+
         raise ValueError('could not parse entity spec', spec)
 
+    def _page_project(self, spec, page):
+        if not page:
+            raise ValueError('Page entity not found for page URL', spec)
+        if page.get('project'):
+            return self.merge(page['project'])
+        raise ValueError('page URL has no project', spec)
+
     def _submit_concurrent(self, func, *args, **kwargs):
         if not self._thread_pool:
             from concurrent.futures import ThreadPoolExecutor
             self._thread_pool = ThreadPoolExecutor(8)
+        if self.tracer is not None:
+            func = self.tracer.bind(func)
+        if self.n_plus_one is not None:
+            func = self.n_plus_one.bind(func)
         return self._thread_pool.submit(func, *args, **kwargs)
 
+    def _submit_batch_chunk(self, requests):
+        # Chunks get their own threads, since the batch itself may be running
+        # in the async pool, and would deadlock waiting on it.
+        if not self._batch_pool:
+            from concurrent.futures import ThreadPoolExecutor
+            self._batch_pool = ThreadPoolExecutor(8)
+        func = self._batch
+        if self.tracer is not None:
+            func = self.tracer.bind(func)
+        return self._batch_pool.submit(func, requests)
+
     @_asyncable
+    @_traced
     def create(self, type, data=None, return_fields=None, **kwargs):
         """Create an entity of the given type and data.
         
@@ -412,10 +812,14 @@ class Session(object):
             type = self.schema.resolve_one_entity(type)
             data = self.schema.resolve_structure(data, type)
             return_fields = self.schema.resolve_field(type, return_fields) if return_fields else []
-        return_fields = self._add_default_fields(type, return_fields)
-        return self.merge(self.shotgun.create(type, data, return_fields))
+        return_fields = self._add_loaded_fields(type, self._add_default_fields(type, return_fields))
+        res = self._call_shotgun('create', type, data, return_fields)
+        self._invalidate_queries([type])
+        self._note_created(res)
+        return self.merge(res)
 
     @_asyncable
+    @_traced
     def update(self, *args, **kwargs):
         """Update the given entity with the given fields.
         
@@ -481,21 +885,269 @@ class Session(object):
                 'data': data,
             } for id_ in ids])
         else:
-            return self.merge(self.shotgun.update(type_, ids[0], data), over=True)
+            res = self._call_shotgun('update', type_, ids[0], data)
+            self._invalidate_queries([type_])
+            return self.merge(res, over=True)
 
     @_asyncable
-    def batch(self, requests):
+    @_traced
+    def batch(self, requests=None, chunk_size=None, parallel=False):
         """Perform a series of requests in a transaction.
+
+        :param list requests: The requests to perform.
+        :param int chunk_size: Split the requests into several ``batch``
+            calls of at most this many requests; each is its own transaction,
+            so the whole is not atomic: chunks which were sent before one
+            fails stay written.
+        :param bool parallel: Send the chunks concurrently instead of one
+            after another, so that a failed chunk does not stop the others.
+        :return: The results, in the same order as the requests.
+        :raises BatchError: if any chunks failed.
+
+        Without any requests, this returns a :class:`~sgsession.unitofwork.UnitOfWork`
+        to queue up creates, updates, and deletes to be sent together::
+
+            >>> with session.batch() as batch:
+            ...     shot = batch.create('Shot', code='AA_001', project=project)
+            ...     batch.create('Task', content='Anm', entity=shot, project=project)
         
         `See the Shotgun docs for more. <https://github.com/shotgunsoftware/python-api/wiki/Reference%3A-Methods#wiki-batch>`_
         
         """
+        if requests is None:
+            return UnitOfWork(self, chunk_size) if chunk_size else UnitOfWork(self)
+
+        requests = list(requests)
+        if not chunk_size or len(requests) <= chunk_size:
+            return self.merge(list(self._batch(requests)), over=True)
+
+        starts = range(0, len(requests), chunk_size)
+        if parallel:
+            calls = [(i, self._submit_batch_chunk(requests[i:i + chunk_size]).result) for i in starts]
+        else:
+            calls = ((i, functools.partial(self._batch, requests[i:i + chunk_size])) for i in starts)
+
+        results = [None] * len(requests)
+        errors = []
+        unsent = 0
+        for i, call in calls:
+            if errors and not parallel:
+                errors.append((i, None))
+                unsent += 1
+                continue
+            try:
+                res = call()
+            except Exception as e:
+                errors.append((i, e))
+                continue
+            results[i:i + len(res)] = res
+
+        # Merge everything at once, so the chunks share the work.
+        results = self.merge(results, over=True)
+        if errors:
+            message = '%d of %d batch chunks failed' % (len(errors) - unsent, len(starts))
+            if unsent:
+                message += '; %d were not sent' % unsent
+            raise BatchError(message, results, errors)
+        return results
+
+    @_asyncable
+    @_traced
+    def create_many(self, type_, rows, return_fields=None, chunk_size=100, parallel=False):
+        """Create many entities of the given type, via :meth:`batch`.
+
+        :param list rows: The data for each entity to create.
+        :param list return_fields: Fields to return in addition to the
+            "important" ones; these are the same for every entity.
+        :param int chunk_size: The most entities to create in one request.
+        :param bool parallel: Send the chunks concurrently; see :meth:`batch`.
+        :return: The new :class:`~sgsession.entity.Entity` for each row.
+
+        """
+        rows = list(rows)
+        if not rows:
+            return []
+        if self.schema:
+            type_ = self.schema.resolve_one_entity(type_)
+            return_fields = self.schema.resolve_field(type_, return_fields) if return_fields else []
+        return_fields = self._add_default_fields(type_, return_fields)
+        requests = [{
+            'request_type': 'create',
+            'entity_type': type_,
+            'data': data,
+            'return_fields': return_fields,
+        } for data in rows]
+        return self.batch(requests, chunk_size=chunk_size, parallel=parallel)
+
+    @_traced
+    def commit(self, entities=None, chunk_size=100):
+        """Send fields which were set locally on entities to the server.
+
+        Assigning to a field of an :class:`~sgsession.entity.Entity` marks
+        it as changed (see :attr:`~sgsession.entity.Entity.dirty_fields`);
+        this updates only those fields, in as few ``batch`` requests as
+        possible.
+
+        :param entities: The entities to commit, or ``None`` for every
+            changed entity in this session.
+        :param int chunk_size: The most updates to send in one ``batch``.
+        :return: The list of entities which were updated.
+
+        """
+        if entities is None:
+            entities = self._dirty.values()
+
+        committed = []
+        with UnitOfWork(self, chunk_size) as batch:
+            for e in entities:
+                if not e._dirty:
+                    continue
+                if e['id'] is None:
+                    raise ValueError('cannot commit entity without an id', e)
+                batch.update(e, dict((k, dict.get(e, k)) for k in e._dirty))
+                committed.append(e)
+
+        for e in committed:
+            e._dirty = None
+            self._dirty.pop(id(e), None)
+        return committed
+
+    def _batch(self, requests):
         requests = self._minimize_entities(requests)
         if self.schema:
             requests = self.schema.resolve_structure(requests)
-        return [self.merge(x, over=True) if isinstance(x, dict) else x for x in self.shotgun.batch(requests)]
+        if self._loaded_types:
+            requests = [self._add_loaded_create_fields(x) for x in requests]
+        res = self._call_shotgun('batch', requests)
+        self._invalidate_queries(set(x['entity_type'] for x in requests))
+        for request, row in zip(requests, res):
+            if request['request_type'] == 'create' and row:
+                self._note_created(row)
+        return res
+
+    def _add_loaded_fields(self, type_, return_fields):
+        # New entities of fully loaded types need every loaded field for
+        # local finds to still be complete.
+        loaded = self._loaded_types.get(type_)
+        if loaded is None:
+            return return_fields
+        return sorted(loaded[0].union(return_fields or ()))
+
+    def _add_loaded_create_fields(self, request):
+        if request['request_type'] != 'create' or request['entity_type'] not in self._loaded_types:
+            return request
+        request = dict(request)
+        request['return_fields'] = self._add_loaded_fields(request['entity_type'], request.get('return_fields'))
+        return request
+
+    def _note_created(self, row):
+        loaded = self._loaded_types.get(row['type'])
+        if loaded is None:
+            return
+        fields, ids = loaded
+        if all(f in row for f in fields):
+            ids.add(row['id'])
+        else:
+            # We can't answer for it, so we no longer have everything.
+            del self._loaded_types[row['type']]
+
+    def _call_shotgun(self, request, *args, **kwargs):
+        tracer = self.tracer
+        if tracer is None:
+            return getattr(self.shotgun, request)(*args, **kwargs)
+        return tracer.call(self.shotgun, request, args, kwargs)
+
+    def stats(self):
+        """Get totals of the requests made so far; see :meth:`.Tracer.stats`.
+
+        :raises ValueError: if tracing was not enabled (via ``trace=True``).
+
+        """
+        if self.tracer is None:
+            raise ValueError('tracing is not enabled; use Session(trace=True)')
+        return self.tracer.stats()
+
+    @contextlib.contextmanager
+    def trace(self, report=True):
+        """Context manager to trace the requests made within it.
+
+        :param report: Log a summary of them on exit (at ``INFO``), or a
+            callable to pass the summary to instead; ``False`` to not report.
+        :return: A :class:`~sgsession.tracing.Tracer` of only those requests.
+
+        This works whether or not the session was created with ``trace=True``.
+
+        """
+        tracer = Tracer()
+        parent = self.tracer
+        if parent is None:
+            self.tracer = tracer
+        else:
+            parent._listeners.append(tracer)
+        try:
+            yield tracer
+        finally:
+            if parent is None:
+                self.tracer = None
+            else:
+                parent._listeners.remove(tracer)
+            if report:
+                summary = tracer.format_stats()
+                if callable(report):
+                    report(summary)
+                else:
+                    log.info(summary)
+
+    def _invalidate_queries(self, types):
+        if self.query_cache is not None:
+            self.query_cache.invalidate(types)
     
+    def _default_fields_key(self, type_):
+        # Everything in the important_* maps which the defaults of this type
+        # depend upon; cheap enough to build on every call, so that changes
+        # to the maps (even in place) are noticed.
+        important_fields = self.important_fields
+        key = [tuple(self.important_fields_for_all), tuple(important_fields.get(type_) or ()), self.parent_fields.get(type_)]
+        links = self.important_links.get(type_)
+        if links:
+            important_links = self.important_links
+            for field, link_types in links.iteritems():
+                key.append(field)
+                for link_type in link_types:
+                    key.append(link_type)
+                    key.append(tuple(important_fields.get(link_type) or ()))
+                    key.append(tuple(important_links.get(link_type) or ()))
+        return tuple(key)
+
     def _add_default_fields(self, type_, fields):
+
+        fields = list(fields or ())
+        key = self._default_fields_key(type_)
+        memo = self._default_fields_cache.get(type_)
+        if memo is None or memo[0] != key:
+            memo = self._default_fields_cache[type_] = (key, {})
+
+        requested = frozenset(fields)
+        try:
+            return list(memo[1][requested])
+        except KeyError:
+            pass
+        res = self._compute_default_fields(type_, fields)
+        memo[1][requested] = tuple(res)
+        return res
+
+    def invalidate_default_fields(self):
+        """Forget the fields derived from the "important" maps.
+
+        The fields added to every query are computed once per entity type and
+        set of requested fields, and recomputed whenever the parts of
+        :attr:`important_fields` (or its siblings) which they depend upon
+        change; this only frees the memory.
+
+        """
+        self._default_fields_cache = {}
+
+    def _compute_default_fields(self, type_, fields):
         
         fields = set(fields or ['id'])
         
@@ -528,42 +1180,66 @@ class Session(object):
         return sorted(fields)
     
     def _minimize_entities(self, data):
-        
-        if isinstance(data, dict):
-
-            # Attachments need to not be minimized, since they are often
-            # merged in with their own metadata. If we special cased merging
-            # them, then this could be a bit smarter and send only what is
-            # nessesary.
-            if data.get('type') == 'Attachment':
-                return data
-
-            if 'type' in data and 'id' in data:
-                return dict(type=data['type'], id=data['id'])
-
-            return dict((k, self._minimize_entities(v)) for k, v in data.iteritems())
-
-        if isinstance(data, (list, tuple)):
-            return [self._minimize_entities(x) for x in data]
-
-        return data
+        return _minimize_entities(data)
     
     @_asyncable
+    @_traced
     def find(self, type_, filters, fields=None, *args, **kwargs):
         """Find entities.
         
+        :param bool cache: Use the :attr:`query_cache` (if there is one)?
+        :param local: ``True`` to answer from entities already in the session,
+            or ``"prefer"`` to do so only if we can; see below.
+        :param dict include: Linked entities to load as well; see :meth:`fetch_include`.
         :return: :class:`list` of found :class:`~sgsession.entity.Entity`.
+
+        Once every entity of a type has been found (i.e. with no filters or
+        limit; see :meth:`preload`), later queries of that type may be
+        evaluated locally via :func:`sgsession.filters.match` as long as they
+        only involve fields which were loaded. With ``local=True`` a
+        :class:`~sgsession.filters.UnsupportedFilter` is raised when that is
+        not possible, while ``local="prefer"`` will ask the server instead.
         
         `See the Shotgun docs for more. <https://github.com/shotgunsoftware/python-api/wiki/Reference%3A-Methods#wiki-find>`_
         
         """
 
         merge = kwargs.pop('merge', True)
+        use_cache = kwargs.pop('cache', True)
+        local = kwargs.pop('local', False)
+        add_default_fields = kwargs.pop('add_default_fields', True)
+        include = kwargs.pop('include', None)
+
+        if include:
+            if not merge:
+                raise ValueError('cannot include linked entities without merging')
+            include_fields, include_follow = self._compile_include(type_, include)
+            fields = list(fields or ()) + include_fields
+
+        # Add the fields that are usually fetched after this call.
+        shape = None
+        learner = self.field_learner
+        if learner is not None and merge:
+            site = learner.call_site()
+            if site:
+                shape = (type_, site)
+                fields = list(fields or ()) + learner.fields_for(shape)
+
+        type_, filters, fields = self._resolve_find(type_, filters, fields, add_default_fields)
+        entities = self._find_resolved(type_, filters, fields, args, kwargs, merge, use_cache, local)
+
+        if shape:
+            learner.found(shape, entities)
+        if include:
+            self._follow_includes(entities, include_follow)
+        return entities
+
+    def _resolve_find(self, type_, filters, fields, add_default_fields=True):
 
         if self.schema:
             type_ = self.schema.resolve_one_entity(type_)
 
-        if kwargs.pop('add_default_fields', True):
+        if add_default_fields:
             fields = self._add_default_fields(type_, fields)
 
         # Expand braces in fields.
@@ -574,23 +1250,202 @@ class Session(object):
 
         # Resolve names in fields.
         if self.schema:
-            filters = self.schema.resolve_structure(filters)
             fields = self.schema.resolve_field(type_, fields) if fields else []
 
+        return type_, self._resolve_filters(type_, filters), fields
+
+    def _resolve_filters(self, type_, filters):
+
+        if self.schema:
+            filters = self.schema.resolve_structure(filters)
+
         filters = self._minimize_entities(filters)
 
         # Resolve names in filters.
         if self.schema and isinstance(filters, (list, tuple)):
+            filters = list(filters) # It may be shared with the caller.
             for i, old_filter in enumerate(filters):
+                if isinstance(old_filter, dict):
+                    continue
                 filter_ = [self.schema.resolve_one_field(type_, old_filter[0])]
                 filter_.extend(old_filter[1:])
                 filters[i] = filter_
 
-        result = self.shotgun.find(type_, filters, fields, *args, **kwargs)
+        return filters
+
+    def _find_resolved(self, type_, filters, fields, args, kwargs, merge=True, use_cache=True, local=False):
+
+        if local:
+            try:
+                if not merge:
+                    raise UnsupportedFilter('cannot find locally without merging')
+                entities = self._find_local(type_, filters, fields, args, kwargs)
+                if self.tracer is not None:
+                    self.tracer.hit(type_, len(entities), 'find')
+                return entities
+            except UnsupportedFilter as e:
+                if local != 'prefer':
+                    raise
+                log.debug('cannot find %s locally: %s' % (type_, e))
+
+        # Only merged results are cached, since they are owned by the session.
+        cache = self.query_cache if (merge and use_cache) else None
+        if cache is not None:
+            cache_key = cache.make_key(type_, filters, fields, args, kwargs)
+            entities = cache.get(cache_key)
+            if entities is not None:
+                if self.tracer is not None:
+                    self.tracer.hit(type_, len(entities), 'find')
+                return list(entities)
+
+        result = self._call_shotgun('find', type_, filters, fields, *args, **kwargs)
+
+        if not merge:
+            return result
+
+        entities = [self.merge(x, over=True) for x in result]
+        if cache is not None:
+            cache.set(cache_key, tuple(entities))
+
+        # Remember if we now have every entity of this type. Fields from an
+        # earlier load are only kept if there are no new entities without them.
+        options = self._find_options(args, kwargs)
+        if not (filters or options.get('limit') or options.get('page') or options.get('retired_only')):
+            ids = set(e['id'] for e in entities)
+            fields = frozenset(fields)
+            old = self._loaded_types.get(type_)
+            if old and ids <= old[1]:
+                fields = fields.union(old[0])
+            self._loaded_types[type_] = (fields, ids)
+
+        return entities
+
+    def _find_options(self, args, kwargs):
+        options = dict(zip(_find_arg_names, args))
+        options.update(kwargs)
+        return options
+
+    def _find_local(self, type_, filters, fields, args, kwargs):
+
+        try:
+            loaded, loaded_ids = self._loaded_types[type_]
+        except KeyError:
+            raise UnsupportedFilter('%s is not fully loaded' % type_)
+        missing = [f for f in fields if f not in loaded]
+        if missing:
+            raise UnsupportedFilter('fields not loaded', type_, missing)
+
+        options = self._find_options(args, kwargs)
+        unknown = [k for k, v in options.iteritems() if v and k not in ('order', 'filter_operator', 'limit', 'page')]
+        if unknown:
+            raise UnsupportedFilter('cannot evaluate options locally', unknown)
+
+        filter_operator = options.get('filter_operator')
+        # Only the entities which were loaded (and not stubs merged since via
+        # links) are considered, in ID order so that ties are deterministic.
+        candidates = self._indexed_candidates(type_, filters, filter_operator)
+        if candidates is None:
+            candidates = filter(None, (self._cache.get((type_, id_)) for id_ in loaded_ids))
+        else:
+            candidates = [e for e in candidates if e['id'] in loaded_ids]
+        candidates.sort(key=lambda e: e['id'])
+        entities = [e for e in candidates if e._exists is not False and match(e, filters, filter_operator)]
+
+        # Sort by the requested order, or by ID.
+        order = options.get('order') or [{'field_name': 'id'}]
+        for spec in reversed(order):
+            field = spec['field_name']
+            if field not in loaded and field != 'id':
+                raise UnsupportedFilter('order field not loaded', type_, field)
+            keys = {}
+            for e in entities:
+                value = get_value(e, field)
+                if isinstance(value, (dict, list)):
+                    raise UnsupportedFilter('cannot order by links', type_, field)
+                keys[e] = (value is not None, value)
+            entities.sort(key=keys.__getitem__, reverse=spec.get('direction') == 'desc')
 
-        return [self.merge(x, over=True) for x in result] if merge else result
+        limit = options.get('limit')
+        if limit:
+            start = (options['page'] - 1) * limit if options.get('page') else 0
+            entities = entities[start:start + limit]
+
+        return entities
+
+    def _indexed_candidates(self, type_, filters, filter_operator):
+
+        # We can only narrow when every filter must pass.
+        if not isinstance(filters, (list, tuple)) or filter_operator not in (None, 'all', 'and'):
+            return
+
+        for filter_ in filters:
+            if isinstance(filter_, dict) or len(filter_) < 3 or filter_[1] not in ('is', 'in'):
+                continue
+            index = self._indexes.get((type_, filter_[0]))
+            if index is None:
+                continue
+            values = list(filter_[2:])
+            if filter_[1] == 'in' and len(values) == 1 and isinstance(values[0], (list, tuple)):
+                values = values[0]
+            found = set()
+            for key in self._index_keys(values):
+                found.update(index.get(key, ()))
+            return found
+
+    def query(self, type_, *fields):
+        """Start a lazy query for the given type and fields.
+
+        :return: A :class:`~sgsession.query.Query`.
+
+        ::
+
+            >>> session.query('Task', 'content').filter(entity=shot).order_by('content').first()
+            <Entity Task:345 'Animate' at 0x10155b5e0>
+
+        """
+        if self.schema:
+            type_ = self.schema.resolve_one_entity(type_)
+        return Query(self, type_, fields)
+
+    def prepare(self, type_, filters, fields=None, *args, **kwargs):
+        """Prepare a :meth:`find` to be run many times with different values.
+
+        :param str type_: The entity type to find.
+        :param list filters: The filters, in which any values may be a
+            :class:`~sgsession.prepared.Param` to be bound when run.
+        :param list fields: The fields to find.
+        :return: A :class:`~sgsession.prepared.PreparedFind`.
+
+        All of the work that :meth:`find` does to normalize a query (adding
+        important fields, expanding braces, resolving the schema, and
+        minimizing entities) is done once here, so that running the prepared
+        query costs little more than the request itself::
+
+            >>> tasks_of = session.prepare('Task', [('entity', 'is', Param('shot'))], ['content'])
+            >>> tasks_of.find(shot=shot)
+            [<Entity Task:345 'Animate' at 0x10155b5e0>]
+
+        Extra args and kwargs are passed to every :meth:`find`.
+
+        """
+        add_default_fields = kwargs.pop('add_default_fields', True)
+        type_, filters, fields = self._resolve_find(type_, filters, fields, add_default_fields)
+        return PreparedFind(self, type_, filters, fields, args, kwargs)
+
+    @_asyncable
+    def preload(self, type_, fields=None):
+        """Find every entity of the given type, so that later calls to
+        :meth:`find` may be answered locally.
+
+        :param str type_: The entity type to load.
+        :param list fields: Fields to load in addition to the important ones.
+        :return: :class:`list` of all the entities.
+
+        """
+        return self.find(type_, [], fields)
     
     @_asyncable
+    @_traced
     def find_one(self, entity_type, filters, fields=None, order=None,
         filter_operator=None, retired_only=False, **kwargs):
         """Find one entity.
@@ -606,55 +1461,177 @@ class Session(object):
             return results[0]
         return None
     
+    @_traced_iter
     def find_iter(self, *args, **kwargs):
+        """Find entities, yielding them as pages arrive from the server.
+
+        Accepts the same arguments as :meth:`find`, as well as:
+
+        :param int limit: The total number of entities to yield.
+        :param int per_page: The number of entities to request at once.
+        :param int async_count: The maximum number of pages to request in parallel.
+        :param int max_buffered: The maximum number of rows to have requested
+            but not yet yielded; no more pages will be requested until the
+            consumer catches up. Defaults to ``per_page * async_count``.
+        :param bool adaptive: Start with a single page in flight, and grow
+            towards ``async_count`` while we are waiting on the server, or
+            shrink while pages arrive faster than they are consumed.
+
+        :param bool keyset: Page by ``id`` instead of by page number; see below.
+
+        Any pages still outstanding when the generator is closed (e.g. by
+        breaking out of a loop over it) are cancelled.
+
+        Numbered pages get slower the deeper they go, and will skip or repeat
+        rows if entities are created or retired while iterating. With
+        ``keyset=True`` results are ordered by ``id``, and each page asks for
+        the entities after the last ``id`` that was seen. If ``async_count``
+        is more than one, the range of IDs is split into that many slices
+        which are paged through in parallel; entities are ordered by ``id``
+        within each slice, but the slices are interleaved.
+
+        """
+        if kwargs.pop('keyset', False):
+            return self._find_iter_keyset(*args, **kwargs)
+        return self._find_iter_pages(*args, **kwargs)
+
+    def _find_iter_pages(self, *args, **kwargs):
 
         limit = kwargs.pop('limit', None) or None
         per_page = kwargs.pop('per_page', limit or 500) # this is the default
-        async_count = kwargs.pop('async_count', 1)
+        async_count = max(1, kwargs.pop('async_count', 1))
+        max_buffered = kwargs.pop('max_buffered', None) or per_page * async_count
+        adaptive = kwargs.pop('adaptive', False)
 
         kwargs['limit'] = per_page
         kwargs['async'] = True
 
+        window = 1 if adaptive else async_count
         page = 1
-        futures = []
+        futures = collections.deque()
         done = False
 
-        while not done:
-
-            # extract all complete results; we wait for the first one, but
-            # then take as many others as are already done
-            rows = futures.pop(0).result() if futures else None
-            while rows and futures and futures[0].done():
-                rows.extend(futures.pop(0).result())
-
-            # determine if we are done yet
-            if rows is not None:
-                # print 'got', len(rows)
-                # we hit the end of results
-                if not rows or len(rows) < per_page:
-                    done = True
-                # we hit the total requested
+        try:
+
+            while not done:
+
+                # Wait for the next page. If we had to wait then the server is
+                # the bottleneck, so allow more pages in flight; if the page
+                # after it is also done then we are the bottleneck.
+                rows = None
+                if futures:
+                    future, start_time = futures.popleft()
+                    if adaptive:
+                        if not future.done():
+                            window = min(window + 1, async_count)
+                        elif futures and futures[0][0].done():
+                            window = max(window - 1, 1)
+                    rows = future.result()
+                    log.debug('find_iter page of %d in %.3fs; window is %d' % (
+                        len(rows), time.time() - start_time, window,
+                    ))
+
+                # determine if we are done yet
+                if rows is not None:
+                    # we hit the end of results
+                    if not rows or len(rows) < per_page:
+                        done = True
+                    # we hit the total requested
+                    if limit is not None:
+                        rows = rows[:limit]
+                        limit -= len(rows)
+                        if limit <= 0:
+                            done = True
+
+                # Queue up the next queries, but only as many rows as we are
+                # willing to hold onto.
+                while (not done and len(futures) < window and
+                    (not futures or (len(futures) + 1) * per_page <= max_buffered)
+                ):
+                    kwargs['page'] = page
+                    futures.append((self.find(*args, **kwargs), time.time()))
+                    page += 1
+
+                # yield results
+                if rows is not None:
+                    for x in rows:
+                        yield x
+
+        finally:
+            for future, _ in futures:
+                future.cancel()
+
+    def _find_iter_keyset(self, type_, filters, fields=None, order=None,
+        filter_operator=None, limit=None, retired_only=False, per_page=None,
+        async_count=1, **kwargs):
+
+        if order and [(o.get('field_name'), o.get('direction', 'asc')) for o in order] != [('id', 'asc')]:
+            raise ValueError('keyset iteration is always ordered by id', order)
+        order = [{'field_name': 'id', 'direction': 'asc'}]
+
+        limit = limit or None
+        per_page = per_page or limit or 500
+        async_count = max(1, async_count)
+
+        # We need to add our own filters, so wrap up "any" filters.
+        filters = list(filters or ())
+        if filter_operator in ('any', 'or'):
+            filters = [{'filter_operator': filter_operator, 'filters': filters}]
+
+        kwargs.update(order=order, retired_only=retired_only, limit=per_page)
+
+        # Split the ID range into slices of (last_seen_id, max_id).
+        if async_count > 1:
+            bounds = []
+            for direction in ('asc', 'desc'):
+                found = self.find(type_, filters, ['id'], [{'field_name': 'id', 'direction': direction}],
+                    limit=1, retired_only=retired_only, add_default_fields=False, merge=False)
+                if not found:
+                    return
+                bounds.append(found[0]['id'])
+            low, high = bounds
+            step = max(1, (high - low + async_count) // async_count)
+            slices = [[start - 1, min(start + step - 1, high)] for start in xrange(low, high + 1, step)]
+        else:
+            slices = [[0, None]]
+
+        def submit(slice_):
+            last_id, max_id = slice_
+            page_filters = list(filters)
+            page_filters.append(['id', 'greater_than', last_id])
+            if max_id is not None:
+                page_filters.append(['id', 'less_than', max_id + 1])
+            return self.find(type_, page_filters, fields, async=True, **kwargs)
+
+        # Every slice has one page in flight, and we take them in turn.
+        futures = collections.deque((slice_, submit(slice_)) for slice_ in slices)
+
+        try:
+            while futures:
+
+                slice_, future = futures.popleft()
+                rows = future.result()
                 if limit is not None:
+                    rows = rows[:limit]
                     limit -= len(rows)
-                    if limit <= 0:
-                        done = True
 
-            # queue up the next queries
-            while not done and len(futures) < async_count:
-                # print 'queing', page
-                kwargs['page'] = page
-                futures.append(self.find(*args, **kwargs))
-                page += 1
+                if rows and len(rows) == per_page and (limit is None or limit > 0):
+                    slice_[0] = rows[-1]['id']
+                    futures.append((slice_, submit(slice_)))
 
-            # yield results
-            if rows is not None:
                 for x in rows:
                     yield x
 
+                if limit is not None and limit <= 0:
+                    break
 
+        finally:
+            for _, future in futures:
+                future.cancel()
 
 
     @_asyncable
+    @_traced
     def delete(self, entity, entity_id=None):
         """Delete one entity.
         
@@ -672,38 +1649,69 @@ class Session(object):
                 raise ValueError('must provide entity_id')
             entity = self.merge({'type': entity, 'id': entity_id})
 
-        res = self.shotgun.delete(entity['type'], entity['id'])
+        res = self._call_shotgun('delete', entity['type'], entity['id'])
+        self._invalidate_queries([entity['type']])
         entity._exists = False
 
         return res
         
     @_asyncable
+    @_traced
     def get(self, type_, id_, fields=None, fetch=True):
         """Get one entity by type and ID.
         
         :param str type_: The entity type to lookup.
         :param int id_: The entity ID to lookup. Accepts ``list`` or ``tuple``
-            of IDs, and returns the same.
+            of IDs, and returns the same (with ``None`` for those not found).
         :param bool fetch: Request this entity from the server if not cached?
+
+        Multiple IDs are served from the cache where possible, and the rest
+        are found together via ``id in`` queries.
         
         """
 
-        # Handle multiple IDs.
-        if isinstance(id_, (list, tuple)):
-            return type(id_)(self.get(type_, x) for x in id_)
-
         if self.schema:
             type_ = self.schema.resolve_one_entity(type_)
 
+        # Handle multiple IDs.
+        if isinstance(id_, (list, tuple)):
+            return type(id_)(self._get_many(type_, id_, fields, fetch))
+
         try:
             entity = self._cache[(type_, id_)]
         except KeyError:
+            if self.n_plus_one is not None:
+                self.n_plus_one.observe(type_, fields, 'Session.get(type, ids)')
             return self.find_one(type_, [('id', 'is', id_)], fields or [])
         else:
+            if self.tracer is not None:
+                self.tracer.hit(type_, 1, 'get')
             if fetch and fields:
                 entity.fetch(fields)
             return entity
     
+    def _get_many(self, type_, ids, fields, fetch):
+
+        cached = []
+        missing = set()
+        for id_ in ids:
+            entity = self._cache.get((type_, id_))
+            if entity is None:
+                missing.add(id_)
+            else:
+                cached.append(entity)
+
+        if cached and self.tracer is not None:
+            self.tracer.hit(type_, len(cached), 'get')
+        if cached and fetch and fields:
+            self.fetch(cached, fields)
+
+        missing = sorted(missing)
+        for i in xrange(0, len(missing), _get_chunk_size):
+            self.find(type_, [['id', 'in'] + missing[i:i + _get_chunk_size]], fields or [])
+
+        return [self._cache.get((type_, id_)) for id_ in ids]
+
     def get_url(self, url):
         """Get one entity by it's URL on Shotgun.
 
@@ -723,8 +1731,10 @@ class Session(object):
         
         raise ValueError('cannot parse url: %r' % url)
 
+    @_traced
     def _fetch(self, entities, fields, force=False):
-        
+
+        fields = list(fields)
         types = list(set(x['type'] for x in entities))
         if len(types) > 1:
             raise ValueError('can only fetch one type at once')
@@ -734,11 +1744,23 @@ class Session(object):
         for e in entities:
             if force or any(f not in e for f in fields):
                 ids_.add(e['id'])
+        if self.tracer is not None:
+            self.tracer.hit(type_, len(entities) - len(ids_), '_fetch')
+        if ids_ and self.field_learner is not None:
+            self.field_learner.fetched([e for e in entities if e['id'] in ids_], fields)
+        if len(ids_) == 1 and self.n_plus_one is not None:
+            if self.parent_fields.get(type_) in fields:
+                suggestion = 'Session.fetch_heirarchy(entities)'
+            else:
+                suggestion = 'Session.fetch(entities, fields)'
+            self.n_plus_one.observe(type_, fields, suggestion)
         if ids_:
+            # Forcing means asking the server, not the query cache.
             res = self.find(
                 type_,
                 [['id', 'in'] + list(ids_)],
                 fields,
+                cache=not force,
             )
             missing = ids_.difference(e['id'] for e in res)
 
@@ -751,6 +1773,7 @@ class Session(object):
 
     @_assert_ownership
     @_asyncable
+    @_traced
     def filter_exists(self, entities, check=True, force=False):
         """Return the subset of given entities which exist (non-retired).
 
@@ -771,7 +1794,7 @@ class Session(object):
             for type_, sub_entities in by_type.iteritems():
 
                 if force or any(e._exists is None for e in sub_entities):
-                    found = self.find(type_, [['id', 'in'] + list(e['id'] for e in sub_entities)])
+                    found = self.find(type_, [['id', 'in'] + list(e['id'] for e in sub_entities)], cache=not force)
                     found_ids = set(e['id'] for e in found)
                     for e in sub_entities:
                         e._exists = e['id'] in found_ids
@@ -780,6 +1803,7 @@ class Session(object):
 
     @_assert_ownership
     @_asyncable
+    @_traced
     def fetch(self, to_fetch, fields, force=False):
         """Fetch the named fields on the given entities.
         
@@ -803,6 +1827,96 @@ class Session(object):
     
     @_assert_ownership
     @_asyncable
+    @_traced
+    def fetch_include(self, to_fetch, include):
+        """Load linked entities, and the entities linked from them, etc..
+
+        :param list to_fetch: Entities to start from.
+        :param dict include: Mapping of link fields to further includes on the
+            linked entities. Fields may be given as ``field.Type`` to declare
+            the type of entity they link to.
+
+        This is also available as the ``include`` kwarg to :meth:`find`::
+
+            >>> session.find('Version', filters, include={
+            ...     'sg_task.Task': {'step': {}},
+            ...     'entity': {'sg_sequence': {}},
+            ... })
+
+        Links with a single known type (via the ``field.Type`` form or
+        :attr:`important_links`) become deep fields of the same request,
+        while others are followed up afterwards with one ``id in`` request
+        per entity type at each level.
+
+        """
+        by_type = {}
+        for x in to_fetch:
+            by_type.setdefault(x['type'], set()).add(x)
+        for type_, entities in sorted(by_type.iteritems()):
+            fields, follow = self._compile_include(type_, include)
+            # Deep defaults are skipped since they often point to other types.
+            check = fields + [f for f in self._add_default_fields(type_, ()) if '.' not in f]
+            ids = [e['id'] for e in entities if any(f not in e for f in check)]
+            if ids:
+                self.find(type_, [['id', 'in'] + sorted(ids)], fields)
+            self._follow_includes(entities, follow)
+
+    def _compile_include(self, type_, include, prefix=''):
+
+        fields = []
+        follow = []
+
+        for key, sub_include in sorted(include.iteritems()):
+
+            field, _, link_type = key.partition('.')
+            if not link_type:
+                link_types = self.important_links.get(type_, {}).get(field) or ()
+                link_type = link_types[0] if len(link_types) == 1 else None
+
+            fields.append(prefix + field)
+
+            # Unknown (or polymorphic) links must be followed up afterwards.
+            if not link_type:
+                follow.append(([field], sub_include or {}))
+                continue
+
+            deep = '%s%s.%s.' % (prefix, field, link_type)
+            fields.extend(deep + x for x in itertools.chain(
+                self.important_fields_for_all,
+                self.important_fields.get(link_type, ()),
+                self.important_links.get(link_type, {}).iterkeys(),
+            ))
+            sub_fields, sub_follow = self._compile_include(link_type, sub_include or {}, deep)
+            fields.extend(sub_fields)
+            follow.extend(([field] + path, x) for path, x in sub_follow)
+
+        return fields, follow
+
+    def _follow_includes(self, entities, follow):
+
+        # Gather everything at the end of each path, by type.
+        by_type = {}
+        for path, include in follow:
+            linked = list(entities)
+            for field in path:
+                next_linked = []
+                for e in linked:
+                    value = e.get(field)
+                    for x in value if isinstance(value, list) else [value]:
+                        if isinstance(x, Entity):
+                            next_linked.append(x)
+                linked = next_linked
+            for e in linked:
+                entry = by_type.setdefault(e['type'], (set(), {}))
+                entry[0].add(e)
+                _merge_includes(entry[1], include)
+
+        for type_, (linked, include) in sorted(by_type.iteritems()):
+            self.fetch_include(linked, include)
+
+    @_assert_ownership
+    @_asyncable
+    @_traced
     def fetch_backrefs(self, to_fetch, backref_type, field):
         """Fetch requested backrefs on the given entities.
         
@@ -820,10 +1934,13 @@ class Session(object):
         for x in to_fetch:
             by_type.setdefault(x['type'], set()).add(x)
         for type_, entities in by_type.iteritems():
+            if len(entities) == 1 and self.n_plus_one is not None:
+                self.n_plus_one.observe(backref_type, [field], 'Session.fetch_backrefs(entities, backref_type, field)')
             self.find(backref_type, [[field, 'is'] + [x.minimal for x in entities]])
 
     @_assert_ownership
     @_asyncable
+    @_traced
     def fetch_core(self, to_fetch):
         """Assert all "important" fields exist, and fetch them if they do not.
         
@@ -845,6 +1962,7 @@ class Session(object):
             
     @_assert_ownership
     @_asyncable
+    @_traced
     def fetch_heirarchy(self, to_fetch):
         """Populate the parents as far up as we can go, and return all involved.
         
@@ -892,6 +2010,8 @@ class Session(object):
             # Fetch the parent names.
             ids = [x['id'] for x in to_fetch]
             parent_name = self.parent_fields[type_]
+            if loop_count == 1 and len(ids) == 1 and self.n_plus_one is not None:
+                self.n_plus_one.observe(type_, [parent_name], 'Session.fetch_heirarchy(entities)')
             found = self.find(type_, [['id', 'in'] + ids], [parent_name])
 
             # Make sure we actually get something back for the parent field.
@@ -920,12 +2040,19 @@ class Session(object):
     _guessed_user_lock = threading.Lock()
     
     @_asyncable
-    def guess_user(self, filter=('email', 'starts_with', '{login}@'), fields=(), fetch=True):
+    def guess_user(self, filter=('email', 'starts_with', '{login}@'), fields=(), fetch=True,
+        disk_cache=None, disk_cache_ttl=86400):
         """Guess Shotgun user from current login name.
         
         Looks for $SHOTGUN_USER_ID in your environment, then a user with an
         email that has the login name as the account.
-    
+
+        :param disk_cache: Path to a file to cache the user in between
+            processes, or ``True`` for the default (see
+            :func:`sgsession.usercache.default_path`). Defaults to using
+            ``$SGSESSION_USER_CACHE`` if it is set.
+        :param float disk_cache_ttl: Seconds for which a cached user is valid.
+            Users which are not found are never cached.
         :returns: ``dict`` of ``HumanUser``, or ``None``.
     
         """
@@ -934,7 +2061,9 @@ class Session(object):
             try:
                 user = self._guessed_user
             except AttributeError:
-                user = self._guess_user(filter, fields, fetch)
+                if disk_cache is True or (disk_cache is None and os.environ.get('SGSESSION_USER_CACHE')):
+                    disk_cache = usercache.default_path()
+                user = self._guess_user(filter, fields, fetch, disk_cache, disk_cache_ttl)
                 if user:
                     Session._guessed_user = self.merge(user).as_dict()
                 else:
@@ -948,7 +2077,7 @@ class Session(object):
             return entity
 
 
-    def _guess_user(self, filter, fields, fetch):
+    def _guess_user(self, filter, fields, fetch, disk_cache=None, disk_cache_ttl=None):
 
         # This envvar is used only for this purpose (at Western Post)
         id_ = os.environ.get('SHOTGUN_USER_ID')
@@ -961,18 +2090,29 @@ class Session(object):
         # This envvar is more general, and respected by shotgun_api3_registry.
         login = os.environ.get('SHOTGUN_SUDO_AS_LOGIN')
         if login:
-            return self.find_one('HumanUser', [
-                ('login', 'is', login),
-            ], fields or ())
+            filter_ = ('login', 'is', login)
 
         # Finally, search for a user based on the current login.
-        try:
-            login = os.getlogin()
-        except OSError as e:
-            # this fails on the farm, so fall back onto the envvar
-            if e.errno != errno.ENOTTY:
-                raise
-            login = os.environ.get('USER')
-
-        filter_ = tuple(x.format(login=login) for x in filter)
-        return self.find_one('HumanUser', [filter_], fields)
+        else:
+            try:
+                login = os.getlogin()
+            except OSError as e:
+                # this fails on the farm, so fall back onto the envvar
+                if e.errno != errno.ENOTTY:
+                    raise
+                login = os.environ.get('USER')
+            filter_ = tuple(x.format(login=login) for x in filter)
+
+        if disk_cache:
+            key = json.dumps([getattr(self.shotgun, 'base_url', None), login, filter_])
+            try:
+                return usercache.load(disk_cache, key, disk_cache_ttl)
+            except KeyError:
+                pass
+
+        user = self.find_one('HumanUser', [filter_], fields or ())
+
+        # Don't cache misses, since the user may well be created soon.
+        if disk_cache and user:
+            usercache.store(disk_cache, key, user, disk_cache_ttl)
+        return user
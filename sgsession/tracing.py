@@ -0,0 +1,258 @@
+"""Tracing of the requests that a session makes to the server.
+
+When a tool is slow it is usually because of how many requests it makes, and
+it is rarely obvious which code made them. A :class:`Tracer` records every
+server call made via a :class:`~sgsession.session.Session`, along with the
+session method which made it (e.g. a ``find`` made by ``fetch_heirarchy``),
+and counts the entities which were served from the session instead::
+
+    >>> session = Session(trace=True)
+    >>> shots = session.find('Shot', [])
+    >>> session.fetch_heirarchy(shots)
+    >>> session.stats()['requests']
+    3
+
+Or, to report on just a block of code::
+
+    >>> with session.trace():
+    ...     do_something(session)
+    INFO:sgsession.tracing:3 requests (12 ids, 50 rows) in 0.412s; 20 cache hits
+      fetch_heirarchy: 2 requests (12 ids, 14 rows) in 0.201s; 20 cache hits
+      find: 1 request (0 ids, 36 rows) in 0.211s
+
+"""
+
+from __future__ import absolute_import
+
+import logging
+import threading
+import time
+
+
+log = logging.getLogger(__name__)
+
+
+class TraceRecord(object):
+
+    """One call to the server.
+
+    :ivar str request: The Shotgun method, e.g. ``"find"`` or ``"batch"``.
+    :ivar str caller: The outermost session method which led to the request.
+    :ivar str method: The innermost session method, which made the request.
+    :ivar str entity_type: The entity type (comma separated for batches).
+    :ivar int ids: How many entity IDs the request was about.
+    :ivar tuple fields: The fields requested (or sent).
+    :ivar int rows: How many rows came back.
+    :ivar float duration: Seconds spent waiting on the server.
+    :ivar error: The exception raised, if any.
+
+    """
+
+    __slots__ = ('request', 'caller', 'method', 'entity_type', 'ids', 'fields',
+        'rows', 'start_time', 'duration', 'error')
+
+    def __init__(self, request, caller, method, entity_type, ids, fields):
+        self.request = request
+        self.caller = caller
+        self.method = method
+        self.entity_type = entity_type
+        self.ids = ids
+        self.fields = fields
+        self.rows = 0
+        self.start_time = time.time()
+        self.duration = None
+        self.error = None
+
+    def __repr__(self):
+        return '<TraceRecord %s %s via %s: %d ids, %d rows in %.3fs>' % (
+            self.request, self.entity_type, self.caller, self.ids, self.rows, self.duration or 0,
+        )
+
+
+def _count_ids(filters):
+    count = 0
+    for filter_ in filters or ():
+        if isinstance(filter_, (list, tuple)) and filter_ and filter_[0] == 'id':
+            if filter_[1] == 'in':
+                values = filter_[2:]
+                if len(values) == 1 and isinstance(values[0], (list, tuple)):
+                    values = values[0]
+                count += len(values)
+            elif filter_[1] == 'is':
+                count += 1
+    return count
+
+
+def _describe(request, args, kwargs):
+    """Get the entity type, ID count, and fields of a Shotgun call."""
+    if request == 'batch':
+        requests = args[0] if args else kwargs.get('requests') or ()
+        types = sorted(set(x.get('entity_type') for x in requests))
+        fields = set()
+        for x in requests:
+            fields.update(x.get('data') or ())
+        ids = sum(1 for x in requests if x.get('entity_id'))
+        return ','.join(types), ids, tuple(sorted(fields))
+    entity_type = args[0] if args else kwargs.get('entity_type')
+    if request == 'find':
+        filters = args[1] if len(args) > 1 else kwargs.get('filters')
+        fields = args[2] if len(args) > 2 else kwargs.get('fields')
+        return entity_type, _count_ids(filters), tuple(fields or ())
+    if request == 'summarize':
+        filters = args[1] if len(args) > 1 else kwargs.get('filters')
+        summary_fields = args[2] if len(args) > 2 else kwargs.get('summary_fields')
+        return entity_type, _count_ids(filters), tuple(x.get('field') for x in summary_fields or ())
+    if request == 'create':
+        data = args[1] if len(args) > 1 else kwargs.get('data')
+        return entity_type, 0, tuple(sorted(data or ()))
+    if request == 'update':
+        data = args[2] if len(args) > 2 else kwargs.get('data')
+        return entity_type, 1, tuple(sorted(data or ()))
+    return entity_type, 1 if len(args) > 1 else 0, ()
+
+
+def _count_rows(result):
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 1 if result else 0
+
+
+def _new_stats():
+    return {'requests': 0, 'ids': 0, 'rows': 0, 'duration': 0.0, 'cache_hits': 0, 'errors': 0}
+
+
+class Tracer(object):
+
+    """Records the requests made by a session; see :meth:`.Session.trace`.
+
+    :param int max_records: The most :class:`TraceRecord` objects to keep;
+        the counts in :meth:`stats` include those which were dropped.
+
+    """
+
+    def __init__(self, max_records=10000):
+        self.max_records = max_records
+        self.records = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._listeners = []
+        self._totals = _new_stats()
+        self._by_caller = {}
+        self._by_type = {}
+
+    def enter(self, method):
+        """Note that a session method has started on this thread."""
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(method)
+
+    def exit(self):
+        """Note that the last session method has finished on this thread."""
+        self._local.stack.pop()
+
+    def bind(self, func):
+        """Wrap a function which will be called on another thread, so that the
+        requests it makes are attributed to the methods running on this one."""
+        stack = list(self._local.__dict__.get('stack') or ())
+        def bound(*args, **kwargs):
+            local = self._local.__dict__
+            old = local.get('stack')
+            local['stack'] = list(stack)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                local['stack'] = old if old is not None else []
+        return bound
+
+    def _methods(self, default):
+        stack = self._local.__dict__.get('stack')
+        if not stack:
+            return default, default
+        return stack[0], stack[-1]
+
+    def call(self, shotgun, request, args=(), kwargs=None):
+        """Call a method on the given Shotgun, and record it."""
+        kwargs = kwargs or {}
+        caller, method = self._methods(request)
+        entity_type, ids, fields = _describe(request, args, kwargs)
+        record = TraceRecord(request, caller, method, entity_type, ids, fields)
+        try:
+            result = getattr(shotgun, request)(*args, **kwargs)
+        except Exception as e:
+            record.error = e
+            raise
+        else:
+            record.rows = _count_rows(result)
+            return result
+        finally:
+            record.duration = time.time() - record.start_time
+            self.add(record)
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+            if len(self.records) > self.max_records:
+                del self.records[:len(self.records) - self.max_records]
+            for stats in self._buckets(record.caller, record.entity_type):
+                stats['requests'] += 1
+                stats['ids'] += record.ids
+                stats['rows'] += record.rows
+                stats['duration'] += record.duration
+                stats['errors'] += record.error is not None
+        for listener in self._listeners:
+            listener.add(record)
+
+    def hit(self, entity_type, count=1, method=None):
+        """Note that ``count`` entities were served without a request."""
+        if not count:
+            return
+        caller, _ = self._methods(method)
+        with self._lock:
+            for stats in self._buckets(caller, entity_type):
+                stats['cache_hits'] += count
+        for listener in self._listeners:
+            listener.hit(entity_type, count, caller)
+
+    def _buckets(self, caller, entity_type):
+        yield self._totals
+        yield self._by_caller.setdefault(caller, _new_stats())
+        yield self._by_type.setdefault(entity_type, _new_stats())
+
+    def stats(self):
+        """Get the totals, along with them split by ``"callers"`` and ``"types"``.
+
+        Each set of totals is a dict of ``requests``, ``ids``, ``rows``,
+        ``duration``, ``cache_hits``, and ``errors``.
+
+        """
+        with self._lock:
+            res = dict(self._totals)
+            res['callers'] = dict((k, dict(v)) for k, v in self._by_caller.iteritems())
+            res['types'] = dict((k, dict(v)) for k, v in self._by_type.iteritems())
+        return res
+
+    def format_stats(self):
+        stats = self.stats()
+        lines = [_format_line(stats)]
+        for caller, sub in sorted(stats['callers'].iteritems(), key=lambda x: -x[1]['duration']):
+            lines.append('  %s: %s' % (caller, _format_line(sub)))
+        return '\n'.join(lines)
+
+    def reset(self):
+        """Forget everything which has been recorded."""
+        with self._lock:
+            self.records = []
+            self._totals = _new_stats()
+            self._by_caller = {}
+            self._by_type = {}
+
+
+def _format_line(stats):
+    line = '%d request%s (%d ids, %d rows) in %.3fs' % (
+        stats['requests'], '' if stats['requests'] == 1 else 's',
+        stats['ids'], stats['rows'], stats['duration'],
+    )
+    if stats['cache_hits']:
+        line += '; %d cache hits' % stats['cache_hits']
+    if stats['errors']:
+        line += '; %d errors' % stats['errors']
+    return line
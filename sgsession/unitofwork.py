@@ -0,0 +1,209 @@
+"""Deferred creates, updates, and deletes.
+
+A :class:`UnitOfWork` (from :meth:`.Session.batch` without arguments) queues
+writes instead of sending them one at a time, and then sends them in as few
+``batch`` requests as it can::
+
+    >>> with session.batch() as batch:
+    ...     shot = batch.create('Shot', code='AA_001', project=project)
+    ...     task = batch.create('Task', content='Anm', entity=shot, project=project)
+    ...     batch.update(other_task, sg_status_list='ip')
+    >>> task['entity'] is shot
+    True
+
+Created entities are returned as placeholders without an ``id``, which may
+be linked to from other requests in the same unit of work. Since the server
+cannot link to an entity created in the same ``batch``, requests are grouped
+into levels by what they link to; each level is sent (in chunks of at most
+:attr:`UnitOfWork.chunk_size`) once the level before it has been created.
+
+Each ``batch`` request is a transaction on its own, but a unit of work which
+takes several of them is not. If one fails, the requests which were not sent
+(including those of the failed ``batch``) stay queued, and may be sent again
+with :meth:`UnitOfWork.flush`.
+
+"""
+
+from __future__ import absolute_import
+
+from .entity import Entity
+
+
+class UnitOfWork(object):
+
+    """Queues writes to be sent together; see :meth:`.Session.batch`.
+
+    :param session: The :class:`.Session` to write through.
+    :param int chunk_size: The most requests to send in one ``batch``.
+
+    Used as a context manager, the queue is flushed on exit unless there was
+    an exception, in which case it is discarded.
+
+    """
+
+    def __init__(self, session, chunk_size=100):
+        self.session = session
+        self.chunk_size = chunk_size
+        self._ops = [] # (level, request, entity)
+        self._created = {} # id(placeholder) -> level of its create
+        self._target_levels = {} # target key -> level of its last request
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, tb):
+        if type_ is None:
+            self.flush()
+        else:
+            self.clear()
+
+    def __len__(self):
+        return len(self._ops)
+
+    def _target_key(self, entity):
+        if entity['id'] is None:
+            return id(entity)
+        return entity.cache_key
+
+    def _level(self, data, target=None):
+        """The level at which a request can be sent, given what it links to."""
+        level = 0
+        for entity in _iter_entities(data):
+            created = self._created.get(id(entity))
+            if created is not None:
+                level = max(level, created + 1)
+        if target is not None:
+            created = self._created.get(id(target))
+            if created is not None:
+                level = max(level, created + 1)
+            # Keep requests to the same entity in the order they were made.
+            level = max(level, self._target_levels.get(self._target_key(target), 0))
+        return level
+
+    def _entity(self, entity, entity_id=None):
+        if isinstance(entity, Entity):
+            if entity['id'] is None and id(entity) not in self._created:
+                raise ValueError('placeholder is not from this unit of work', entity)
+            return entity
+        if isinstance(entity, dict):
+            return self.session.merge(entity)
+        if not entity_id:
+            raise ValueError('must provide entity_id')
+        if self.session.schema:
+            entity = self.session.schema.resolve_one_entity(entity)
+        return self.session.merge({'type': entity, 'id': entity_id})
+
+    def create(self, type_, data=None, return_fields=None, **kwargs):
+        """Queue the creation of an entity.
+
+        :return: A placeholder :class:`~sgsession.entity.Entity`, which will
+            be given its ``id`` and fields once it is created.
+
+        """
+        if data is not None and kwargs:
+            raise TypeError('provide only one of data or **kwargs')
+        data = dict(data if data is not None else kwargs)
+        if self.session.schema:
+            type_ = self.session.schema.resolve_one_entity(type_)
+
+        entity = Entity(type_, None, self.session)
+        request = {'request_type': 'create', 'entity_type': type_, 'data': data}
+        if return_fields:
+            request['return_fields'] = list(return_fields)
+
+        level = self._level(data)
+        self._created[id(entity)] = level
+        self._target_levels[id(entity)] = level
+        self._ops.append((level, request, entity))
+        return entity
+
+    def update(self, entity, data=None, **kwargs):
+        """Queue an update of an entity (or placeholder) with the given fields."""
+        entity = self._entity(entity)
+        data = dict(data or {}, **kwargs)
+        if not data:
+            raise ValueError('no data provided')
+        request = {'request_type': 'update', 'entity_type': entity['type'], 'data': data}
+        level = self._level(data, entity)
+        self._target_levels[self._target_key(entity)] = level
+        self._ops.append((level, request, entity))
+
+    def delete(self, entity, entity_id=None):
+        """Queue the deletion of an entity (or placeholder)."""
+        entity = self._entity(entity, entity_id)
+        request = {'request_type': 'delete', 'entity_type': entity['type']}
+        level = self._level(None, entity)
+        self._target_levels[self._target_key(entity)] = level
+        self._ops.append((level, request, entity))
+
+    def clear(self):
+        """Forget all queued requests."""
+        self._ops = []
+        self._created.clear()
+        self._target_levels.clear()
+
+    def flush(self):
+        """Send all queued requests, and merge the results into the session.
+
+        If a ``batch`` fails, the error is raised and the requests which were
+        not sent remain queued.
+
+        """
+        ops = self._ops
+        chunks = []
+        for level in sorted(set(op[0] for op in ops)):
+            level_ops = [op for op in ops if op[0] == level]
+            for i in xrange(0, len(level_ops), self.chunk_size):
+                chunks.append(level_ops[i:i + self.chunk_size])
+        for i, chunk in enumerate(chunks):
+            try:
+                self._send(chunk)
+            except:
+                self._ops = [op for chunk in chunks[i:] for op in chunk]
+                raise
+        self.clear()
+
+    def _send(self, ops):
+
+        session = self.session
+
+        requests = []
+        for _, request, entity in ops:
+            request = dict(request)
+            if 'data' in request:
+                # Placeholders from earlier levels have their IDs by now.
+                request['data'] = session._minimize_entities(request['data'])
+            if request['request_type'] == 'create':
+                request['return_fields'] = session._add_default_fields(
+                    request['entity_type'], request.get('return_fields'))
+            else:
+                request['entity_id'] = entity['id']
+            requests.append(request)
+
+        results = session._batch(requests)
+
+        for (_, request, entity), result in zip(ops, results):
+            request_type = request['request_type']
+            if request_type == 'create':
+                # Adopt the placeholder as the entity for its new ID.
+                dict.__setitem__(entity, 'id', result['id'])
+                session._cache.setdefault(entity.cache_key, entity)
+                session.merge(result, over=True)
+                entity._exists = True
+            elif request_type == 'update':
+                session.merge(result, over=True)
+            else:
+                entity._exists = False
+
+
+def _iter_entities(data):
+    if isinstance(data, Entity):
+        yield data
+    elif isinstance(data, dict):
+        for value in data.itervalues():
+            for x in _iter_entities(value):
+                yield x
+    elif isinstance(data, (list, tuple)):
+        for value in data:
+            for x in _iter_entities(value):
+                yield x
@@ -0,0 +1,89 @@
+"""An on-disk cache of guessed users, shared between processes.
+
+See :meth:`.Session.guess_user`. Entries are keyed by the server, login, and
+filter used to find the user, and expire after a given TTL. Writes go to a
+temporary file which is renamed into place, so concurrent processes will
+never read a partial file (although one may drop another's new entry, which
+only costs another lookup).
+
+"""
+
+from __future__ import absolute_import
+
+import errno
+import json
+import logging
+import os
+import time
+
+
+log = logging.getLogger(__name__)
+
+
+def default_path():
+    """``$SGSESSION_USER_CACHE``, or a file in ``~/.cache/sgsession``."""
+    return os.environ.get('SGSESSION_USER_CACHE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'sgsession', 'guessed_users.json')
+
+
+def _read(path):
+    try:
+        with open(path) as fh:
+            data = json.load(fh)
+    except (IOError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def load(path, key, ttl):
+    """Get a cached user (which may be ``None``).
+
+    :raises KeyError: if there is no entry, or it is older than ``ttl`` seconds.
+
+    """
+    entry = _read(path).get(key)
+    if not entry or time.time() - entry.get('time', 0) > ttl:
+        raise KeyError(key)
+    return entry.get('user')
+
+
+def store(path, key, user, ttl=None):
+    """Cache a user (or ``None``), dropping entries older than ``ttl`` seconds.
+
+    Failures are logged, but not raised.
+
+    """
+
+    now = time.time()
+    data = _read(path)
+    if ttl is not None:
+        data = dict((k, v) for k, v in data.iteritems() if now - v.get('time', 0) <= ttl)
+    data[key] = {'time': now, 'user': _json_safe(user)}
+
+    dir_ = os.path.dirname(os.path.abspath(path))
+    tmp_path = None
+    try:
+        try:
+            os.makedirs(dir_)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        import tempfile
+        fd, tmp_path = tempfile.mkstemp(dir=dir_, prefix='.%s.' % os.path.basename(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(data, fh, sort_keys=True)
+        os.rename(tmp_path, path)
+    except (IOError, OSError) as e:
+        log.warning('could not write user cache to %s: %s' % (path, e))
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def _json_safe(user):
+    # Only the simple fields are kept; anything else will be fetched again.
+    if not user:
+        return None
+    return dict(
+        (k, v) for k, v in dict.iteritems(user)
+        if v is None or isinstance(v, (basestring, int, long, float, bool))
+    )
@@ -3,8 +3,7 @@ import functools
 import itertools
 import logging
 import re
-
-import pkg_resources
+import threading
 
 
 log = logging.getLogger(__name__)
@@ -39,18 +38,42 @@ def expand_braces(pattern):
     return res
 
 
-def shotgun_api3_connect(*args, **kwargs):
+_connect_entry_points = None
+_connect_entry_points_lock = threading.Lock()
+
+
+def _get_connect_entry_points():
+    """Get (and cache) the sorted ``(name, load, is_direct)`` for connection entry points.
+
+    Scanning every installed distribution (and importing ``pkg_resources``
+    in the first place) is slow, so this is done once per process; call
+    :func:`clear_connect_entry_points` if they change.
 
-    eps = []
-    for ep in pkg_resources.iter_entry_points('shotgun_api3_connect'):
-        eps.append((ep, True))
-    for ep in pkg_resources.iter_entry_points('shotgun_api3_kwargs'):
-        eps.append((ep, False))
-    eps.sort(key=lambda (ep, _): ep.name)
+    """
+    global _connect_entry_points
+    with _connect_entry_points_lock:
+        if _connect_entry_points is None:
+            import pkg_resources
+            eps = []
+            for ep in pkg_resources.iter_entry_points('shotgun_api3_connect'):
+                eps.append((ep.name, ep.load, True))
+            for ep in pkg_resources.iter_entry_points('shotgun_api3_kwargs'):
+                eps.append((ep.name, ep.load, False))
+            eps.sort(key=lambda ep: ep[0])
+            _connect_entry_points = eps
+        return _connect_entry_points
+
+
+def clear_connect_entry_points():
+    global _connect_entry_points
+    _connect_entry_points = None
+
+
+def shotgun_api3_connect(*args, **kwargs):
 
-    for ep, is_direct in eps:
+    for name, load, is_direct in _get_connect_entry_points():
 
-        func = ep.load()
+        func = load()
         res = func(*args, **kwargs)
         if not res:
             continue
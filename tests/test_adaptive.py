@@ -0,0 +1,73 @@
+from common import *
+
+from sgsession.adaptive import FieldLearner
+
+
+class TestAdaptive(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+
+        proj = fix.Project(mini_uuid())
+        seq = proj.Sequence('AA', project=proj)
+        for i in range(1, 4):
+            seq.Shot('AA_%03d' % i, project=proj, sg_status_list='ip')
+
+        self.proj = minimal(proj)
+        self.learner = FieldLearner()
+
+    def tearDown(self):
+        self.fix.delete_all()
+
+    def find_shots(self, session):
+        return session.find('Shot', [('project', 'is', self.proj)])
+
+    def test_learns_fetched_fields(self):
+
+        session = Session(self.sg, field_learner=self.learner)
+        for shot in self.find_shots(session):
+            self.assertNotIn('sg_status_list', shot)
+            shot.fetch('sg_status_list')
+
+        report = self.learner.report()
+        self.assertEqual(len(report), 1)
+        (type_, site), fields = report.items()[0]
+        self.assertEqual(type_, 'Shot')
+        self.assertIn('test_adaptive.py', site)
+        self.assertEqual(fields, ['sg_status_list'])
+
+        # A new session starts with what we learned.
+        session = Session(self.sg, field_learner=self.learner)
+        for shot in self.find_shots(session):
+            self.assertEqual(shot['sg_status_list'], 'ip')
+
+    def test_call_sites_are_separate(self):
+
+        session = Session(self.sg, field_learner=self.learner)
+        for shot in self.find_shots(session):
+            shot.fetch('sg_status_list')
+
+        # The same query from elsewhere is untouched.
+        session = Session(self.sg, field_learner=self.learner)
+        shot = session.find('Shot', [('project', 'is', self.proj)])[0]
+        self.assertNotIn('sg_status_list', shot)
+
+    def test_limits(self):
+
+        self.learner.max_fields = 1
+        session = Session(self.sg, field_learner=self.learner)
+        for shot in self.find_shots(session):
+            shot.fetch(['sg_status_list', 'description'])
+
+        fields = self.learner.report().values()[0]
+        self.assertEqual(len(fields), 1)
+
+    def test_window(self):
+
+        self.learner.window = -1
+        session = Session(self.sg, field_learner=self.learner)
+        for shot in self.find_shots(session):
+            shot.fetch('sg_status_list')
+
+        self.assertEqual(self.learner.report(), {})
@@ -0,0 +1,113 @@
+from common import *
+
+from sgsession.session import BatchError
+
+
+class TestBatchChunks(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+
+        proj = fix.Project(mini_uuid())
+        self.proj = minimal(proj)
+
+        self.batches = []
+        batch = self.sg.batch
+        def checked_batch(requests):
+            self.batches.append(len(requests))
+            if any(x['data']['code'] == 'fail' for x in requests):
+                raise ValueError('failing chunk')
+            return batch(requests)
+        self.sg.batch = checked_batch
+
+        self.session = Session(self.sg)
+
+    def tearDown(self):
+        del self.sg.batch
+        self.fix.delete_all()
+
+    def requests(self, codes):
+        return [{
+            'request_type': 'create',
+            'entity_type': 'Shot',
+            'data': {'code': code, 'project': self.proj},
+        } for code in codes]
+
+    def test_chunks_in_order(self):
+        codes = ['AA_%03d' % i for i in range(7)]
+        for parallel in (False, True):
+            del self.batches[:]
+            res = self.session.batch(self.requests(codes), chunk_size=3, parallel=parallel)
+            self.assertEqual([x['code'] for x in res], codes)
+            self.assertEqual(sorted(self.batches), [1, 3, 3])
+
+    def test_small_batch(self):
+        res = self.session.batch(self.requests(['AA_001']), chunk_size=3)
+        self.assertEqual(res[0]['code'], 'AA_001')
+        self.assertEqual(self.batches, [1])
+
+    def test_serial_failure(self):
+        codes = ['AA_001', 'fail', 'AA_003', 'AA_004']
+        try:
+            self.session.batch(self.requests(codes), chunk_size=1)
+        except BatchError as e:
+            self.assertEqual(e.errors[0][0], 1)
+            self.assertIsInstance(e.errors[0][1], ValueError)
+            self.assertEqual(e.errors[1:], [(2, None), (3, None)])
+            self.assertEqual(str(e), '1 of 4 batch chunks failed; 2 were not sent')
+            self.assertEqual(e.results[0]['code'], 'AA_001')
+            self.assertEqual(e.results[1:], [None, None, None])
+        else:
+            self.fail('no BatchError')
+        self.assertEqual(self.batches, [1, 1])
+
+    def test_concurrent_failure(self):
+        codes = ['AA_001', 'AA_002', 'fail', 'AA_004', 'AA_005']
+        try:
+            self.session.batch(self.requests(codes), chunk_size=2, parallel=True)
+        except BatchError as e:
+            self.assertEqual([i for i, _ in e.errors], [2])
+            self.assertIsInstance(e.errors[0][1], ValueError)
+            self.assertEqual([x and x['code'] for x in e.results], ['AA_001', 'AA_002', None, None, 'AA_005'])
+        else:
+            self.fail('no BatchError')
+
+
+class TestCreateMany(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+        self.session = Session(self.sg)
+
+        proj = fix.Project(mini_uuid())
+        self.proj = minimal(proj)
+
+    def tearDown(self):
+        self.fix.delete_all()
+
+    def test_create_many(self):
+        for parallel in (False, True):
+            codes = ['AA_%03d' % i for i in range(5)]
+            rows = [dict(code=code, project=self.proj, description=str(parallel)) for code in codes]
+            shots = self.session.create_many('Shot', rows, ['description'], chunk_size=2, parallel=parallel)
+            self.assertEqual([x['code'] for x in shots], codes)
+            self.assertEqual(set(x['description'] for x in shots), set([str(parallel)]))
+            self.assertTrue(all(isinstance(x, Entity) for x in shots))
+            self.assertSameEntity(shots[0]['project'], self.proj)
+
+            found = self.session.find('Shot', [('id', 'in', [x['id'] for x in shots])])
+            self.assertEqual(len(found), 5)
+
+    def test_parallel_async(self):
+        # The chunks must not wait on the pool that the batch itself is in.
+        futures = []
+        for i in range(10):
+            rows = [dict(code='AA_%03d_%d' % (j, i), project=self.proj) for j in range(4)]
+            futures.append(self.session.create_many('Shot', rows, chunk_size=1, parallel=True, async=True))
+        for future in futures:
+            self.assertEqual(len(future.result(timeout=10)), 4)
+
+    def test_no_rows(self):
+        self.assertEqual(self.session.create_many('Shot', []), [])
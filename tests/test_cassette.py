@@ -0,0 +1,116 @@
+import datetime
+import shutil
+import tempfile
+
+from common import *
+
+from sgsession.cassette import CassetteError, RecordingShotgun, ReplayShotgun
+
+
+class TestCassette(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+
+        proj = fix.Project(mini_uuid())
+        seq = proj.Sequence('AA', project=proj)
+        shots = [seq.Shot('AA_%03d' % i, project=proj) for i in range(1, 4)]
+
+        self.proj = minimal(proj)
+        self.shots = [minimal(x) for x in shots]
+
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cassette.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        self.fix.delete_all()
+
+    def run_tool(self, session):
+        shots = session.find('Shot', [('project', 'is', self.proj)], ['description'])
+        session.fetch_heirarchy(shots)
+        session.update(shots[0], description='new')
+        return sorted(x['code'] for x in shots)
+
+    def record(self):
+        with RecordingShotgun(self.sg, self.path) as sg:
+            codes = self.run_tool(Session(sg))
+        return sg, codes
+
+    def test_record_and_replay(self):
+
+        recorder, codes = self.record()
+        methods = [x['method'] for x in recorder.interactions]
+        self.assertEqual((methods[0], methods[-1]), ('find', 'update'))
+        self.assertTrue(all(x['duration'] >= 0 for x in recorder.interactions))
+
+        replay = ReplayShotgun(self.path, strict=True)
+        session = Session(replay)
+        self.assertEqual(self.run_tool(session), codes)
+
+        stats = replay.stats()
+        self.assertEqual(stats['recorded'], len(methods))
+        self.assertEqual(stats['played'], len(methods))
+        self.assertEqual(stats['unexpected'], 0)
+        self.assertEqual(replay.unplayed(), [])
+
+        shot = session.get('Shot', self.shots[0]['id'], fetch=False)
+        self.assertEqual(shot['description'], 'new')
+        self.assertIsInstance(shot['sg_sequence']['code'], str)
+
+    def test_strict(self):
+        recorder, _ = self.record()
+        replay = ReplayShotgun(self.path, strict=True)
+        session = Session(replay)
+        self.assertRaises(CassetteError, session.find, 'Shot', [('code', 'is', 'AA_001')])
+        self.assertEqual(len(replay.unplayed()), len(recorder.interactions))
+
+    def test_lenient(self):
+        self.record()
+        replay = ReplayShotgun(self.path)
+        session = Session(replay)
+        self.assertEqual(session.find('Shot', [('code', 'is', 'AA_001')]), [])
+        self.assertEqual(replay.stats()['unexpected'], 1)
+
+        # Repeats get the last response again.
+        for i in range(2):
+            shots = session.find('Shot', [('project', 'is', self.proj)], ['description'])
+            self.assertEqual(len(shots), 3)
+
+    def test_lenient_counts(self):
+        self.record()
+        session = Session(ReplayShotgun(self.path))
+        self.assertEqual(session.query('Shot').count(), 0)
+
+    def test_batch(self):
+
+        requests = [{
+            'request_type': 'update',
+            'entity_type': 'Shot',
+            'entity_id': x['id'],
+            'data': {'description': 'batched'},
+        } for x in self.shots]
+        with RecordingShotgun(self.sg, self.path) as sg:
+            Session(sg).batch(requests)
+
+        session = Session(ReplayShotgun(self.path, strict=True))
+        res = session.batch(requests)
+        self.assertEqual([x['description'] for x in res], ['batched'] * 3)
+
+        # Unrecorded writes fail even when lenient.
+        session = Session(ReplayShotgun(self.path))
+        self.assertRaises(CassetteError, session.batch, requests[:1])
+        self.assertRaises(CassetteError, session.create, 'Shot', {'code': 'AA_004', 'project': self.proj})
+
+    def test_datetimes(self):
+
+        when = datetime.datetime(2014, 1, 2, 3, 4, 5, 6)
+        sg = RecordingShotgun(self.sg, self.path)
+        sg.update('Shot', self.shots[0]['id'], {'sg_cut_time': when})
+        sg.find('Shot', [('sg_cut_time', 'is', when)], ['sg_cut_time'])
+        sg.save()
+
+        replay = ReplayShotgun(self.path, strict=True)
+        res = replay.find('Shot', [('sg_cut_time', 'is', when)], ['sg_cut_time'])
+        self.assertEqual(res[0]['sg_cut_time'], when)
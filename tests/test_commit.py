@@ -0,0 +1,105 @@
+from common import *
+
+
+class TestCommit(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+
+        proj = fix.Project(mini_uuid())
+        seq = proj.Sequence('AA', project=proj)
+        shots = [seq.Shot('AA_%03d' % i, project=proj, description='old') for i in range(1, 4)]
+
+        self.proj = minimal(proj)
+        self.shots = [minimal(x) for x in shots]
+
+        self.batches = []
+        batch = self.sg.batch
+        def counting_batch(requests):
+            self.batches.append(requests)
+            return batch(requests)
+        self.sg.batch = counting_batch
+
+        self.session = Session(self.sg)
+
+    def tearDown(self):
+        del self.sg.batch
+        self.fix.delete_all()
+
+    def test_merge_is_not_dirty(self):
+        shots = self.session.find('Shot', [('project', 'is', self.proj)], ['description'])
+        for shot in shots:
+            self.assertEqual(shot.dirty_fields, set())
+        self.assertEqual(self.session.commit(), [])
+        self.assertEqual(self.batches, [])
+
+    def test_session_commit(self):
+
+        shots = self.session.find('Shot', [('project', 'is', self.proj)], ['description'])
+        shots[0]['description'] = 'new'
+        shots[1]['sg_status_list'] = 'ip'
+        self.assertEqual(shots[0].dirty_fields, set(['description']))
+
+        committed = self.session.commit()
+        self.assertEqual(sorted(x['id'] for x in committed), sorted(x['id'] for x in shots[:2]))
+
+        # One batch, with only the changed fields.
+        self.assertEqual(len(self.batches), 1)
+        self.assertEqual(sorted(sorted(x['data']) for x in self.batches[0]), [['description'], ['sg_status_list']])
+        self.assertEqual(shots[0].dirty_fields, set())
+
+        raw = self.sg.find_one('Shot', [('id', 'is', shots[0]['id'])], ['description'])
+        self.assertEqual(raw['description'], 'new')
+
+        # Nothing left to do.
+        self.session.commit()
+        self.assertEqual(len(self.batches), 1)
+
+    def test_entity_commit(self):
+
+        shots = [self.session.merge(x) for x in self.shots]
+        for shot in shots:
+            shot['description'] = 'new'
+
+        shots[0].commit()
+        self.assertEqual(len(self.batches), 1)
+        self.assertEqual(len(self.batches[0]), 1)
+        self.assertEqual(shots[1].dirty_fields, set(['description']))
+
+    def test_chunks(self):
+        shots = [self.session.merge(x) for x in self.shots]
+        for shot in shots:
+            shot['description'] = 'new'
+        self.session.commit(chunk_size=2)
+        self.assertEqual([len(x) for x in self.batches], [2, 1])
+
+    def test_update_is_not_dirty(self):
+        shot, = self.session.find('Shot', [('id', 'is', self.shots[0]['id'])], ['description'])
+        row = self.sg.find_one('Shot', [('id', 'is', shot['id'])], ['description', 'updated_at'])
+        shot.update(row)
+        self.assertEqual(shot.dirty_fields, set())
+        self.assertEqual(self.session.commit(), [])
+
+    def test_set_many_is_dirty(self):
+        shot = self.session.merge(self.shots[0])
+        shot.set_many(description='new', sg_status_list='ip')
+        self.assertEqual(shot.dirty_fields, set(['description', 'sg_status_list']))
+        self.session.commit()
+        raw = self.sg.find_one('Shot', [('id', 'is', shot['id'])], ['description', 'sg_status_list'])
+        self.assertEqual((raw['description'], raw['sg_status_list']), ('new', 'ip'))
+
+    def test_merge_replaces_local_changes(self):
+
+        shot, = self.session.find('Shot', [('id', 'is', self.shots[0]['id'])], ['description'])
+        shot['description'] = 'new'
+        shot['sg_status_list'] = 'ip'
+        shot['updated_at'] = shot['updated_at']
+
+        # The server still says "old", and wins.
+        self.session.find('Shot', [('id', 'is', self.shots[0]['id'])], ['description'])
+        self.assertEqual(shot['description'], 'old')
+        self.assertEqual(shot.dirty_fields, set(['sg_status_list']))
+
+        self.session.commit()
+        self.assertEqual(sorted(self.batches[0][0]['data']), ['sg_status_list'])
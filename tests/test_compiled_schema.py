@@ -0,0 +1,161 @@
+import pickle
+import shutil
+import tempfile
+
+from common import *
+
+from sgsession.compiledschema import CompiledSchema, compile_schema
+
+
+class MockEntity(object):
+
+    def __init__(self, fields):
+        # Like real entities, every one has this.
+        self.fields = dict.fromkeys(['updated_at'] + fields)
+
+
+class MockSchema(object):
+
+    def __init__(self):
+        self.entities = {
+            'Project': MockEntity(['name']),
+            'Sequence': MockEntity(['code', 'project']),
+            'Shot': MockEntity(['code', 'project', 'sg_sequence']),
+        }
+        self.entity_aliases = {'Scene': 'Sequence'}
+        self.calls = []
+
+    def resolve_one_entity(self, name):
+        self.calls.append(name)
+        name = self.entity_aliases.get(name, name)
+        if name not in self.entities:
+            raise ValueError('no entity', name)
+        return name
+
+    def resolve_one_field(self, type_, name):
+        self.calls.append((type_, name))
+        fields = self.entities[type_].fields
+        for x in (name, 'sg_' + name):
+            if x in fields:
+                return x
+        raise ValueError('no field', type_, name)
+
+
+class TestCompiledSchema(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'schema.sgsc')
+        self.full = MockSchema()
+        compile_schema(self.full, self.path)
+        del self.full.calls[:]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_resolve(self):
+
+        schema = CompiledSchema(self.path)
+        self.assertEqual(schema.resolve_one_entity('Scene'), 'Sequence')
+        self.assertEqual(schema.loaded_types, [])
+
+        self.assertEqual(schema.resolve_one_field('Shot', 'sequence'), 'sg_sequence')
+        self.assertEqual(schema.resolve_one_field('Shot', 'sequence.Scene.code'), 'sg_sequence.Sequence.code')
+        self.assertEqual(schema.resolve_field('Shot', ['code', 'sequence']), ['code', 'sg_sequence'])
+        self.assertEqual(schema.loaded_types, ['Sequence', 'Shot'])
+
+        filters = [['code', 'is', 'AA_001']]
+        self.assertIs(schema.resolve_structure(filters), filters)
+
+        # Without a full schema, unknown names are used as they are.
+        self.assertEqual(schema.resolve_one_entity('Nope'), 'Nope')
+        self.assertEqual(schema.resolve_one_field('Shot', 'nope'), 'nope')
+
+    def test_fallback(self):
+
+        loads = []
+        def fallback():
+            loads.append(1)
+            return self.full
+
+        schema = CompiledSchema(self.path, fallback)
+        self.assertEqual(schema.resolve_one_field('Shot', 'code'), 'code')
+        self.assertEqual(loads, [])
+
+        self.assertRaises(ValueError, schema.resolve_one_field, 'Shot', 'nope')
+        self.assertRaises(ValueError, schema.resolve_one_entity, 'Nope')
+        self.assertEqual(loads, [1])
+        self.assertEqual(self.full.calls, [('Shot', 'nope'), 'Nope'])
+
+    def test_session(self):
+        session = Session(False, schema=self.path)
+        shot = session.merge({'type': 'Shot', 'id': 1, 'sequence': {'type': 'Sequence', 'id': 2}})
+        self.assertIn('sg_sequence', dict(shot))
+        self.assertSameEntity(shot['sequence'], {'type': 'Sequence', 'id': 2})
+        self.assertIsInstance(session.schema, CompiledSchema)
+
+    def test_structure(self):
+
+        loads = []
+        def fallback():
+            loads.append(1)
+            return self.full
+
+        schema = CompiledSchema(self.path, fallback)
+        self.assertEqual(
+            schema.resolve_structure([['sequence', 'is', {'type': 'Scene', 'id': 2}]]),
+            [['sequence', 'is', {'type': 'Sequence', 'id': 2}]],
+        )
+        self.assertEqual(
+            schema.resolve_structure({'sequence': {'type': 'Sequence', 'id': 2}, 'code': 'AA_001'}, 'Shot'),
+            {'sg_sequence': {'type': 'Sequence', 'id': 2}, 'code': 'AA_001'},
+        )
+        self.assertEqual(loads, [])
+
+    def test_find_by_entity(self):
+
+        loads = []
+        def fallback():
+            loads.append(1)
+            return self.full
+
+        sg = Shotgun()
+        fix = Fixture(sg)
+        proj = fix.Project(mini_uuid())
+        seq = proj.Sequence('AA')
+        shot = seq.Shot('AA_001')
+
+        session = Session(sg, schema=CompiledSchema(self.path, fallback))
+        found = session.find('Shot', [('sequence', 'is', minimal(seq))])
+        self.assertEqual([x['id'] for x in found], [shot['id']])
+        self.assertEqual(loads, [])
+
+        fix.delete_all()
+
+    def test_bad_file(self):
+        with open(self.path, 'w') as fh:
+            fh.write('something else entirely')
+        self.assertRaises(ValueError, CompiledSchema, self.path)
+
+    def test_bad_envvar_file(self):
+        environ = dict(os.environ)
+        try:
+            # Empty, cut off after the magic string, and something else.
+            for content in ('', 'SGSESSION-SCHEMA-1\n', 'something else entirely'):
+                with open(self.path, 'w') as fh:
+                    fh.write(content)
+                os.environ['SGSESSION_COMPILED_SCHEMA'] = self.path
+                session = Session(False)
+                self.assertIs(session.schema, None)
+                shot = session.merge({'type': 'Shot', 'id': 1, 'code': 'AA_001'})
+                self.assertEqual(shot['code'], 'AA_001')
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+    def test_pickle(self):
+        session = Session(False, schema=self.path)
+        session.schema
+        clone = pickle.loads(pickle.dumps(session))
+        self.assertIsInstance(clone.schema, CompiledSchema)
+        self.assertEqual(clone.schema.path, self.path)
@@ -0,0 +1,133 @@
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from common import *
+
+
+class TestFindIter(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+        self.session = Session(self.sg)
+
+        proj = fix.Project(mini_uuid())
+        seq = proj.Sequence('AA', project=proj)
+        shots = [seq.Shot('AA_%03d' % i, project=proj) for i in range(1, 21)]
+
+        self.proj = minimal(proj)
+        self.shots = [minimal(x) for x in shots]
+
+    def tearDown(self):
+        self.sg.__dict__.pop('find', None)
+        self.fix.delete_all()
+
+    def find_iter(self, **kwargs):
+        return self.session.find_iter('Shot', [('project', 'is', self.proj)], **kwargs)
+
+    def slow_server(self, delay=0.02, gate=None):
+        """Make finds take a while, recording how many are in flight as each
+        one starts; all but the first wait on the gate, if given."""
+        lock = threading.Lock()
+        self.in_flight = 0
+        self.starts = []
+        find = self.sg.find
+        def slow_find(*args, **kwargs):
+            with lock:
+                self.in_flight += 1
+                self.starts.append(self.in_flight)
+                first = len(self.starts) == 1
+            try:
+                if gate is not None and not first:
+                    gate.wait(5)
+                time.sleep(delay)
+                return find(*args, **kwargs)
+            finally:
+                with lock:
+                    self.in_flight -= 1
+        self.sg.find = slow_find
+
+    def test_all_pages(self):
+        found = list(self.find_iter(per_page=3, async_count=4))
+        self.assertEqual(sorted(x['id'] for x in found), sorted(x['id'] for x in self.shots))
+
+    def test_limit(self):
+        found = list(self.find_iter(per_page=3, limit=7))
+        self.assertEqual(len(found), 7)
+
+    def test_async_count(self):
+        self.slow_server()
+        found = list(self.find_iter(per_page=2, async_count=4))
+        self.assertEqual(len(found), len(self.shots))
+        self.assertEqual(self.starts[:4], [1, 2, 3, 4])
+        self.assertEqual(max(self.starts), 4)
+
+    def test_adaptive(self):
+        self.slow_server()
+        found = list(self.find_iter(per_page=2, async_count=4, adaptive=True))
+        self.assertEqual(len(found), len(self.shots))
+        # The first page goes alone, and more are requested once we are
+        # waiting on the server.
+        self.assertEqual(self.starts[:2], [1, 1])
+        self.assertTrue(1 < max(self.starts) <= 4, self.starts)
+
+    def test_max_buffered(self):
+        self.slow_server()
+        found = list(self.find_iter(per_page=2, async_count=4, max_buffered=4))
+        self.assertEqual(len(found), len(self.shots))
+        self.assertEqual(max(self.starts), 2)
+
+    def test_close_early(self):
+
+        # One thread, so that pages after the one running stay queued.
+        self.session._thread_pool = ThreadPoolExecutor(1)
+        futures = []
+        submit = self.session._submit_concurrent
+        def recording_submit(*args, **kwargs):
+            future = submit(*args, **kwargs)
+            futures.append(future)
+            return future
+        self.session._submit_concurrent = recording_submit
+        gate = threading.Event()
+        self.slow_server(0, gate)
+
+        iter_ = self.find_iter(per_page=2, async_count=4)
+        first = next(iter_)
+        self.assertEqual(first['type'], 'Shot')
+        # The first page, and the four after it.
+        self.assertEqual(len(futures), 5)
+
+        # Wait for the second page to be running (and stuck at the gate).
+        for _ in range(500):
+            if len(self.starts) == 2:
+                break
+            time.sleep(0.01)
+
+        iter_.close()
+        self.assertRaises(StopIteration, next, iter_)
+        self.assertTrue(futures[0].done())
+        self.assertEqual([x.cancelled() for x in futures[1:]], [False, True, True, True])
+
+        # Only the page which was already running reaches the server.
+        gate.set()
+        futures[1].result()
+        self.assertEqual(len(self.starts), 2)
+
+    def test_keyset(self):
+        found = [x['id'] for x in self.find_iter(per_page=3, keyset=True)]
+        self.assertEqual(found, sorted(x['id'] for x in self.shots))
+
+    def test_keyset_parallel(self):
+        found = [x['id'] for x in self.find_iter(per_page=3, async_count=3, keyset=True)]
+        self.assertEqual(len(found), len(set(found)))
+        self.assertEqual(sorted(found), sorted(x['id'] for x in self.shots))
+
+    def test_keyset_limit(self):
+        found = list(self.find_iter(per_page=3, async_count=2, limit=5, keyset=True))
+        self.assertEqual(len(found), 5)
+
+    def test_keyset_order(self):
+        iter_ = self.find_iter(keyset=True, order=[{'field_name': 'code', 'direction': 'asc'}])
+        self.assertRaises(ValueError, list, iter_)
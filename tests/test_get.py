@@ -0,0 +1,54 @@
+from common import *
+
+
+class TestGet(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+
+        proj = fix.Project(mini_uuid())
+        shots = [proj.Shot('AA_%03d' % i, project=proj, description='shot %d' % i) for i in range(5)]
+        self.shots = [minimal(x) for x in shots]
+
+        self.finds = []
+        find = self.sg.find
+        def counting_find(type_, filters, *args, **kwargs):
+            self.finds.append(filters)
+            return find(type_, filters, *args, **kwargs)
+        self.sg.find = counting_find
+
+        self.session = Session(self.sg)
+
+    def tearDown(self):
+        del self.sg.find
+        self.fix.delete_all()
+
+    def test_one(self):
+        shot = self.session.get('Shot', self.shots[0]['id'])
+        self.assertEqual(shot['code'], 'AA_000')
+        self.assertIs(self.session.get('Shot', self.shots[0]['id']), shot)
+        self.assertEqual(len(self.finds), 1)
+
+    def test_many(self):
+
+        ids = [x['id'] for x in self.shots]
+        cached = self.session.merge(self.shots[1])
+        missing_id = max(ids) + 1000
+
+        res = self.session.get('Shot', (ids[3], ids[1], missing_id, ids[0], ids[3]))
+        self.assertIsInstance(res, tuple)
+        self.assertEqual([x and x['id'] for x in res], [ids[3], ids[1], None, ids[0], ids[3]])
+        self.assertIs(res[1], cached)
+        self.assertEqual(res[0]['code'], 'AA_003')
+
+        # Only the uncached IDs were queried, and only once.
+        self.assertEqual(len(self.finds), 1)
+        self.assertEqual(sorted(self.finds[0][0][2:]), sorted([ids[3], ids[0], missing_id]))
+
+    def test_many_fields(self):
+        ids = [x['id'] for x in self.shots]
+        self.session.merge(self.shots[0])
+        res = self.session.get('Shot', ids, ['description'])
+        self.assertEqual([x['description'] for x in res], ['shot %d' % i for i in range(5)])
+        self.assertEqual(len(self.finds), 2)
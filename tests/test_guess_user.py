@@ -0,0 +1,95 @@
+import shutil
+import tempfile
+
+from common import *
+
+from sgsession import usercache
+
+
+class TestGuessUser(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+
+        self.login = mini_uuid()
+        self.user = minimal(fix.create('HumanUser', dict(login=self.login, name='Someone')))
+
+        self.finds = []
+        find = self.sg.find
+        def counting_find(type_, *args, **kwargs):
+            self.finds.append(type_)
+            return find(type_, *args, **kwargs)
+        self.sg.find = counting_find
+
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'users.json')
+        self.environ = dict(os.environ)
+        os.environ.pop('SHOTGUN_USER_ID', None)
+        os.environ.pop('SGSESSION_USER_CACHE', None)
+        os.environ['SHOTGUN_SUDO_AS_LOGIN'] = self.login
+        self.forget()
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.forget()
+        shutil.rmtree(self.dir)
+        del self.sg.find
+        self.fix.delete_all()
+
+    def forget(self):
+        # Only the disk cache should survive.
+        try:
+            del Session._guessed_user
+        except AttributeError:
+            pass
+
+    def test_disk_cache(self):
+
+        user = Session(self.sg).guess_user(fields=['name'], disk_cache=self.path)
+        self.assertSameEntity(user, self.user)
+        self.assertEqual(len(self.finds), 1)
+        self.assertTrue(os.path.exists(self.path))
+
+        self.forget()
+        user = Session(self.sg).guess_user(fields=['name'], disk_cache=self.path)
+        self.assertSameEntity(user, self.user)
+        self.assertEqual(user['name'], 'Someone')
+        self.assertEqual(len(self.finds), 1)
+
+        # Expired.
+        self.forget()
+        Session(self.sg).guess_user(disk_cache=self.path, disk_cache_ttl=-1)
+        self.assertEqual(len(self.finds), 2)
+
+    def test_envvar(self):
+        os.environ['SGSESSION_USER_CACHE'] = self.path
+        Session(self.sg).guess_user()
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_keyed_by_login(self):
+        Session(self.sg).guess_user(disk_cache=self.path)
+        self.forget()
+        os.environ['SHOTGUN_SUDO_AS_LOGIN'] = 'someone_else'
+        self.assertIs(Session(self.sg).guess_user(disk_cache=self.path), None)
+        self.assertEqual(len(self.finds), 2)
+
+    def test_missing_user_not_cached(self):
+
+        os.environ['SHOTGUN_SUDO_AS_LOGIN'] = login = mini_uuid()
+        self.assertIs(Session(self.sg).guess_user(disk_cache=self.path), None)
+        self.assertFalse(os.path.exists(self.path))
+
+        # Once they exist, they are found right away.
+        user = self.fix.create('HumanUser', dict(login=login, name='Someone Else'))
+        self.forget()
+        self.assertSameEntity(Session(self.sg).guess_user(disk_cache=self.path), user)
+        self.assertEqual(len(self.finds), 2)
+
+    def test_corrupt_file(self):
+        with open(self.path, 'w') as fh:
+            fh.write('{not json')
+        self.assertRaises(KeyError, usercache.load, self.path, 'key', 60)
+        usercache.store(self.path, 'key', None)
+        self.assertIs(usercache.load(self.path, 'key', 60), None)
@@ -0,0 +1,23 @@
+import subprocess
+import sys
+
+from common import *
+
+
+_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+_lazy_modules = ('pkg_resources', 'sgschema', 'dirmap', 'shotgun_api3', 'concurrent.futures')
+
+
+def run_python(source):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [_root, env.get('PYTHONPATH')]))
+    return subprocess.check_output([sys.executable, '-c', source], env=env)
+
+
+class TestImportTime(TestCase):
+
+    def test_lazy_imports(self):
+        out = run_python('import sys, sgsession; print " ".join(m for m in %r if m in sys.modules)' % (_lazy_modules, ))
+        self.assertEqual(out.strip(), '')
+
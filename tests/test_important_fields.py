@@ -86,3 +86,43 @@ class TestImportantFields(TestCase):
         task.fetch_core()
         task.pprint()
         self.assert_('short_name' in task['step'])
+
+
+class TestDefaultFieldsCache(TestCase):
+
+    def setUp(self):
+        self.session = Session(False)
+
+    def test_memoized(self):
+        a = self.session._add_default_fields('Shot', ['sg_status_list'])
+        b = self.session._add_default_fields('Shot', ['sg_status_list'])
+        self.assertEqual(a, b)
+        self.assertIsNot(a, b)
+        self.assertEqual(a, self.session._compute_default_fields('Shot', ['sg_status_list']))
+
+    def test_replaced_map(self):
+        self.assertNotIn('description', self.session._add_default_fields('Shot', []))
+        self.session.important_fields = dict(Session.important_fields, Shot=['code', 'description'])
+        self.assertIn('description', self.session._add_default_fields('Shot', []))
+
+    def test_modified_map(self):
+        self.session.important_fields_for_all = ['updated_at']
+        self.assertNotIn('created_at', self.session._add_default_fields('Shot', []))
+        self.session.important_fields_for_all.append('created_at')
+        self.assertIn('created_at', self.session._add_default_fields('Shot', []))
+
+    def test_modified_shared_map(self):
+        self.assertNotIn('description', self.session._add_default_fields('Shot', []))
+        self.assertNotIn('entity.Shot.description', self.session._add_default_fields('Task', []))
+        Session.important_fields['Shot'].append('description')
+        try:
+            self.assertIn('description', self.session._add_default_fields('Shot', []))
+            self.assertIn('entity.Shot.description', self.session._add_default_fields('Task', []))
+        finally:
+            Session.important_fields['Shot'].remove('description')
+        self.assertNotIn('description', self.session._add_default_fields('Shot', []))
+
+    def test_generator_fields(self):
+        fields = self.session._add_default_fields('Shot', (x for x in ['sg_status_list']))
+        self.assertIn('sg_status_list', fields)
+        self.assertNotIn('sg_status_list', self.session._add_default_fields('Shot', []))
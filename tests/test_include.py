@@ -0,0 +1,76 @@
+from common import *
+
+
+class TestInclude(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+
+        proj = fix.Project(mini_uuid())
+        seq = proj.Sequence('AA', project=proj)
+        shot = seq.Shot('AA_001', project=proj, sg_sequence=seq)
+        step = fix.find_or_create('Step', short_name='Anim')
+        task = shot.Task('Animate', entity=shot, step=step, project=proj)
+        pubs = [fix.create('PublishEvent', dict(code='pub%d' % i, sg_link=task, project=proj)) for i in range(3)]
+
+        self.proj = minimal(proj)
+        self.seq = minimal(seq)
+        self.shot = minimal(shot)
+        self.task = minimal(task)
+        self.pubs = [minimal(x) for x in pubs]
+
+        self.finds = []
+        find = self.sg.find
+        def counting_find(type_, *args, **kwargs):
+            self.finds.append(type_)
+            return find(type_, *args, **kwargs)
+        self.sg.find = counting_find
+
+        self.session = Session(self.sg)
+
+    def tearDown(self):
+        del self.sg.find
+        self.fix.delete_all()
+
+    def test_deep_and_follow_up(self):
+
+        pubs = self.session.find('PublishEvent', [('project', 'is', self.proj)], include={
+            'sg_link': {
+                'step': {},
+                'entity': {'sg_sequence': {}},
+            },
+        })
+        self.assertEqual(len(pubs), 3)
+
+        # The task and step come as deep fields, but the polymorphic entity
+        # link must be followed up (once).
+        self.assertEqual(self.finds, ['PublishEvent', 'Shot'])
+
+        task = pubs[0]['sg_link']
+        self.assertSameEntity(task, self.task)
+        self.assertEqual(task['step']['short_name'], 'Anim')
+        self.assertSameEntity(task['entity'], self.shot)
+        self.assertEqual(task['entity']['code'], 'AA_001')
+        self.assertSameEntity(task['entity']['sg_sequence'], self.seq)
+        self.assertEqual(task['entity']['sg_sequence']['code'], 'AA')
+
+    def test_explicit_type(self):
+
+        shots = self.session.find('Shot', [('id', 'is', self.shot['id'])], include={
+            'sg_sequence.Sequence': {'project.Project': {}},
+        })
+        self.assertEqual(self.finds, ['Shot'])
+        self.assertEqual(shots[0]['sg_sequence']['code'], 'AA')
+
+    def test_fetch_include(self):
+
+        tasks = [self.session.merge(self.task)]
+        self.session.fetch_include(tasks, {'entity': {'sg_sequence': {}}})
+        self.assertEqual(tasks[0]['entity']['code'], 'AA_001')
+        self.assertEqual(tasks[0]['entity']['sg_sequence']['code'], 'AA')
+
+        # Nothing left to do.
+        count = len(self.finds)
+        self.session.fetch_include(tasks, {'entity': {'sg_sequence': {}}})
+        self.assertEqual(len(self.finds), count)
@@ -0,0 +1,56 @@
+from common import *
+
+
+class TestIndexes(TestCase):
+
+    def setUp(self):
+        self.session = Session(False)
+
+    def test_lookup(self):
+
+        self.session.add_index('Shot', 'code')
+        a = self.session.merge({'type': 'Shot', 'id': 1, 'code': 'AA_001'})
+        b = self.session.merge({'type': 'Shot', 'id': 2, 'code': 'AA_002'})
+
+        self.assertEqual(self.session.lookup('Shot', 'code', 'AA_001'), [a])
+        self.assertEqual(self.session.lookup('Shot', 'code', 'aa_002'), [b])
+        self.assertEqual(self.session.lookup('Shot', 'code', 'AA_003'), [])
+        self.assertRaises(KeyError, self.session.lookup, 'Shot', 'sg_status_list', 'ip')
+
+    def test_existing_entities(self):
+        a = self.session.merge({'type': 'Shot', 'id': 1, 'code': 'AA_001'})
+        self.session.add_index('Shot', 'code')
+        self.assertEqual(self.session.lookup('Shot', 'code', 'AA_001'), [a])
+
+    def test_updates(self):
+
+        self.session.add_index('Shot', 'code')
+        a = self.session.merge({'type': 'Shot', 'id': 1, 'code': 'AA_001'})
+
+        a['code'] = 'BB_001'
+        self.assertEqual(self.session.lookup('Shot', 'code', 'AA_001'), [])
+        self.assertEqual(self.session.lookup('Shot', 'code', 'BB_001'), [a])
+
+        self.session.merge({'type': 'Shot', 'id': 1, 'code': 'CC_001'}, over=True)
+        self.assertEqual(self.session.lookup('Shot', 'code', 'BB_001'), [])
+        self.assertEqual(self.session.lookup('Shot', 'code', 'CC_001'), [a])
+
+    def test_links(self):
+
+        self.session.add_index('Task', 'entity')
+        shot = {'type': 'Shot', 'id': 1}
+        a = self.session.merge({'type': 'Task', 'id': 1, 'entity': shot})
+        b = self.session.merge({'type': 'Task', 'id': 2, 'entity': shot})
+        self.session.merge({'type': 'Task', 'id': 3, 'entity': {'type': 'Shot', 'id': 2}})
+
+        self.assertEqual(self.session.lookup('Task', 'entity', shot), [a, b])
+        self.assertEqual(self.session.lookup('Task', 'entity', self.session.merge(shot)), [a, b])
+
+    def test_parse_user_input(self):
+
+        self.assertRaises(ValueError, self.session.parse_user_input, 'Shot:AA_001')
+
+        self.session.add_index('Shot', 'code')
+        a = self.session.merge({'type': 'Shot', 'id': 1, 'code': 'AA_001'})
+        self.assertIs(self.session.parse_user_input('Shot:AA_001'), a)
+        self.assertRaises(ValueError, self.session.parse_user_input, 'Shot:AA_002')
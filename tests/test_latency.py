@@ -0,0 +1,84 @@
+import threading
+import time
+
+from common import *
+
+from sgsession.latency import SimulatedError, SlowShotgun
+
+
+class TestSlowShotgun(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+
+        proj = fix.Project(mini_uuid())
+        shots = [proj.Shot('AA_%03d' % i, project=proj) for i in range(1, 5)]
+
+        self.proj = minimal(proj)
+        self.shots = [minimal(x) for x in shots]
+
+    def tearDown(self):
+        self.fix.delete_all()
+
+    def test_latency(self):
+        sg = SlowShotgun(self.sg, latency=0.05)
+        session = Session(sg)
+        start = time.time()
+        shot = session.find_one('Shot', [('id', 'is', self.shots[0]['id'])])
+        self.assertTrue(time.time() - start >= 0.05)
+        self.assertEqual(shot['code'], 'AA_001')
+        self.assertEqual(sg.stats()['requests'], 1)
+
+    def test_concurrency_limit(self):
+
+        sg = SlowShotgun(self.sg, latency=0.05, max_concurrency=2)
+        session = Session(sg)
+
+        start = time.time()
+        futures = [session.get('Shot', x['id'], async=True) for x in self.shots]
+        shots = [f.result() for f in futures]
+        elapsed = time.time() - start
+
+        self.assertEqual([x['code'] for x in shots], ['AA_001', 'AA_002', 'AA_003', 'AA_004'])
+        stats = sg.stats()
+        self.assertEqual(stats['max_in_flight'], 2)
+        self.assertTrue(stats['queued_seconds'] > 0)
+        # Two at a time, rather than all four at once.
+        self.assertTrue(elapsed >= 0.1, elapsed)
+
+    def test_errors(self):
+        sg = SlowShotgun(self.sg, latency=0, error_rate=1)
+        session = Session(sg)
+        self.assertRaises(SimulatedError, session.find, 'Shot', [])
+        self.assertEqual(sg.stats()['errors'], 1)
+
+    def test_bandwidth(self):
+        sg = SlowShotgun(self.sg, latency=0, bandwidth=1e9)
+        Session(sg).find('Shot', [('project', 'is', self.proj)])
+        self.assertTrue(sg.stats()['bytes'] > 0)
+
+    def test_serialize(self):
+
+        class Server(object):
+            def __init__(self):
+                self.lock = threading.Lock()
+                self.in_flight = self.max_in_flight = 0
+            def find(self, *args):
+                with self.lock:
+                    self.in_flight += 1
+                    self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                time.sleep(0.05)
+                with self.lock:
+                    self.in_flight -= 1
+                return []
+
+        for serialize, expected in ((True, 1), (False, 2)):
+            server = Server()
+            sg = SlowShotgun(server, latency=0, serialize=serialize)
+            threads = [threading.Thread(target=sg.find, args=('Shot', [])) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(server.max_in_flight, expected)
@@ -0,0 +1,110 @@
+from common import *
+
+from sgsession.filters import UnsupportedFilter, match
+
+
+class TestLocalFind(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+        self.session = Session(self.sg)
+
+        proj = fix.Project(mini_uuid())
+        seqs = [proj.Sequence(code, project=proj) for code in ('AA', 'BB')]
+        shots = [seq.Shot('%s_%03d' % (seq['code'], i), project=proj) for seq in seqs for i in range(1, 3)]
+        steps = [fix.find_or_create('Step', code=code, short_name=code) for code in ('Anm', 'Comp')]
+        tasks = [shot.Task(step['code'] + ' something', step=step, entity=shot, project=proj) for step in steps for shot in shots]
+
+        self.proj = minimal(proj)
+        self.shots = [minimal(x) for x in shots]
+        self.steps = [minimal(x) for x in steps]
+        self.tasks = [minimal(x) for x in tasks]
+
+    def tearDown(self):
+        self.fix.delete_all()
+
+    def assertSameResults(self, filters, **kwargs):
+        kwargs.setdefault('order', [{'field_name': 'id', 'direction': 'asc'}])
+        remote = self.session.find('Task', filters, **kwargs)
+        local = self.session.find('Task', filters, local=True, **kwargs)
+        self.assertEqual([x['id'] for x in local], [x['id'] for x in remote])
+        return local
+
+    def test_differential(self):
+
+        self.session.preload('Task')
+
+        shot, other_shot = self.shots[:2]
+        step = self.steps[0]
+
+        for filters in (
+            [('project', 'is', self.proj)],
+            [('entity', 'is', shot), ('step', 'is', step)],
+            [('entity', 'is_not', shot)],
+            [('entity', 'in', [shot, other_shot])],
+            [('content', 'starts_with', 'Anm')],
+            [('id', 'greater_than', self.tasks[3]['id'])],
+            [('step.Step.code', 'is', 'Comp')],
+            [{'filter_operator': 'any', 'filters': [
+                ('entity', 'is', shot),
+                ('content', 'starts_with', 'Comp'),
+            ]}],
+        ):
+            self.assertSameResults([('project', 'is', self.proj)] + filters)
+
+        self.assertSameResults([('project', 'is', self.proj)], limit=3)
+        self.assertSameResults([('project', 'is', self.proj)], order=[
+            {'field_name': 'content', 'direction': 'desc'},
+            {'field_name': 'id', 'direction': 'asc'},
+        ])
+
+    def test_ties(self):
+        self.session.preload('Task')
+        # Only ordered by content, which several tasks share.
+        self.assertSameResults([('project', 'is', self.proj)], order=[
+            {'field_name': 'content', 'direction': 'desc'},
+        ])
+
+    def test_ignores_linked_stubs(self):
+
+        shots = self.session.preload('Shot')
+
+        # A shot created elsewhere, which we only see via a link.
+        new_shot = minimal(self.fix.create('Shot', dict(code='CC_001', project=self.proj)))
+        self.session.merge({'type': 'Task', 'id': self.tasks[0]['id'], 'entity': new_shot})
+
+        found = self.session.find('Shot', [('project', 'is', self.proj)], local=True)
+        self.assertEqual(sorted(x['id'] for x in found), sorted(x['id'] for x in shots))
+
+    def test_includes_created(self):
+
+        self.session.preload('Shot')
+        shot = self.session.create('Shot', code='CC_001', project=self.proj)
+        found = self.session.find('Shot', [('code', 'is', 'CC_001')], local=True)
+        self.assertEqual(found, [shot])
+
+        self.session.create_many('Shot', [dict(code='CC_002', project=self.proj)])
+        found = self.session.find('Shot', [('code', 'starts_with', 'CC_')], local=True)
+        self.assertEqual(sorted(x['code'] for x in found), ['CC_001', 'CC_002'])
+
+    def test_not_loaded(self):
+
+        self.assertRaises(UnsupportedFilter, self.session.find, 'Task', [], local=True)
+
+        self.session.preload('Task')
+        self.assertRaises(UnsupportedFilter, self.session.find, 'Task', [], ['sg_status_list'], local=True)
+
+        found = self.session.find('Task', [('project', 'is', self.proj)], ['sg_status_list'], local='prefer')
+        self.assertEqual(len(found), len(self.tasks))
+
+    def test_match(self):
+
+        task = self.session.merge({'type': 'Task', 'id': 1, 'content': 'Anm', 'step': {'type': 'Step', 'id': 2, 'code': 'Anm'}})
+
+        self.assertTrue(match(task, [('content', 'is', 'anm')]))
+        self.assertTrue(match(task, [('step.Step.code', 'in', ['Anm', 'Comp'])]))
+        self.assertFalse(match(task, [('step.Asset.code', 'is', 'Anm')]))
+        self.assertTrue(match(task, [('content', 'is', 'x'), ('id', 'is', 1)], 'any'))
+        self.assertRaises(UnsupportedFilter, match, task, [('sg_status_list', 'is', 'ip')])
+        self.assertRaises(UnsupportedFilter, match, task, [('content', 'in_last', 1, 'DAY')])
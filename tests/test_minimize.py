@@ -0,0 +1,45 @@
+from common import *
+
+
+class TestMinimize(TestCase):
+
+    def setUp(self):
+        self.session = Session(False)
+
+    def test_entities(self):
+        shot = self.session.merge({'type': 'Shot', 'id': 1, 'code': 'AA_001'})
+        res = self.session._minimize_entities([
+            ('entity', 'is', shot),
+            {'filter_operator': 'any', 'filters': [['id', 'in', [{'type': 'Task', 'id': 2, 'content': 'x'}]]]},
+        ])
+        self.assertEqual(res, [
+            ['entity', 'is', {'type': 'Shot', 'id': 1}],
+            {'filter_operator': 'any', 'filters': [['id', 'in', [{'type': 'Task', 'id': 2}]]]},
+        ])
+        self.assertIs(type(res[0][2]), dict)
+
+    def test_unchanged_is_shared(self):
+        filters = [['entity', 'in', [{'type': 'Shot', 'id': i} for i in range(10)]], ['code', 'is', 'x']]
+        self.assertIs(self.session._minimize_entities(filters), filters)
+
+        filters.append(['sg_sequence', 'is', {'type': 'Sequence', 'id': 1, 'code': 'AA'}])
+        res = self.session._minimize_entities(filters)
+        self.assertIsNot(res, filters)
+        self.assertIs(res[0], filters[0])
+        self.assertEqual(res[2][2], {'type': 'Sequence', 'id': 1})
+        self.assertEqual(filters[2][2]['code'], 'AA')
+
+    def test_attachments(self):
+        attachment = {'type': 'Attachment', 'id': 1, 'url': 'http://example.com'}
+        self.assertIs(self.session._minimize_entities({'image': attachment})['image'], attachment)
+
+    def test_deep(self):
+        data = x = []
+        for i in range(10000):
+            x.append([])
+            x = x[0]
+        x.append({'type': 'Shot', 'id': 1, 'code': 'AA_001'})
+        res = self.session._minimize_entities(data)
+        for i in range(10000):
+            res = res[0]
+        self.assertEqual(res, [{'type': 'Shot', 'id': 1}])
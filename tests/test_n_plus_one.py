@@ -0,0 +1,86 @@
+import time
+
+from common import *
+
+from sgsession.nplusone import NPlusOneDetector, NPlusOneError
+
+
+class TestNPlusOne(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+
+        proj = fix.Project(mini_uuid())
+        seq = proj.Sequence('AA', project=proj)
+        shots = [seq.Shot('AA_%03d' % i, project=proj) for i in range(1, 7)]
+
+        self.proj = minimal(proj)
+        self.shots = [minimal(x) for x in shots]
+
+    def tearDown(self):
+        self.fix.delete_all()
+
+    def test_parent_loop(self):
+
+        detector = NPlusOneDetector(threshold=3)
+        session = Session(self.sg, n_plus_one=detector)
+        for shot in [session.merge(x) for x in self.shots]:
+            shot.parent()
+
+        self.assertEqual(len(detector.reports), 1)
+        report = detector.reports[0]
+        self.assertIn("single Shot requests for ['sg_sequence']", report)
+        self.assertIn('test_n_plus_one.py', report)
+        self.assertIn('Session.fetch_heirarchy', report)
+
+    def test_fetch_loop(self):
+        detector = NPlusOneDetector(threshold=3)
+        session = Session(self.sg, n_plus_one=detector)
+        for shot in [session.merge(x) for x in self.shots]:
+            shot.fetch('description')
+        self.assertEqual(len(detector.reports), 1)
+        self.assertIn('Session.fetch(entities, fields)', detector.reports[0])
+
+    def test_async(self):
+
+        detector = NPlusOneDetector(threshold=3)
+        session = Session(self.sg, n_plus_one=detector)
+        shots = [session.merge(x) for x in self.shots]
+
+        # Two loops, neither of which is long enough on its own.
+        for shot in shots[:2]:
+            shot.fetch('description', async=True).result()
+        for shot in shots[2:4]:
+            shot.fetch('description', async=True).result()
+        self.assertEqual(detector.reports, [])
+
+        for shot in shots[:3]:
+            shot.fetch('sg_status_list', async=True).result()
+        self.assertEqual(len(detector.reports), 1)
+        self.assertIn('test_n_plus_one.py', detector.reports[0])
+
+    def test_bulk_is_fine(self):
+        detector = NPlusOneDetector(threshold=2)
+        session = Session(self.sg, n_plus_one=detector)
+        shots = [session.merge(x) for x in self.shots]
+        session.fetch(shots, ['description'])
+        session.fetch_heirarchy(shots)
+        for shot in shots:
+            shot.parent() # Already loaded.
+        self.assertEqual(detector.reports, [])
+
+    def test_window(self):
+        detector = NPlusOneDetector(threshold=3, window=0.01)
+        session = Session(self.sg, n_plus_one=detector)
+        for shot in [session.merge(x) for x in self.shots]:
+            shot.fetch('description')
+            time.sleep(0.02)
+        self.assertEqual(detector.reports, [])
+
+    def test_strict(self):
+        session = Session(self.sg, n_plus_one=NPlusOneDetector(threshold=3, strict=True))
+        ids = [x['id'] for x in self.shots]
+        with self.assertRaises(NPlusOneError):
+            for id_ in ids:
+                session.get('Shot', id_)
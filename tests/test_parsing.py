@@ -77,3 +77,26 @@ class TestParsing(TestCase):
         e = self.session.parse_user_input('Version:12345?code=Something')
         self.assertSameEntity(e, {'type': 'Version', 'id': 12345})
         self.assertEqual(e.get('code'), 'Something')
+
+    def test_many(self):
+
+        self.session.merge({'type': 'Page', 'id': 9000, 'project': {'type': 'Project', 'id': 12345}})
+        self.session.merge({'type': 'Page', 'id': 9001, 'project': {'type': 'Project', 'id': 12346}})
+
+        entities = self.session.parse_user_inputs([
+            'Version:12345',
+            '12346',
+            'https://example.shotgunstudio.com/detail/Version/12345',
+            'https://example.shotgunstudio.com/page/9000',
+            'https://example.shotgunstudio.com/page/9001',
+            '{"type":"Version","id":12346}',
+        ], entity_types=['Version'], fetch_project_from_page=True)
+
+        self.assertEqual([(x['type'], x['id']) for x in entities], [
+            ('Version', 12345),
+            ('Version', 12346),
+            ('Project', 12345),
+            ('Project', 12346),
+        ])
+
+        self.assertRaises(ValueError, self.session.parse_user_inputs, ['Version:1', 'nope'])
@@ -0,0 +1,59 @@
+from common import *
+
+from sgsession.prepared import Param
+
+
+class TestPrepared(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+        self.session = Session(self.sg)
+
+        proj = fix.Project(mini_uuid())
+        seq = proj.Sequence('AA', project=proj)
+        shots = [seq.Shot('AA_%03d' % i, project=proj) for i in range(1, 3)]
+        tasks = [shot.Task(content, entity=shot, project=proj) for shot in shots for content in ('Anm', 'Comp')]
+
+        self.proj = minimal(proj)
+        self.shots = [minimal(x) for x in shots]
+        self.tasks = [minimal(x) for x in tasks]
+
+    def tearDown(self):
+        self.fix.delete_all()
+
+    def test_find(self):
+
+        prepared = self.session.prepare('Task', [('entity', 'is', Param('shot'))], ['content'])
+        self.assertIn('content', prepared.fields)
+        self.assertIn('entity.Shot.code', prepared.fields)
+
+        for i, shot in enumerate(self.shots):
+            found = prepared.find(shot=self.session.merge(shot))
+            self.assertEqual(sorted(x['id'] for x in found), [x['id'] for x in self.tasks[i * 2:i * 2 + 2]])
+            self.assertEqual(found[0]['entity']['code'], 'AA_%03d' % (i + 1))
+
+    def test_same_as_find(self):
+
+        filters = [('entity', 'in', self.shots), ('content', 'is', 'Anm')]
+        expected = self.session.find('Task', filters, ['content'])
+
+        prepared = self.session.prepare('Task', [('entity', 'in', Param('shots')), ('content', 'is', Param('content'))], ['content'])
+        found = prepared.find(shots=self.shots, content='Anm')
+        self.assertEqual(sorted(found), sorted(expected))
+
+    def test_bind(self):
+
+        prepared = self.session.prepare('Task', [('project', 'is', self.proj), ('entity', 'is', Param('shot'))], ['content'])
+        shot = self.session.merge(dict(self.shots[0], code='AA_001'))
+
+        filters = prepared.bind(shot=shot)
+        self.assertEqual(filters[1], ['entity', 'is', minimal(shot)])
+        self.assertIs(filters[0], prepared.bind(shot=shot)[0])
+
+        self.assertRaises(TypeError, prepared.find)
+
+    def test_async(self):
+        prepared = self.session.prepare('Task', [('entity', 'is', Param('shot'))])
+        future = prepared.find(shot=self.shots[0], async=True)
+        self.assertEqual(len(future.result()), 2)
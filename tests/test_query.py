@@ -0,0 +1,121 @@
+from common import *
+
+from sgsession.query import execute, plan
+
+
+class TestQuery(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+        self.session = Session(self.sg)
+
+        proj = fix.Project(mini_uuid())
+        seq = proj.Sequence('AA', project=proj)
+        shots = [seq.Shot('AA_%03d' % i, project=proj) for i in range(1, 4)]
+        tasks = [shot.Task(content, entity=shot, project=proj) for shot in shots for content in ('Anm', 'Comp')]
+
+        self.proj = minimal(proj)
+        self.shots = [minimal(x) for x in shots]
+        self.tasks = [minimal(x) for x in tasks]
+
+    def tearDown(self):
+        self.fix.delete_all()
+
+    def query(self):
+        return self.session.query('Task', 'content').filter(project=self.proj)
+
+    def test_lazy_and_composable(self):
+
+        base = self.query()
+        anm = base.filter('content', '=', 'Anm')
+        self.assertEqual(len(base.filters), 1)
+        self.assertEqual(len(anm.filters), 2)
+
+        self.assertEqual(len(list(base)), 6)
+        self.assertEqual(len(list(anm)), 3)
+        self.assertEqual(base.count(), 6)
+
+    def test_or(self):
+        found = self.query().filter({'content': 'Anm'}, 'or', {'content': 'Comp'}).all()
+        self.assertEqual(len(found), 6)
+        found = self.query().filter({'content': 'Anm'}, 'or', {'content': 'Nothing'}).all()
+        self.assertEqual(len(found), 3)
+
+    def test_first_and_one(self):
+
+        query = self.query().order_by('-content', 'id')
+        first = query.first()
+        self.assertEqual(first['content'], 'Comp')
+
+        self.assertRaises(ValueError, query.one)
+        one = query.filter(entity=self.shots[0], content='Anm').one()
+        self.assertSameEntity(one, self.tasks[0])
+
+    def test_only_and_include(self):
+
+        query = self.query().only('content')
+        self.assertEqual(query.explain()[0]['fields'], ['content'])
+
+        query = query.include('sg_status_list')
+        self.assertEqual(query.explain()[0]['fields'], ['content', 'sg_status_list'])
+
+    def test_iter(self):
+        found = list(self.query().iter(page_size=2, parallel=2))
+        self.assertEqual(len(found), 6)
+
+    def test_combine(self):
+
+        shots = [self.session.merge(x) for x in self.shots]
+        queries = [self.session.query('Task').filter(entity=shot) for shot in shots]
+
+        requests = plan(queries)
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(requests[0].describe()['queries'], 3)
+
+        results = execute(queries)
+        self.assertEqual([len(x) for x in results], [2, 2, 2])
+        for shot, tasks in zip(shots, results):
+            for task in tasks:
+                self.assertIs(task['entity'], shot)
+
+
+class AliasSchema(object):
+
+    # Only knows that "title" is another name for "content".
+
+    def resolve_one_entity(self, name):
+        return name
+
+    def resolve_one_field(self, type_, name):
+        return 'content' if name == 'title' else name
+
+    def resolve_field(self, type_, fields):
+        fields = [fields] if isinstance(fields, basestring) else fields
+        return [self.resolve_one_field(type_, x) for x in fields]
+
+    def resolve_structure(self, x, entity_type=None):
+        return x
+
+
+class TestQueryCount(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+        self.session = Session(self.sg, schema=AliasSchema(), trace=True)
+
+        proj = fix.Project(mini_uuid())
+        shot = proj.Shot('AA_001', project=proj)
+        for content in ('Anm', 'Anm', 'Comp'):
+            shot.Task(content, entity=shot, project=proj)
+        self.proj = minimal(proj)
+
+    def tearDown(self):
+        self.fix.delete_all()
+
+    def test_count_resolves_names(self):
+        query = self.session.query('Task').filter(project=self.proj).filter('title', '=', 'Anm')
+        self.assertEqual(len(query.all()), 2)
+        self.assertEqual(query.count(), 2)
+        self.assertEqual(self.session.tracer.records[-1].request, 'summarize')
@@ -0,0 +1,118 @@
+from common import *
+
+from sgsession.querycache import QueryCache
+
+
+class TestQueryCache(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+        self.session = Session(self.sg, query_cache=True)
+
+        self.proj = minimal(fix.Project(mini_uuid()))
+
+    def tearDown(self):
+        self.fix.delete_all()
+
+    def find_seqs(self):
+        return self.session.find('Sequence', [('project', 'is', self.proj)])
+
+    def test_hit_and_miss(self):
+
+        self.fix.create('Sequence', dict(code='AA', project=self.proj))
+
+        a = self.find_seqs()
+        b = self.find_seqs()
+        self.assertEqual(len(a), 1)
+        self.assertEqual(a, b)
+        self.assertIs(a[0], b[0])
+
+        stats = self.session.query_cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_bypass(self):
+        self.find_seqs()
+        self.session.find('Sequence', [('project', 'is', self.proj)], cache=False)
+        self.session.find('Sequence', [('project', 'is', self.proj)], merge=False)
+        self.assertEqual(self.session.query_cache.stats()['hits'], 0)
+
+    def test_invalidate_on_create(self):
+
+        self.assertEqual(len(self.find_seqs()), 0)
+        self.session.create('Sequence', dict(code='AA', project=self.proj))
+        self.assertEqual(len(self.find_seqs()), 1)
+
+        stats = self.session.query_cache.stats()
+        self.assertEqual(stats['hits'], 0)
+        self.assertEqual(stats['invalidations'], 1)
+
+    def test_invalidate_on_update(self):
+
+        seq = self.session.create('Sequence', dict(code='AA', project=self.proj))
+        self.assertEqual(len(self.session.find('Sequence', [('code', 'is', 'BB'), ('project', 'is', self.proj)])), 0)
+        self.session.update(seq, code='BB')
+        self.assertEqual(len(self.session.find('Sequence', [('code', 'is', 'BB'), ('project', 'is', self.proj)])), 1)
+
+    def test_invalidate_deep_type(self):
+
+        self.session.find('Project', [('id', 'is', self.proj['id'])])
+        self.session.find('Shot', [('project', 'is', self.proj)], ['sg_sequence.Sequence.code'])
+        self.assertEqual(self.session.query_cache.stats()['size'], 2)
+
+        self.session.create('Sequence', dict(code='AA', project=self.proj))
+        self.assertEqual(self.session.query_cache.stats()['size'], 1)
+
+    def test_filter_values_are_not_types(self):
+
+        cache = QueryCache()
+        cache.set(cache.make_key('HumanUser', [('login', 'is', 'the.Task.of.it')], ['login']), ())
+        cache.set(cache.make_key('HumanUser', [{'filter_operator': 'any', 'filters': [
+            ('login', 'is', 'someone'),
+            ('department', 'is', {'type': 'Department', 'id': 1}),
+            ('projects.Project.name', 'is', 'Task'),
+        ]}], ['login']), ())
+        self.assertEqual(cache.stats()['size'], 2)
+
+        cache.invalidate(['Task'])
+        self.assertEqual(cache.stats()['size'], 2)
+        cache.invalidate(['Department'])
+        self.assertEqual(cache.stats()['size'], 1)
+        cache.invalidate(['HumanUser'])
+        self.assertEqual(cache.stats()['size'], 0)
+
+        cache.set(cache.make_key('HumanUser', [('projects.Project.name', 'is', 'x')], ['login']), ())
+        cache.invalidate(['Project'])
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_ttl(self):
+
+        self.session.query_cache = QueryCache(ttls={'Sequence': 0})
+        self.find_seqs()
+        self.find_seqs()
+        stats = self.session.query_cache.stats()
+        self.assertEqual(stats['hits'], 0)
+        self.assertEqual(stats['misses'], 2)
+
+    def test_force_bypasses_cache(self):
+
+        seq = self.session.create('Sequence', dict(code='AA', project=self.proj, description='old'))
+        seq.fetch(['description'], force=True)
+
+        # Change it behind the session's back.
+        self.sg.update('Sequence', seq['id'], {'description': 'new'})
+
+        finds = []
+        find = self.sg.find
+        def counting_find(*args, **kwargs):
+            finds.append(args[0])
+            return find(*args, **kwargs)
+        self.sg.find = counting_find
+        try:
+            seq.fetch(['description'], force=True)
+            self.assertEqual(seq['description'], 'new')
+            self.session.filter_exists([seq], force=True)
+        finally:
+            del self.sg.find
+        self.assertEqual(finds, ['Sequence', 'Sequence'])
@@ -0,0 +1,121 @@
+from common import *
+
+
+class TestTracing(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+
+        proj = fix.Project(mini_uuid())
+        seq = proj.Sequence('AA', project=proj)
+        shots = [seq.Shot('AA_%03d' % i, project=proj) for i in range(1, 4)]
+
+        self.proj = minimal(proj)
+        self.seq = minimal(seq)
+        self.shots = [minimal(x) for x in shots]
+
+        self.session = Session(self.sg, trace=True)
+
+    def tearDown(self):
+        self.fix.delete_all()
+
+    def test_find(self):
+
+        shots = self.session.find('Shot', [('id', 'in', [x['id'] for x in self.shots])])
+        self.assertEqual(len(shots), 3)
+
+        record, = self.session.tracer.records
+        self.assertEqual(record.request, 'find')
+        self.assertEqual(record.caller, 'find')
+        self.assertEqual(record.entity_type, 'Shot')
+        self.assertEqual(record.ids, 3)
+        self.assertEqual(record.rows, 3)
+        self.assertIn('code', record.fields)
+        self.assertTrue(record.duration >= 0)
+
+        stats = self.session.stats()
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['rows'], 3)
+        self.assertEqual(stats['types']['Shot']['requests'], 1)
+
+    def test_callers_and_hits(self):
+
+        shots = [self.session.merge(x) for x in self.shots]
+        self.session.fetch_heirarchy(shots)
+        self.assertEqual(set(x.caller for x in self.session.tracer.records), set(['fetch_heirarchy']))
+        self.assertEqual(set(x.method for x in self.session.tracer.records), set(['find']))
+
+        # Everything is already loaded.
+        self.session.fetch(shots, ['code'])
+        stats = self.session.stats()
+        self.assertEqual(stats['callers']['fetch']['requests'], 0)
+        self.assertEqual(stats['callers']['fetch']['cache_hits'], 3)
+
+        self.session.fetch_backrefs([self.session.merge(self.seq)], 'Shot', 'sg_sequence')
+        self.assertEqual(self.session.tracer.records[-1].caller, 'fetch_backrefs')
+
+    def test_threads(self):
+
+        tracer = self.session.tracer
+        tracer.enter('tool')
+        try:
+            self.session.find('Shot', [('project', 'is', self.proj)], async=True).result()
+        finally:
+            tracer.exit()
+        self.assertEqual(tracer.records[-1].caller, 'tool')
+
+        tracer.reset()
+        shots = list(self.session.find_iter('Shot', [('project', 'is', self.proj)], per_page=1, async_count=2))
+        self.assertEqual(len(shots), 3)
+        self.assertTrue(len(tracer.records) > 1)
+        self.assertEqual(set(x.caller for x in tracer.records), set(['find_iter']))
+
+        tracer.reset()
+        rows = [dict(code='AA_%03d' % i, project=self.proj) for i in range(4, 7)]
+        self.session.create_many('Shot', rows, chunk_size=1, parallel=True)
+        self.assertEqual([x.caller for x in tracer.records], ['create_many'] * 3)
+
+    def test_empty_cached_result(self):
+        session = Session(self.sg, trace=True, query_cache=True)
+        for _ in range(2):
+            session.find('Shot', [('code', 'is', 'does_not_exist')])
+        stats = session.stats()
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['cache_hits'], 0)
+
+    def test_writes(self):
+        shot = self.session.create('Shot', code='AA_004', project=self.proj)
+        self.session.update(shot, description='new')
+        self.session.batch([{'request_type': 'update', 'entity_type': 'Shot', 'entity_id': shot['id'], 'data': {'description': 'newer'}}])
+        records = self.session.tracer.records
+        self.assertEqual([x.request for x in records], ['create', 'update', 'batch'])
+        self.assertEqual(records[1].fields, ('description', ))
+        self.assertEqual(records[2].ids, 1)
+
+    def test_errors(self):
+        self.assertRaises(Exception, self.session.update, 'NotAType', 1, {'code': 'x'})
+        self.assertIsNot(self.session.tracer.records[-1].error, None)
+        self.assertEqual(self.session.stats()['errors'], 1)
+
+    def test_trace_block(self):
+
+        session = Session(self.sg)
+        self.assertRaises(ValueError, session.stats)
+
+        reports = []
+        with session.trace(report=reports.append) as tracer:
+            session.find('Shot', [('id', 'is', self.shots[0]['id'])])
+        session.find('Shot', [('id', 'is', self.shots[1]['id'])])
+
+        self.assertIs(session.tracer, None)
+        self.assertEqual(tracer.stats()['requests'], 1)
+        self.assertEqual(len(reports), 1)
+        self.assertTrue(reports[0].startswith('1 request (1 ids, 1 rows)'), reports[0])
+
+        # Blocks also report on their own when the session is traced.
+        self.session.find('Shot', [])
+        with self.session.trace(report=False) as tracer:
+            self.session.find('Shot', [])
+        self.assertEqual(tracer.stats()['requests'], 1)
+        self.assertEqual(self.session.stats()['requests'], 2)
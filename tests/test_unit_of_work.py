@@ -0,0 +1,116 @@
+from common import *
+
+
+class TestUnitOfWork(TestCase):
+
+    def setUp(self):
+        sg = Shotgun()
+        self.sg = self.fix = fix = Fixture(sg)
+
+        proj = fix.Project(mini_uuid())
+        self.proj = minimal(proj)
+
+        self.batches = []
+        batch = self.sg.batch
+        def counting_batch(requests):
+            self.batches.append([x['request_type'] for x in requests])
+            return batch(requests)
+        self.sg.batch = counting_batch
+
+        self.session = Session(self.sg)
+
+    def tearDown(self):
+        del self.sg.batch
+        self.fix.delete_all()
+
+    def test_linked_creates(self):
+
+        with self.session.batch() as batch:
+            seq = batch.create('Sequence', code='AA', project=self.proj)
+            shots = [batch.create('Shot', code='AA_%03d' % i, sg_sequence=seq, project=self.proj) for i in range(3)]
+            self.assertIs(seq['id'], None)
+
+        # One batch for the sequence, and another for the shots that link to it.
+        self.assertEqual(self.batches, [['create'], ['create'] * 3])
+
+        self.assertIsNot(seq['id'], None)
+        self.assertEqual(seq['code'], 'AA')
+        self.assertIs(self.session.merge({'type': 'Sequence', 'id': seq['id']}), seq)
+        for shot in shots:
+            self.assertIs(shot['sg_sequence'], seq)
+
+        found = self.session.find('Shot', [('sg_sequence', 'is', seq)])
+        self.assertEqual(sorted(x['id'] for x in found), sorted(x['id'] for x in shots))
+
+    def test_update_and_delete(self):
+
+        shot = self.session.create('Shot', code='AA_001', project=self.proj)
+        other = self.session.create('Shot', code='AA_002', project=self.proj)
+
+        with self.session.batch() as batch:
+            batch.update(shot, description='updated')
+            task = batch.create('Task', content='Anm', entity=shot, project=self.proj)
+            batch.update(task, content='Animation')
+            batch.delete(other)
+
+        self.assertEqual(self.batches, [['update', 'create', 'delete'], ['update']])
+        self.assertEqual(shot['description'], 'updated')
+        self.assertEqual(task['content'], 'Animation')
+        self.assertFalse(other._exists)
+
+    def test_chunks(self):
+
+        batch = self.session.batch()
+        batch.chunk_size = 2
+        for i in range(5):
+            batch.create('Shot', code='AA_%03d' % i, project=self.proj)
+        self.assertEqual(len(batch), 5)
+        batch.flush()
+        self.assertEqual(len(batch), 0)
+        self.assertEqual([len(x) for x in self.batches], [2, 2, 1])
+
+    def test_discard_on_error(self):
+
+        try:
+            with self.session.batch() as batch:
+                batch.create('Shot', code='AA_001', project=self.proj)
+                raise ValueError('oops')
+        except ValueError:
+            pass
+        self.assertEqual(self.batches, [])
+
+    def test_failed_level(self):
+
+        batch = self.session.batch()
+        seq = batch.create('Sequence', code='AA', project=self.proj)
+        shot = batch.create('Shot', code='AA_001', sg_sequence=seq, project=self.proj)
+        task = batch.create('Task', content='Anm', entity=shot, project=self.proj)
+
+        counting_batch = self.sg.batch
+        def failing_batch(requests):
+            if requests[0]['entity_type'] == 'Shot':
+                raise ValueError('failing level')
+            return counting_batch(requests)
+        self.sg.batch = failing_batch
+
+        self.assertRaises(ValueError, batch.flush)
+        self.assertIsNot(seq['id'], None)
+        self.assertIs(shot['id'], None)
+        self.assertIs(task['id'], None)
+        self.assertEqual(len(batch), 2)
+
+        # Once the server is back, the rest can be sent.
+        self.sg.batch = counting_batch
+        batch.flush()
+        self.assertEqual(len(batch), 0)
+        self.assertIs(task['entity'], shot)
+        self.assertIs(shot['sg_sequence'], seq)
+        self.assertEqual(self.batches, [['create']] * 3)
+
+    def test_raw_batch(self):
+        res = self.session.batch([{
+            'request_type': 'create',
+            'entity_type': 'Shot',
+            'data': {'code': 'AA_001', 'project': self.proj},
+        }])
+        self.assertEqual(res[0]['code'], 'AA_001')